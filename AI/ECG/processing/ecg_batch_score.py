@@ -0,0 +1,257 @@
+"""Offline bulk scoring of recorded ECG beats.
+
+Classifies whole CSV recordings (same row format as ecg_live.csv /
+mitbih_test.csv: 187 features, optionally followed by the label) in large
+vectorized batches instead of replaying them through the live loop.
+
+Each input file is split into byte ranges aligned to line boundaries. A
+process pool (one warm predictor per worker, BLAS/TF pinned to one thread)
+scores the ranges, and the parent stitches the parts back in order into
+one columnar file per input:
+
+    <out-dir>/<stem>_scored.parquet   (CSV if pyarrow is not installed)
+    <out-dir>/summary.json            per-file class histogram, mean heartbeat score, accuracy
+
+    python -m AI.ECG.processing.ecg_batch_score AI/ECG/data_ecg/recordings/*.csv --out-dir AI/Data/scored
+"""
+
+import argparse
+import glob
+import io
+import json
+import multiprocessing as mp
+import os
+import shutil
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from AI.ECG.processing.ecg_processing import CLASS_MEANINGS, ECG_CLASSES, heartbeat_scores
+from AI.ECG.processing.ecg_runtime import N_FEATURES, load_predictor
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # CSV output only
+    pa = pq = None
+
+# ------------------ CONFIG ------------------
+OUTPUT_DIR = "AI/Data/scored"
+RANGE_MB = 32       # bytes of CSV per task
+PREDICT_BATCH = 8192
+
+_predictor = None
+
+
+# ------------------ WORKER ------------------
+def init_worker(backend):
+    global _predictor
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent owns shutdown
+    _predictor = load_predictor(backend)
+
+
+def split_ranges(path, range_bytes):
+    """Byte ranges of `path`, each starting at a line start, covering the whole file."""
+    size = os.path.getsize(path)
+    starts = [0]
+    with open(path, "rb") as f:
+        pos = range_bytes
+        while pos < size:
+            f.seek(pos)
+            f.readline()  # move to the next line start
+            nxt = f.tell()
+            if nxt >= size:
+                break
+            if nxt > starts[-1]:
+                starts.append(nxt)
+            pos = nxt + range_bytes
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def read_range(path, start, end):
+    """Parse rows in [start, end); a non-numeric first line (header) is skipped."""
+    import pandas as pd
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    if start == 0:
+        first = data.split(b"\n", 1)[0].split(b",")[0].strip()
+        try:
+            float(first)
+        except ValueError:
+            data = data.split(b"\n", 1)[1] if b"\n" in data else b""
+    if not data.strip():
+        return np.empty((0, N_FEATURES + 1), dtype=np.float32)
+    return pd.read_csv(io.BytesIO(data), header=None, dtype=np.float32).to_numpy()
+
+
+def score_range(path, part, start, end, part_path):
+    t0 = time.perf_counter()
+    rows = read_range(path, start, end)
+    n = len(rows)
+    X = rows[:, :N_FEATURES]
+    # A trailing label column is optional; NaN marks "unknown"
+    labels = rows[:, N_FEATURES] if rows.shape[1] > N_FEATURES else np.full(n, np.nan, dtype=np.float32)
+
+    probs = np.empty((n, _predictor.n_classes), dtype=np.float32)
+    for i in range(0, n, PREDICT_BATCH):
+        probs[i:i + PREDICT_BATCH] = _predictor.predict(X[i:i + PREDICT_BATCH])
+    pred = probs.argmax(axis=1)
+    # Like the live loop: score against the recorded label; unlabeled rows (NaN) are scored without one
+    scores = heartbeat_scores(probs, labels)
+
+    columns = {"predicted_class": pred.astype(np.int8), "heartbeat_score": scores}
+    for i in range(probs.shape[1]):
+        columns[f"p_{ECG_CLASSES.get(i, i)}"] = probs[:, i]
+    if rows.shape[1] > N_FEATURES:
+        columns["true_class"] = labels.astype(np.int8)
+    np.savez(part_path, **columns)
+
+    labeled = ~np.isnan(labels)
+    return {
+        "part": part,
+        "rows": n,
+        "histogram": np.bincount(pred, minlength=probs.shape[1]).tolist(),
+        "score_sum": float(scores.sum()),
+        "labeled": int(labeled.sum()),
+        "correct": int((pred[labeled] == labels[labeled]).sum()),
+        "seconds": time.perf_counter() - t0,
+    }
+
+
+# ------------------ OUTPUT ------------------
+class ScoredWriter:
+    """Appends scored parts to <stem>_scored.parquet, or .csv without pyarrow."""
+
+    def __init__(self, out_path_stem):
+        self.path = out_path_stem + (".parquet" if pq else ".csv")
+        self._writer = None
+        self._file = None
+        self.rows = 0
+
+    def write(self, columns):
+        n = len(columns["predicted_class"])
+        columns = {"row": np.arange(self.rows, self.rows + n, dtype=np.int64), **columns}
+        self.rows += n
+        if pq is not None:
+            table = pa.table({k: pa.array(v) for k, v in columns.items()})
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+            self._writer.write_table(table)
+        else:
+            if self._file is None:
+                self._file = open(self.path, "w")
+                self._file.write(",".join(columns) + "\n")
+            block = np.column_stack([np.asarray(v, dtype=np.float64) for v in columns.values()])
+            fmt = ["%d", "%d", "%.4f"] + ["%.5f"] * (len(columns) - 3)
+            np.savetxt(self._file, block, fmt=fmt[:block.shape[1]], delimiter=",")
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def summarize(path, parts, out_path):
+    rows = sum(p["rows"] for p in parts)
+    seconds = sum(p["seconds"] for p in parts)  # worker time, summed over ranges
+    hist = np.sum([p["histogram"] for p in parts], axis=0).astype(int).tolist() if parts else []
+    labeled = sum(p["labeled"] for p in parts)
+    return {
+        "input": path,
+        "output": out_path,
+        "rows": rows,
+        "class_histogram": {ECG_CLASSES.get(i, str(i)): n for i, n in enumerate(hist)},
+        "mean_heartbeat_score": sum(p["score_sum"] for p in parts) / rows if rows else None,
+        "accuracy": sum(p["correct"] for p in parts) / labeled if labeled else None,
+        "worker_seconds": round(seconds, 3),
+    }
+
+
+# ------------------ DRIVER ------------------
+def output_stems(paths):
+    """Output name per input: the file stem, plus the input's index when two inputs share a stem."""
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    return [f"{stem}-{fi}" if stems.count(stem) > 1 else stem for fi, stem in enumerate(stems)]
+
+
+def score_files(paths, out_dir=OUTPUT_DIR, workers=None, backend="auto", range_mb=RANGE_MB):
+    os.makedirs(out_dir, exist_ok=True)
+    # One parts directory per run, so concurrent runs into the same out_dir never share part files
+    run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    parts_dir = os.path.join(out_dir, f".parts-{run_id}")
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"):
+        os.environ.setdefault(var, "1")
+
+    tasks = []  # (file index, part, start, end, part path)
+    for fi, path in enumerate(paths):
+        for part, (start, end) in enumerate(split_ranges(path, int(range_mb * (1 << 20)))):
+            tasks.append((fi, part, start, end, os.path.join(parts_dir, f"{fi}-{part}.npz")))
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+    print(f"Scoring {len(paths)} file(s) in {len(tasks)} range(s) on {workers} worker(s)")
+
+    summaries = []
+    start_all = time.perf_counter()
+    ctx = mp.get_context("spawn")
+    os.makedirs(parts_dir)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=init_worker,
+                                 initargs=(backend,)) as pool:
+            futures = [(fi, part, part_path, pool.submit(score_range, paths[fi], part, start, end, part_path))
+                       for fi, part, start, end, part_path in tasks]
+            # Stitch parts in submission order: file by file, range by range
+            for fi, (path, stem) in enumerate(zip(paths, output_stems(paths))):
+                writer = ScoredWriter(os.path.join(out_dir, f"{stem}_scored"))
+                parts = []
+                for _, part, part_path, fut in (f for f in futures if f[0] == fi):
+                    parts.append(fut.result())
+                    with np.load(part_path) as columns:
+                        writer.write({k: columns[k] for k in columns.files})
+                    os.remove(part_path)
+                writer.close()
+                summary = summarize(path, parts, writer.path)
+                summaries.append(summary)
+                hist = ", ".join(f"{k}={v}" for k, v in summary["class_histogram"].items())
+                acc = f"  acc {summary['accuracy']:.3f}" if summary["accuracy"] is not None else ""
+                print(f"{path}: {summary['rows']} beats  [{hist}]  mean score "
+                      f"{summary['mean_heartbeat_score'] or 0:.2f}{acc}  -> {writer.path}")
+    finally:
+        # Also when a range fails: no part files are left behind
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    total = time.perf_counter() - start_all
+    rows = sum(s["rows"] for s in summaries)
+    report = {"files": summaries, "rows": rows, "seconds": round(total, 3),
+              "beats_per_second": round(rows / total) if total else None,
+              "workers": workers, "backend": backend}
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n{rows} beats in {total:.1f}s ({report['beats_per_second']} beats/s); summary in "
+          f"{os.path.join(out_dir, 'summary.json')}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify recorded ECG CSVs in bulk.")
+    parser.add_argument("inputs", nargs="+", help="CSV files or glob patterns")
+    parser.add_argument("--out-dir", default=OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--backend", choices=["auto", "keras", "tflite", "fused"], default="auto")
+    parser.add_argument("--range-mb", type=float, default=RANGE_MB, help="CSV bytes per task")
+    args = parser.parse_args(argv)
+
+    paths = [p for pattern in args.inputs for p in (sorted(glob.glob(pattern)) or [pattern])]
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing:
+        parser.error(f"not found: {', '.join(missing)}")
+    print("Classes: " + ", ".join(f"{i} ({label}) {CLASS_MEANINGS[i]}" for i, label in ECG_CLASSES.items()))
+    score_files(paths, args.out_dir, args.workers, args.backend, args.range_mb)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,39 @@
+import argparse
+import logging
 import os
 import sys
 import time
 import signal
+from pathlib import Path
+
 import numpy as np
-import pandas as pd
-from tensorflow.keras.models import load_model
-import joblib
-from sklearn.preprocessing import StandardScaler
+
+import metrics
+from ecg_alerts import ALERT_LOG, AlertEmitter, AlertLog
+from prediction_store import STORE_PATH, PredictionStore
+from shm_ring import PREDICTION_DTYPE, ShmRing
+from AI.ECG.processing.ecg_runtime import N_FEATURES, load_predictor
+from AI.ECG.processing.heart_metrics import SNAPSHOT_PATH, HeartMetrics
+from AI.ECG.processing.status_publisher import StatusPublisher
 
 # ------------------ CONFIG ------------------
 INPUT_CSV = "AI/ECG/data_ecg/ecg_live.csv"
 OUTPUT_CSV = "AI/Data/ecg_predictions.csv"
+REPO_DIR = Path(__file__).resolve().parents[3]
+# Absolute, so the classifier and server.py agree whatever directory either is started from
+STATUS_FILE = str(REPO_DIR / os.getenv("ECG_STATUS_PATH", "ecg_live_status.txt"))
 START_ROW = 72400
 POLL_INTERVAL = 0.1
 BATCH_SIZE = 32
 TEST = True
+LOG_EVERY = 100  # one INFO line per N beats; every beat is logged at DEBUG
+METRICS_PORT = int(os.getenv("ECG_METRICS_PORT", "9101"))  # 0 disables; a second instance needs its own port
+PATIENT_ID = os.getenv("ECG_PATIENT_ID", "default")
+HEART_METRICS_PATH = str(REPO_DIR / os.getenv("HEART_METRICS_PATH", SNAPSHOT_PATH))
+HEART_METRICS_SECONDS = 1.0  # snapshot rewrite interval
+RING_NAME = os.getenv("ECG_RING", "")  # shared-memory ring for predictions ("" disables)
+
+log = logging.getLogger("insulink.ecg")
 
 ECG_CLASSES = {
     0: 'N',
@@ -24,74 +43,44 @@ ECG_CLASSES = {
     4: 'Q'
 }
 
+CLASS_MEANINGS = [
+    'Normal beat',
+    'Supraventricular premature beat',
+    'Ventricular premature beat',
+    'Fusion of ventricular and normal',
+    'Unclassifiable beat',
+]
+
+# ------------------ METRICS ------------------
+PREDICT_SECONDS = metrics.histogram("ecg_predict_seconds", "Model predict latency per beat")
+CSV_READ_SECONDS = metrics.histogram("ecg_csv_read_seconds", "Live input CSV read latency")
+CSV_WRITE_SECONDS = metrics.histogram("ecg_csv_write_seconds", "Prediction CSV append latency")
+BEATS_TOTAL = metrics.counter("ecg_beats_total", "Classified beats", ["label"])
+ABNORMAL_BURDEN = metrics.gauge("ecg_abnormal_burden", "Share of S/V/F beats in the window", ["window"])
+ECTOPIC_RUNS = metrics.counter("ecg_ectopic_runs_total", "Completed runs of 3+ abnormal beats")
+BACKLOG_ROWS = metrics.gauge("ecg_backlog_rows", "Rows read from the live CSV but not yet classified")
+
 # ------------------ SIGNAL HANDLER ------------------
 def signal_handler(signum, frame):
     print("\nStopping live prediction...")
     sys.exit(0)
 
-signal.signal(signal.SIGINT, signal_handler)
-
-# ------------------ LOAD MODEL ------------------
-MODEL_PATH = "AI/ECG/Models/ecg_model.h5"
-SCALER_PATH = "AI/ECG/Models/ecg_scaler.pkl"
-
-try:
-    model = load_model(MODEL_PATH)
-    print("Loaded Keras model from", MODEL_PATH)
-    n_classes = model.output_shape[1]
-    print(f"Model output shape: {model.output_shape} ({n_classes} classes)")
-except Exception as e:
-    print("Failed to load model:", e)
-    sys.exit(1)
-
-try:
-    scaler = joblib.load(SCALER_PATH)
-    print("Loaded scaler from", SCALER_PATH)
-except Exception:
-    print("Warning: Failed to load scaler")
-    scaler = None
-
 # ------------------ HELPERS ------------------
-def parse_features(row):
-    if isinstance(row, pd.Series) and len(row) > 1:
-        return row.values[:-1]
+def parse_features(values):
+    if len(values) > 1:
+        return np.asarray(values[:-1], dtype=np.float32)
     return None
 
-def predict_row(features):
-    if len(features) != 187:
-        print(f"Warning: Expected 187 features, got {len(features)}")
+def predict_row(predictor, features):
+    if len(features) != N_FEATURES:
+        log.warning("Expected %d features, got %d", N_FEATURES, len(features))
         return None, None, None
-    X = features.reshape(1, 187)
-    if scaler is not None:
-        X = scaler.transform(X)
-    X = X.reshape((1, 187, 1))
-    probs = model.predict(X, verbose=0)
+    with PREDICT_SECONDS.time():
+        probs = predictor.predict(features.reshape(1, N_FEATURES))
     pred_class = int(np.argmax(probs[0]))
     pred_label = ECG_CLASSES.get(pred_class, 'Unknown')
     return pred_class, pred_label, probs[0]
 
-# ------------------ INITIALIZE OUTPUT CSV ------------------
-if not os.path.exists(OUTPUT_CSV):
-    pd.DataFrame(columns=['timestamp', 'features', 'predicted_class', 'class_label', 'class_probabilities']).to_csv(OUTPUT_CSV, index=False)
-    print(f"Created output CSV: {OUTPUT_CSV}")
-
-# Determine starting row
-try:
-    if os.path.exists(OUTPUT_CSV):
-        processed_rows = len(pd.read_csv(OUTPUT_CSV))
-        last_row = max(START_ROW, processed_rows)
-    else:
-        last_row = START_ROW
-except:
-    last_row = START_ROW
-
-print(f"\nStarting live prediction on {INPUT_CSV} from row {last_row}")
-print(f"Writing predictions to {OUTPUT_CSV}")
-print("\nClass meanings:")
-for idx, label in ECG_CLASSES.items():
-    print(f"{idx} ({label}): {['Normal beat', 'Supraventricular premature beat', 'Ventricular premature beat', 'Fusion of ventricular and normal', 'Unclassifiable beat'][idx]}")
-print("\nPress Ctrl+C to stop...\n")
-
 # ------------------ HEARTBEAT SCORING ------------------
 def calculate_heartbeat_score(pred_class, probabilities, true_class):
     """
@@ -109,84 +98,242 @@ def calculate_heartbeat_score(pred_class, probabilities, true_class):
         score = max(1, score)
         return score
 
+def heartbeat_scores(probabilities, true_class):
+    """
+    Vectorized calculate_heartbeat_score for a batch: probabilities (n, classes),
+    true_class (n,) with NaN where the label is unknown.
+    """
+    p_normal = np.asarray(probabilities, dtype=np.float32)[:, 0]
+    true_class = np.asarray(true_class, dtype=np.float32)
+    abnormal = ~np.isnan(true_class) & (true_class != 0)
+    return np.where(abnormal, np.clip(5 - p_normal * 5, 1, 5), p_normal * 10).astype(np.float32)
+
+def write_heart_metrics(heart, path):
+    snapshot = heart.snapshot(PATIENT_ID)
+    if snapshot is not None:
+        for name, window in snapshot["windows"].items():
+            ABNORMAL_BURDEN.set(window["abnormal_burden"] or 0.0, window=name)
+        heart.write_snapshot(path)
+
+
 # ------------------ MAIN LOOP ------------------
-while True:
+def run_live(predictor, input_csv=INPUT_CSV, output_csv=OUTPUT_CSV, status_file=STATUS_FILE, start_row=START_ROW,
+             on_beat=None, should_stop=None, alerts=None, store=None, ring=None, heart=None,
+             heart_path=HEART_METRICS_PATH):
+    """
+    Poll input_csv and classify new rows until Ctrl+C.
+    - alerts (an ecg_alerts.AlertEmitter) sees every status value, so alerts
+      are logged even when no client is polling /ecg/status.
+    - store (a prediction_store.PredictionStore) receives every beat for the
+      /trends rollups; it is flushed once per poll.
+    - the status file is written through a StatusPublisher: atomically, on
+      state change or once per HEARTBEAT, not once per beat.
+    - on_beat(idx, pred_class, classified_at) is called after each status update
+      (classified_at is a time.perf_counter() stamp taken right after predict).
+    - ring (a shm_ring.ShmRing with PREDICTION_DTYPE) gets one record per
+      beat, so the API can read predictions from shared memory.
+    - heart (a heart_metrics.HeartMetrics) gets every beat; its rolling
+      burden/score/run metrics are written to heart_path once a second, and
+      ectopic runs are appended to the alert log.
+    - should_stop() is checked once per poll; returning True ends the loop.
+    """
+    # pandas is only needed for the CSV loop, not for importing this module
+    import pandas as pd
+
+    # Initialize output CSV
+    if not os.path.exists(output_csv):
+        pd.DataFrame(columns=['timestamp', 'features', 'predicted_class', 'class_label', 'class_probabilities']).to_csv(output_csv, index=False)
+        print(f"Created output CSV: {output_csv}")
+
+    # Determine starting row
     try:
-        if not os.path.exists(INPUT_CSV):
-            time.sleep(POLL_INTERVAL)
-            continue
+        if os.path.exists(output_csv):
+            processed_rows = len(pd.read_csv(output_csv))
+            last_row = max(start_row, processed_rows)
+        else:
+            last_row = start_row
+    except:
+        last_row = start_row
 
+    print(f"\nStarting live prediction on {input_csv} from row {last_row}")
+    print(f"Writing predictions to {output_csv}")
+    print("\nClass meanings:")
+    for idx, label in ECG_CLASSES.items():
+        print(f"{idx} ({label}): {CLASS_MEANINGS[idx]}")
+    print("\nPress Ctrl+C to stop...\n")
+
+    status = StatusPublisher(status_file)
+    heart_written_at = 0.0
+
+    while True:
+        if should_stop is not None and should_stop():
+            break
         try:
-            df = pd.read_csv(INPUT_CSV)
-        except Exception as e:
-            if 'No columns to parse from file' in str(e):
+            status.flush()
+            # Also on idle polls, so the burden decays once the stream stops
+            if heart is not None and time.monotonic() - heart_written_at >= HEART_METRICS_SECONDS:
+                write_heart_metrics(heart, heart_path)
+                heart_written_at = time.monotonic()
+            if not os.path.exists(input_csv):
                 time.sleep(POLL_INTERVAL)
                 continue
-            raise
 
-        if df.shape[0] <= last_row:
-            time.sleep(POLL_INTERVAL)
-            continue
+            try:
+                with CSV_READ_SECONDS.time():
+                    df = pd.read_csv(input_csv)
+            except Exception as e:
+                if 'No columns to parse from file' in str(e):
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                raise
 
-        for idx in range(last_row, df.shape[0]):
-            if idx < START_ROW:
+            if df.shape[0] <= last_row:
+                time.sleep(POLL_INTERVAL)
                 continue
 
-            row = df.iloc[idx]
-            features = parse_features(row)
-            if features is None or len(features) < 10:
-                continue
+            for idx in range(last_row, df.shape[0]):
+                BACKLOG_ROWS.set(df.shape[0] - idx)
+                if idx < start_row:
+                    continue
+
+                row = df.iloc[idx]
+                features = parse_features(row.values)
+                if features is None or len(features) < 10:
+                    continue
+
+                pred_class, pred_label, probabilities = predict_row(predictor, features)
+                if pred_class is None:
+                    continue
+                classified_at = time.perf_counter()
+                prob_str = {f"{ECG_CLASSES[i]}": f"{p:.3f}" for i, p in enumerate(probabilities)}
+
+                true_class = None
+                true_label = None
+                if len(row) > 1:
+                    try:
+                        true_class = int(row.iloc[-1])
+                        true_label = ECG_CLASSES.get(true_class, 'Unknown')
+                    except:
+                        pass
+
+                # ---------------- HEARTBEAT SCORING ----------------
+                hb_score = calculate_heartbeat_score(pred_class, probabilities, true_class)
+                # ---------------------------------------------------
+
+                # Write prediction
+                out_row = pd.DataFrame({
+                    'timestamp': [pd.Timestamp.now()],
+                    'features': [';'.join(map(str, features))],
+                    'predicted_class': [pred_class],
+                    'class_label': [pred_label],
+                    'class_probabilities': [str(prob_str)]
+                })
+                with CSV_WRITE_SECONDS.time():
+                    out_row.to_csv(output_csv, mode='a', header=False, index=False)
+                BEATS_TOTAL.inc(label=pred_label)
+
+                status_value = true_class if true_class is not None else pred_class
+                status.publish(status_value)
+
+                if ring is not None:
+                    ring.publish((time.time(), idx, pred_class, -1 if true_class is None else true_class,
+                                  hb_score, probabilities))
+                if heart is not None:
+                    for run in heart.add(PATIENT_ID, time.time(), int(pred_class), probabilities, hb_score):
+                        ECTOPIC_RUNS.inc()
+                        if alerts is not None:
+                            alerts.log.append(run["class"], source=alerts.source, kind="ectopic_run",
+                                              beats=run["beats"], row=idx)
+                if store is not None:
+                    store.add("ecg", time.time(), pred_class, probabilities, float(hb_score))
+                if alerts is not None:
+                    alerts.observe(status_value, row=idx)
+
+                # Log (sampled; the line is only built when it will be emitted)
+                level = logging.INFO if idx % LOG_EVERY == 0 else logging.DEBUG
+                if log.isEnabledFor(level):
+                    if TEST:
+                        prediction_str = f"Row {idx}: Predicted: Class {true_class} ({pred_label})"
+                        if true_class is not None:
+                            prediction_str += f" | True: Class {true_class} ({true_label})"
+                            if pred_class == true_class:
+                                prediction_str += " ✓"
+                        prediction_str += " - " + ", ".join(f"{label}: {prob:.3f}" for label, prob in
+                                                            sorted([(ECG_CLASSES[i], p) for i, p in enumerate(probabilities)]))
+                        prediction_str += f" | Heartbeat Score: {hb_score:.2f}"
+                    else:
+                        prediction_str = f"{true_class} | Heartbeat Score: {hb_score:.2f}"
+                    log.log(level, prediction_str)
+
+                if on_beat is not None:
+                    on_beat(idx, pred_class, classified_at)
+
+            last_row = df.shape[0]
+            BACKLOG_ROWS.set(0)
+            if store is not None:
+                store.flush()
 
-            pred_class, pred_label, probabilities = predict_row(features)
-            prob_str = {f"{ECG_CLASSES[i]}": f"{p:.3f}" for i, p in enumerate(probabilities)}
-
-            true_class = None
-            true_label = None
-            if len(row) > 1:
-                try:
-                    true_class = int(row.iloc[-1])
-                    true_label = ECG_CLASSES.get(true_class, 'Unknown')
-                except:
-                    pass
-
-            # ---------------- HEARTBEAT SCORING ----------------
-            hb_score = calculate_heartbeat_score(pred_class, probabilities, true_class)
-            # ---------------------------------------------------
-
-            # Write prediction
-            out_row = pd.DataFrame({
-                'timestamp': [pd.Timestamp.now()],
-                'features': [';'.join(map(str, features))],
-                'predicted_class': [pred_class],
-                'class_label': [pred_label],
-                'class_probabilities': [str(prob_str)]
-            })
-            out_row.to_csv(OUTPUT_CSV, mode='a', header=False, index=False)
-
-            # Print
-            if TEST:
-                prediction_str = f"Row {idx}: Predicted: Class {true_class} ({pred_label})"
-                if true_class is not None:
-                    prediction_str += f" | True: Class {true_class} ({true_label})"
-                    if pred_class == true_class:
-                        prediction_str += " ✓"
-                prediction_str += " - " + ", ".join(f"{label}: {prob:.3f}" for label, prob in 
-                                                    sorted([(ECG_CLASSES[i], p) for i, p in enumerate(probabilities)]))
-                prediction_str += f" | Heartbeat Score: {hb_score:.2f}"
-            else:
-                prediction_str = f"{true_class} | Heartbeat Score: {hb_score:.2f}"
-            
-            with open("ecg_live_status.txt", "w") as f:
-                f.write(str(true_class))
-            print(prediction_str)
-
-        last_row = df.shape[0]
-
-    except KeyboardInterrupt:
-        print("\nStopping live prediction...")
-        break
+        except KeyboardInterrupt:
+            print("\nStopping live prediction...")
+            break
+        except Exception as e:
+            log.error("Error: %s", e)
+            time.sleep(POLL_INTERVAL)
+
+    status.close()
+    print("Live prediction stopped.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Live ECG beat classification.")
+    parser.add_argument("--backend", choices=["auto", "keras", "tflite", "fused"], default="auto",
+                        help="auto uses an exported fused/TFLite model when present")
+    parser.add_argument("--input", default=INPUT_CSV)
+    parser.add_argument("--output", default=OUTPUT_CSV)
+    parser.add_argument("--start-row", type=int, default=START_ROW)
+    parser.add_argument("--log-level", default="INFO", help="DEBUG logs every beat")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="0 disables /metrics")
+    parser.add_argument("--alert-log", default=str(REPO_DIR / ALERT_LOG), help="append-only alert log read by /ecg/alerts")
+    parser.add_argument("--store", default=str(REPO_DIR / STORE_PATH), help="prediction time-series store ('' disables)")
+    parser.add_argument("--status-path", default=STATUS_FILE, help="status file read by /ecg/status")
+    parser.add_argument("--ring", default=RING_NAME, help="shared-memory ring name for predictions ('' disables)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(message)s")
+    signal.signal(signal.SIGINT, signal_handler)
+    if args.metrics_port:
+        try:
+            metrics.start_http_server(args.metrics_port)
+            print(f"Metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+        except OSError as e:
+            # Usually another classifier already serving that port; classify without /metrics
+            log.warning("Metrics port %d unavailable (%s); continuing without /metrics", args.metrics_port, e)
+
+    # ------------------ LOAD MODEL ------------------
+    try:
+        predictor = load_predictor(args.backend)
+        print(f"Loaded {predictor.backend} ECG model ({predictor.n_classes} classes)")
     except Exception as e:
-        print(f"Error: {e}")
-        time.sleep(POLL_INTERVAL)
+        print("Failed to load model:", e)
+        sys.exit(1)
+
+    if predictor.scaler is None and predictor.backend != "fused":
+        print("Warning: Failed to load scaler")
+
+    alerts = AlertEmitter(AlertLog(args.alert_log), source="live")
+    store = PredictionStore(args.store) if args.store else None
+    ring = ShmRing.create(args.ring, PREDICTION_DTYPE) if args.ring else None
+    if ring is not None:
+        print(f"Publishing predictions to shared-memory ring {ring.name!r}")
+    try:
+        run_live(predictor, args.input, args.output, args.status_path, args.start_row, alerts=alerts, store=store,
+                 ring=ring, heart=HeartMetrics())
+    finally:
+        if store is not None:
+            store.close()
+        if ring is not None:
+            ring.close()
+
 
-print("Live prediction stopped.")
+if __name__ == "__main__":
+    main()
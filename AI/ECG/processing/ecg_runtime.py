@@ -0,0 +1,371 @@
+"""Lazy model loading for the ECG classifier.
+
+Importing this module only pulls in NumPy. TensorFlow, joblib and
+scikit-learn are imported inside the loaders, so the server and CLI tools
+can import it at startup and only pay for a framework when a predictor is
+actually built.
+
+Run as a module to export the Keras model to a lightweight runtime:
+
+    python -m AI.ECG.processing.ecg_runtime --export tflite
+    python -m AI.ECG.processing.ecg_runtime --export fused --quantize float16 \
+        --check AI/ECG/data_ecg/mitbih_test.csv
+
+The "fused" artifact is a plain .npz of dense layers with the StandardScaler
+folded into the first layer, evaluated with NumPy matmuls.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# ------------------ CONFIG ------------------
+MODEL_PATH = "AI/ECG/Models/ecg_model.h5"
+SCALER_PATH = "AI/ECG/Models/ecg_scaler.pkl"
+TFLITE_PATH = "AI/ECG/Models/ecg_model.tflite"
+SCALER_NPZ_PATH = "AI/ECG/Models/ecg_scaler.npz"
+FUSED_PATH = "AI/ECG/Models/ecg_model_fused.npz"
+TEST_CSV = "AI/ECG/data_ecg/mitbih_test.csv"
+N_FEATURES = 187
+
+QUANTIZE_MODES = ("none", "float16", "int8")
+
+
+# ------------------ SCALER ------------------
+class ArrayScaler:
+    """StandardScaler.transform without scikit-learn: (X - mean) / scale."""
+
+    def __init__(self, mean, scale):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float32)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float32) - self.mean) / self.scale
+
+
+def load_scaler(scaler_path=SCALER_PATH, npz_path=SCALER_NPZ_PATH):
+    """Load the fitted scaler, preferring the exported .npz (no sklearn import)."""
+    if npz_path and os.path.exists(npz_path):
+        params = np.load(npz_path)
+        return ArrayScaler(params["mean"], params["scale"])
+    if scaler_path and os.path.exists(scaler_path):
+        import joblib
+        return joblib.load(scaler_path)
+    return None
+
+
+def export_scaler(scaler_path=SCALER_PATH, npz_path=SCALER_NPZ_PATH):
+    """Write mean/scale of the pickled StandardScaler to a plain .npz file."""
+    import joblib
+    scaler = joblib.load(scaler_path)
+    scale = np.where(scaler.scale_ == 0, 1.0, scaler.scale_)
+    np.savez(npz_path, mean=scaler.mean_.astype(np.float32), scale=scale.astype(np.float32))
+    print(f"Scaler parameters saved to {npz_path}")
+    return npz_path
+
+
+# ------------------ PREDICTORS ------------------
+class KerasPredictor:
+    """Full Keras model. Imports TensorFlow on construction."""
+
+    backend = "keras"
+
+    def __init__(self, model_path=MODEL_PATH, scaler_path=SCALER_PATH, npz_path=SCALER_NPZ_PATH):
+        from tensorflow.keras.models import load_model
+
+        self.model = load_model(model_path)
+        self.input_shape = tuple(self.model.input_shape[1:])
+        self.n_classes = int(self.model.output_shape[-1])
+        self.scaler = load_scaler(scaler_path, npz_path)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32).reshape(-1, N_FEATURES)
+        if self.scaler is not None:
+            X = self.scaler.transform(X)
+        X = X.reshape((-1,) + self.input_shape)
+        return self.model.predict(X, verbose=0)
+
+
+def _tflite_interpreter_class():
+    """Find a TFLite interpreter, lightest runtime first."""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLitePredictor:
+    """Exported TFLite model, run with tflite_runtime when it is installed."""
+
+    backend = "tflite"
+
+    def __init__(self, tflite_path=TFLITE_PATH, scaler_path=SCALER_PATH, npz_path=SCALER_NPZ_PATH):
+        Interpreter = _tflite_interpreter_class()
+        self.interpreter = Interpreter(model_path=tflite_path)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.input_shape = tuple(int(d) for d in self._input["shape"][1:])
+        self.n_classes = int(self._output["shape"][-1])
+        self.scaler = load_scaler(scaler_path, npz_path)
+        self._batch = int(self._input["shape"][0])
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32).reshape(-1, N_FEATURES)
+        if self.scaler is not None:
+            X = self.scaler.transform(X)
+        X = X.reshape((-1,) + self.input_shape).astype(np.float32)
+        if X.shape[0] != self._batch:
+            self.interpreter.resize_tensor_input(self._input["index"], X.shape)
+            self.interpreter.allocate_tensors()
+            self._batch = X.shape[0]
+        self.interpreter.set_tensor(self._input["index"], X)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self._output["index"]).copy()
+
+
+_ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0, out=x),
+    "sigmoid": lambda x: 1.0 / (1.0 + np.exp(-x)),
+    "tanh": np.tanh,
+}
+
+
+def _softmax(x):
+    x = x - x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+
+class FusedPredictor:
+    """Dense layers from a fused .npz artifact, evaluated with NumPy only."""
+
+    backend = "fused"
+    scaler = None  # folded into the first layer
+
+    def __init__(self, fused_path=FUSED_PATH):
+        artifact = np.load(fused_path)
+        self.quantize = str(artifact["quantize"])
+        self.layers = []
+        for i in range(int(artifact["n_layers"])):
+            W = artifact[f"W{i}"].astype(np.float32)
+            if self.quantize == "int8":
+                W *= artifact[f"Ws{i}"]
+            activation = str(artifact[f"act{i}"])
+            if activation != "softmax" and activation not in _ACTIVATIONS:
+                raise ValueError(f"Unsupported activation in {fused_path}: {activation}")
+            self.layers.append((W, artifact[f"b{i}"].astype(np.float32), activation))
+        self.input_shape = (self.layers[0][0].shape[0],)
+        self.n_classes = int(self.layers[-1][0].shape[1])
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32).reshape(-1, N_FEATURES)
+        for W, b, activation in self.layers:
+            X = X @ W
+            X += b
+            X = _softmax(X) if activation == "softmax" else _ACTIVATIONS[activation](X)
+        return X
+
+
+def load_predictor(backend="auto", model_path=MODEL_PATH, scaler_path=SCALER_PATH, tflite_path=TFLITE_PATH,
+                   fused_path=FUSED_PATH):
+    """
+    Build a predictor exposing .predict(X) -> (n, n_classes) probabilities.
+    - "auto" prefers the fused NumPy artifact, then TFLite, then Keras.
+    """
+    if backend == "auto":
+        if os.path.exists(fused_path):
+            backend = "fused"
+        elif os.path.exists(tflite_path):
+            backend = "tflite"
+        else:
+            backend = "keras"
+    if backend == "fused":
+        return FusedPredictor(fused_path)
+    if backend == "tflite":
+        return TFLitePredictor(tflite_path, scaler_path)
+    if backend == "keras":
+        return KerasPredictor(model_path, scaler_path)
+    raise ValueError(f"Unknown ECG backend: {backend}")
+
+
+# ------------------ EXPORT ------------------
+def export_tflite(model_path=MODEL_PATH, out_path=TFLITE_PATH, quantize="none"):
+    """Convert the Keras model to a TFLite flatbuffer (optionally quantized)."""
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(model_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize != "none":
+        # int8 is dynamic-range quantization: int8 weights, float activations
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantize == "float16":
+            converter.target_spec.supported_types = [tf.float16]
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+    print(f"TFLite model ({quantize}) saved to {out_path}")
+    return out_path
+
+
+def _scaler_affine(scaler):
+    """Express scaler.transform as x * scale + shift."""
+    mean = np.asarray(getattr(scaler, "mean_", getattr(scaler, "mean", 0.0)), dtype=np.float64)
+    std = np.asarray(getattr(scaler, "scale_", getattr(scaler, "scale", 1.0)), dtype=np.float64)
+    std = np.where(std == 0, 1.0, std)
+    return 1.0 / std, -mean / std
+
+
+def fuse_layers(model, scaler=None):
+    """
+    Flatten a Keras Sequential model into (W, b, activation) dense layers.
+    - The scaler and any BatchNormalization become a per-feature affine that
+      is folded into the weights of the next Dense layer.
+    - Dropout / InputLayer / Flatten are inference no-ops and are skipped.
+    """
+    layers = []
+    pending = _scaler_affine(scaler) if scaler is not None else None
+
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        if kind in ("InputLayer", "Dropout", "Flatten"):
+            continue
+        if kind == "Dense":
+            weights = layer.get_weights()
+            W = weights[0].astype(np.float64)
+            b = weights[1].astype(np.float64) if len(weights) > 1 else np.zeros(W.shape[1])
+            if pending is not None:
+                scale, shift = pending
+                b = b + shift @ W
+                W = scale[:, None] * W
+                pending = None
+            layers.append([W, b, layer.activation.__name__])
+        elif kind == "BatchNormalization":
+            n = layer.moving_mean.shape[-1]
+            gamma = np.asarray(layer.gamma) if layer.scale else np.ones(n)
+            beta = np.asarray(layer.beta) if layer.center else np.zeros(n)
+            g = gamma / np.sqrt(np.asarray(layer.moving_variance) + layer.epsilon)
+            c = beta - np.asarray(layer.moving_mean) * g
+            if pending is None:
+                pending = (g, c)
+            else:
+                pending = (pending[0] * g, pending[1] * g + c)
+        elif kind == "Activation" and layers and layers[-1][2] == "linear" and pending is None:
+            layers[-1][2] = layer.activation.__name__
+        else:
+            raise ValueError(f"Cannot fuse layer {layer.name} ({kind}); export to TFLite instead")
+
+    if pending is not None:
+        # Trailing affine (e.g. BatchNormalization as the last layer)
+        layers.append([np.diag(pending[0]), pending[1], "linear"])
+    return layers
+
+
+def export_fused(model_path=MODEL_PATH, scaler_path=SCALER_PATH, out_path=FUSED_PATH, quantize="none"):
+    """Write the model with its scaler folded in as a single .npz artifact."""
+    from tensorflow.keras.models import load_model
+
+    model = load_model(model_path)
+    scaler = load_scaler(scaler_path, None)
+    layers = fuse_layers(model, scaler)
+
+    arrays = {"n_layers": np.array(len(layers)), "quantize": np.array(quantize)}
+    for i, (W, b, activation) in enumerate(layers):
+        if quantize == "int8":
+            # Symmetric per-output-column weight quantization
+            Ws = np.abs(W).max(axis=0) / 127.0
+            Ws[Ws == 0] = 1.0
+            arrays[f"W{i}"] = np.round(W / Ws).astype(np.int8)
+            arrays[f"Ws{i}"] = Ws.astype(np.float32)
+        elif quantize == "float16":
+            arrays[f"W{i}"] = W.astype(np.float16)
+        else:
+            arrays[f"W{i}"] = W.astype(np.float32)
+        arrays[f"b{i}"] = b.astype(np.float32)
+        arrays[f"act{i}"] = np.array(activation)
+    np.savez(out_path, **arrays)
+    print(f"Fused model ({len(layers)} dense layers, {quantize}) saved to {out_path}")
+    return out_path
+
+
+# ------------------ PARITY CHECK ------------------
+def check_parity(candidate, reference, csv_path=TEST_CSV, batch_size=1024):
+    """
+    Compare a predictor against the Keras reference on the MIT-BIH test split
+    (headerless CSV, 187 features + label). Returns a dict of metrics.
+    """
+    data = np.loadtxt(csv_path, delimiter=",", dtype=np.float32)
+    X, y = data[:, :N_FEATURES], data[:, -1].astype(int)
+
+    def run(predictor):
+        start = time.perf_counter()
+        probs = np.concatenate([predictor.predict(X[i:i + batch_size]) for i in range(0, len(X), batch_size)])
+        batch_s = time.perf_counter() - start
+        start = time.perf_counter()
+        for row in X[:200]:
+            predictor.predict(row)
+        single_ms = (time.perf_counter() - start) / min(200, len(X)) * 1000
+        return probs, batch_s, single_ms
+
+    ref_probs, ref_batch_s, ref_single_ms = run(reference)
+    cand_probs, cand_batch_s, cand_single_ms = run(candidate)
+    ref_pred, cand_pred = ref_probs.argmax(axis=1), cand_probs.argmax(axis=1)
+
+    return {
+        "rows": int(len(X)),
+        "reference_accuracy": float((ref_pred == y).mean()),
+        "candidate_accuracy": float((cand_pred == y).mean()),
+        "argmax_agreement": float((ref_pred == cand_pred).mean()),
+        "max_abs_prob_diff": float(np.abs(ref_probs - cand_probs).max()),
+        "reference_beats_per_s": len(X) / ref_batch_s,
+        "candidate_beats_per_s": len(X) / cand_batch_s,
+        "reference_single_beat_ms": ref_single_ms,
+        "candidate_single_beat_ms": cand_single_ms,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the ECG model to a lightweight runtime.")
+    parser.add_argument("--export", choices=["tflite", "fused"], required=True)
+    parser.add_argument("--quantize", choices=QUANTIZE_MODES, default="none")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--scaler", default=SCALER_PATH)
+    parser.add_argument("--out", default=None, help="artifact path (defaults per export type)")
+    parser.add_argument("--check", metavar="CSV", nargs="?", const=TEST_CSV, default=None,
+                        help="compare against the Keras model on this CSV (default: MIT-BIH test split)")
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    args = parser.parse_args(argv)
+
+    if args.export == "tflite":
+        out = export_tflite(args.model, args.out or TFLITE_PATH, args.quantize)
+        if os.path.exists(args.scaler):
+            export_scaler(args.scaler, SCALER_NPZ_PATH)
+        candidate = lambda: TFLitePredictor(out, args.scaler)
+    else:
+        out = export_fused(args.model, args.scaler, args.out or FUSED_PATH, args.quantize)
+        candidate = lambda: FusedPredictor(out)
+
+    if args.check:
+        metrics = check_parity(candidate(), KerasPredictor(args.model, args.scaler, None), args.check)
+        for key, value in metrics.items():
+            print(f"{key:>26}: {value:.4f}" if isinstance(value, float) else f"{key:>26}: {value}")
+        if metrics["argmax_agreement"] < args.min_agreement:
+            print(f"Parity check FAILED: agreement below {args.min_agreement}")
+            sys.exit(1)
+        print("Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""Multi-device ECG supervisor.
+
+Watches a directory of per-device CSV streams (one `<device>.csv` per
+patient, same row format as `ecg_live.csv`) and shards the devices across a
+pool of worker processes. Each worker loads the model once and stays warm.
+
+Beats never go through pickling: every worker owns a shared-memory block with
+two batch slots (input features + output probabilities). The supervisor
+copies new rows into a free slot and only sends (slot, device, n) through the
+job queue; the worker writes probabilities back into the same slot.
+
+    python -m AI.ECG.processing.ecg_supervisor --watch AI/ECG/data_ecg/devices --workers 8
+"""
+
+import argparse
+import io
+import json
+import multiprocessing as mp
+import os
+import queue
+import signal
+import sys
+import time
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+
+from ecg_alerts import ALERT_LOG, AlertEmitter, AlertLog
+from prediction_store import STORE_PATH, PredictionStore
+from AI.ECG.processing.ecg_processing import ECG_CLASSES, REPO_DIR, calculate_heartbeat_score
+from AI.ECG.processing.ecg_runtime import N_FEATURES, load_predictor
+from AI.ECG.processing.status_publisher import StatusPublisher
+
+# ------------------ CONFIG ------------------
+WATCH_DIR = "AI/ECG/data_ecg/devices"
+OUTPUT_DIR = "AI/Data/devices"
+# Resolved like server.py does, so /ecg/alerts reads the log the supervisor writes
+ALERT_LOG_PATH = str(REPO_DIR / ALERT_LOG)
+# Same store as the server's /trends (PREDICTION_STORE)
+STORE_FILE = str(REPO_DIR / STORE_PATH)
+MAX_BATCH = 256
+SLOTS_PER_WORKER = 2
+SCAN_INTERVAL = 1.0
+POLL_INTERVAL = 0.05
+STATS_INTERVAL = 10.0
+MAX_RESTARTS = 3  # per worker; after that its devices move to the other workers
+N_CLASSES = len(ECG_CLASSES)
+
+
+# ------------------ SHARED MEMORY LAYOUT ------------------
+def slot_views(shm, max_batch=MAX_BATCH, slots=SLOTS_PER_WORKER):
+    """Return (inputs, outputs) float32 views of shape (slots, max_batch, ...)."""
+    n_in = slots * max_batch * N_FEATURES
+    inputs = np.ndarray((slots, max_batch, N_FEATURES), dtype=np.float32, buffer=shm.buf)
+    outputs = np.ndarray((slots, max_batch, N_CLASSES), dtype=np.float32, buffer=shm.buf, offset=n_in * 4)
+    return inputs, outputs
+
+
+def shm_size(max_batch=MAX_BATCH, slots=SLOTS_PER_WORKER):
+    return slots * max_batch * (N_FEATURES + N_CLASSES) * 4
+
+
+# ------------------ WORKER ------------------
+def worker_main(worker_id, shm_name, backend, max_batch, jobs, results):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor owns shutdown
+    shm = shared_memory.SharedMemory(name=shm_name)
+    inputs, outputs = slot_views(shm, max_batch)
+
+    try:
+        predictor = load_predictor(backend)
+        if predictor.n_classes != N_CLASSES:
+            raise ValueError(f"model has {predictor.n_classes} classes, expected {N_CLASSES}")
+    except Exception as e:
+        results.put(("error", worker_id, repr(e)))
+        shm.close()
+        return
+
+    results.put(("ready", worker_id, predictor.backend))
+    beats = batches = 0
+    busy_s = 0.0
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        slot, device, n = job
+        start = time.perf_counter()
+        outputs[slot, :n] = predictor.predict(inputs[slot, :n])
+        busy_s += time.perf_counter() - start
+        beats += n
+        batches += 1
+        results.put(("done", worker_id, slot, device, n, (beats, batches, busy_s), os.getpid()))
+
+    del inputs, outputs
+    shm.close()
+
+
+# ------------------ DEVICE STREAMS ------------------
+class DeviceStream:
+    """Tails one device CSV and buffers complete, parsed rows; unparseable lines go to `quarantine`."""
+
+    def __init__(self, path, worker_id, quarantine=None):
+        self.path = path
+        self.device = path.stem
+        self.worker_id = worker_id
+        self.quarantine = quarantine
+        self.offset = 0
+        self.partial = b""
+        self.pending = np.empty((0, N_FEATURES), dtype=np.float32)
+        self.beats = 0
+        self.rejected = 0
+
+    def poll(self):
+        try:
+            size = self.path.stat().st_size
+            if size < self.offset:
+                # File was truncated / rotated: start again from the top
+                self.offset, self.partial = 0, b""
+            if size == self.offset:
+                return 0
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                chunk = f.read(size - self.offset)
+        except OSError:
+            return 0
+        self.offset += len(chunk)
+
+        data = self.partial + chunk
+        cut = data.rfind(b"\n") + 1
+        self.partial = data[cut:]
+        # Skip blank lines and header rows
+        lines = [line for line in data[:cut].splitlines() if line[:1] and line[:1] in b"0123456789-+."]
+        if not lines:
+            return 0
+
+        try:
+            rows = np.loadtxt(io.BytesIO(b"\n".join(lines)), delimiter=",", dtype=np.float32, ndmin=2)
+            if rows.shape[1] < N_FEATURES:
+                raise ValueError(f"expected {N_FEATURES}+ columns, got {rows.shape[1]}")
+            rows = rows[:, :N_FEATURES]
+        except ValueError:
+            # A bad line must not take the other devices down: keep the good rows, set the rest aside
+            rows = self._parse_lines(lines)
+        if len(rows):
+            self.pending = np.concatenate([self.pending, rows])
+        return len(rows)
+
+    def _parse_lines(self, lines):
+        rows, bad = [], []
+        for line in lines:
+            try:
+                row = np.array(line.split(b","), dtype=np.float32)
+            except ValueError:
+                row = None
+            if row is None or len(row) < N_FEATURES:
+                bad.append(line)
+            else:
+                rows.append(row[:N_FEATURES])
+        self.rejected += len(bad)
+        print(f"[supervisor] {self.device}: skipped {len(bad)} malformed line(s)"
+              + (f", kept in {self.quarantine}" if self.quarantine else ""))
+        if self.quarantine:
+            with open(self.quarantine, "ab") as f:
+                f.write(b"\n".join(bad) + b"\n")
+        return np.array(rows, dtype=np.float32).reshape(-1, N_FEATURES)
+
+    def take(self, max_rows):
+        batch, self.pending = self.pending[:max_rows], self.pending[max_rows:]
+        return batch
+
+
+class DeviceOutput:
+    """Per-device prediction CSV, latest-class status file and alert stream."""
+
+    def __init__(self, out_dir, device, alert_log=None, store=None):
+        self.csv_path = out_dir / f"{device}_predictions.csv"
+        self.status_path = out_dir / f"{device}_status.txt"
+        # Atomic, coalesced writes, as for the live classifier's status file
+        self.status = StatusPublisher(self.status_path)
+        self.alerts = AlertEmitter(alert_log, source=device) if alert_log is not None else None
+        self.device = device
+        self.store = store
+        if not self.csv_path.exists():
+            with open(self.csv_path, "w") as f:
+                f.write("timestamp,predicted_class,class_label,heartbeat_score," +
+                        ",".join(f"p_{ECG_CLASSES[i]}" for i in range(N_CLASSES)) + "\n")
+
+    def write(self, probs):
+        now = time.time()
+        classes = probs.argmax(axis=1)
+        lines = []
+        rows = []
+        for pred_class, p in zip(classes, probs):
+            # Device streams carry no labels
+            score = calculate_heartbeat_score(int(pred_class), p, None)
+            rows.append(("ecg", self.device, now, int(pred_class), p, float(score)))
+            lines.append(f"{now:.3f},{pred_class},{ECG_CLASSES[int(pred_class)]},{score:.2f}," +
+                         ",".join(f"{v:.4f}" for v in p))
+        with open(self.csv_path, "a") as f:
+            f.write("\n".join(lines) + "\n")
+        for pred_class in classes:
+            self.status.publish(int(pred_class), ts=now)
+        if self.store is not None:
+            self.store.add_many(rows)
+        if self.alerts is not None:
+            for pred_class in classes:
+                self.alerts.observe(int(pred_class), now=now)
+
+
+# ------------------ SUPERVISOR ------------------
+class Supervisor:
+    def __init__(self, watch_dir, out_dir, n_workers, backend="auto", max_batch=MAX_BATCH,
+                 alert_log=ALERT_LOG_PATH, store=STORE_FILE):
+        self.watch_dir = Path(watch_dir)
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.n_workers = n_workers
+        self.backend = backend
+        self.max_batch = max_batch
+
+        self.ctx = mp.get_context("spawn")
+        self.results = self.ctx.Queue()
+        self.workers = []      # (process, jobs queue, shm)
+        self.free_slots = []   # per worker: list of free slot indices
+        self.inflight = []     # per worker: slot -> device of batches sent but not returned
+        self.restarts = []     # per worker: respawn count
+        self.retired = set()   # workers past MAX_RESTARTS
+        self.views = []        # per worker: (inputs, outputs)
+        self.devices = {}      # device -> DeviceStream
+        self.outputs = {}      # device -> DeviceOutput
+        self.alert_log = AlertLog(alert_log)
+        self.store = PredictionStore(store) if store else None
+        self.stats = {}        # worker -> (beats, batches, busy_s)
+        self.started = time.time()
+
+    def start(self):
+        # One BLAS / TF thread per worker so N workers map onto N cores
+        for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                    "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"):
+            os.environ.setdefault(var, "1")
+
+        for worker_id in range(self.n_workers):
+            shm = shared_memory.SharedMemory(create=True, size=shm_size(self.max_batch))
+            self.workers.append(self._spawn(worker_id, shm))
+            self.free_slots.append(list(range(SLOTS_PER_WORKER)))
+            self.inflight.append({})
+            self.restarts.append(0)
+            self.views.append(slot_views(shm, self.max_batch))
+            self.stats[worker_id] = (0, 0, 0.0)
+
+        ready = 0
+        while ready < self.n_workers:
+            msg = self.results.get()
+            if msg[0] == "error":
+                raise RuntimeError(f"worker {msg[1]} failed to load model: {msg[2]}")
+            print(f"[supervisor] worker {msg[1]} ready ({msg[2]})")
+            ready += 1
+
+    def _spawn(self, worker_id, shm):
+        jobs = self.ctx.Queue()
+        proc = self.ctx.Process(target=worker_main, name=f"ecg-worker-{worker_id}", daemon=True,
+                                args=(worker_id, shm.name, self.backend, self.max_batch, jobs, self.results))
+        proc.start()
+        return proc, jobs, shm
+
+    def check_workers(self):
+        """Respawn workers that died; batches they held are dropped. Past MAX_RESTARTS, move their devices."""
+        for worker_id, (proc, jobs, shm) in enumerate(self.workers):
+            if worker_id in self.retired or proc.is_alive():
+                continue
+            lost = self.inflight[worker_id]
+            if lost:
+                print(f"[supervisor] dropped {len(lost)} batch(es) of {sorted(set(lost.values()))} "
+                      f"held by worker {worker_id}")
+            lost.clear()
+            self.free_slots[worker_id] = list(range(SLOTS_PER_WORKER))
+            jobs.close()
+            if self.restarts[worker_id] < MAX_RESTARTS:
+                self.restarts[worker_id] += 1
+                print(f"[supervisor] worker {worker_id} exited ({proc.exitcode}), "
+                      f"respawning ({self.restarts[worker_id]}/{MAX_RESTARTS})")
+                self.workers[worker_id] = self._spawn(worker_id, shm)
+                continue
+            self.retired.add(worker_id)
+            alive = [w for w in range(self.n_workers) if w not in self.retired]
+            if not alive:
+                raise RuntimeError(f"all ECG workers died (last exit code {proc.exitcode})")
+            print(f"[supervisor] worker {worker_id} exited ({proc.exitcode}) {MAX_RESTARTS} times, "
+                  f"moving its devices to workers {alive}")
+            for stream in self.devices.values():
+                if stream.worker_id == worker_id:
+                    stream.worker_id = self._least_loaded()
+
+    def _least_loaded(self):
+        load = {w: 0 for w in range(self.n_workers) if w not in self.retired}
+        for stream in self.devices.values():
+            if stream.worker_id in load:
+                load[stream.worker_id] += 1
+        return min(load, key=load.get)
+
+    def scan(self):
+        for path in sorted(self.watch_dir.glob("*.csv")):
+            if path.stem in self.devices:
+                continue
+            # Sticky assignment to the worker with the fewest devices
+            worker_id = self._least_loaded()
+            self.devices[path.stem] = DeviceStream(path, worker_id, self.out_dir / f"{path.stem}_rejected.csv")
+            self.outputs[path.stem] = DeviceOutput(self.out_dir, path.stem, self.alert_log, self.store)
+            print(f"[supervisor] device {path.stem} -> worker {worker_id}")
+
+    def dispatch(self):
+        sent = 0
+        for stream in self.devices.values():
+            stream.poll()
+            free = self.free_slots[stream.worker_id]
+            while len(stream.pending) and free:
+                slot = free.pop()
+                batch = stream.take(self.max_batch)
+                inputs, _ = self.views[stream.worker_id]
+                inputs[slot, :len(batch)] = batch
+                self.workers[stream.worker_id][1].put((slot, stream.device, len(batch)))
+                self.inflight[stream.worker_id][slot] = stream.device
+                sent += len(batch)
+        return sent
+
+    def collect(self, timeout):
+        done = 0
+        try:
+            msg = self.results.get(timeout=timeout)
+        except queue.Empty:
+            return 0
+        while True:
+            if msg[0] == "done":
+                _, worker_id, slot, device, n, stats, pid = msg
+                # A dead worker's slots were already reclaimed; ignore results it sent before dying
+                if pid == self.workers[worker_id][0].pid and self.inflight[worker_id].pop(slot, None) == device:
+                    _, outputs = self.views[worker_id]
+                    self.outputs[device].write(outputs[slot, :n].copy())
+                    self.devices[device].beats += n
+                    self.free_slots[worker_id].append(slot)
+                    self.stats[worker_id] = stats
+                    done += n
+            elif msg[0] == "ready":
+                print(f"[supervisor] worker {msg[1]} ready ({msg[2]})")
+            elif msg[0] == "error":
+                print(f"[supervisor] worker {msg[1]} failed to load model: {msg[2]}")
+            try:
+                msg = self.results.get_nowait()
+            except queue.Empty:
+                return done
+
+    def report(self):
+        elapsed = max(time.time() - self.started, 1e-9)
+        workers = {}
+        for worker_id, (beats, batches, busy_s) in self.stats.items():
+            workers[worker_id] = {
+                "beats": beats,
+                "batches": batches,
+                "beats_per_s": beats / elapsed,
+                "busy_pct": 100.0 * busy_s / elapsed,
+                "devices": sum(1 for s in self.devices.values() if s.worker_id == worker_id),
+            }
+            print(f"[supervisor] worker {worker_id}: {beats} beats, {beats / elapsed:.0f} beats/s, "
+                  f"busy {100.0 * busy_s / elapsed:.1f}%")
+        summary = {
+            "elapsed_s": elapsed,
+            "workers": workers,
+            "restarts": dict(enumerate(self.restarts)),
+            "devices": {d: {"worker": s.worker_id, "beats": s.beats, "pending": len(s.pending), "rejected": s.rejected}
+                        for d, s in self.devices.items()},
+        }
+        with open(self.out_dir / "supervisor_stats.json", "w") as f:
+            json.dump(summary, f, indent=2)
+
+    def run(self):
+        last_scan = last_stats = 0.0
+        while True:
+            now = time.time()
+            if now - last_scan >= SCAN_INTERVAL:
+                self.scan()
+                last_scan = now
+            self.check_workers()
+            self.dispatch()
+            self.collect(POLL_INTERVAL)
+            for output in self.outputs.values():
+                output.status.flush()
+            if now - last_stats >= STATS_INTERVAL:
+                self.report()
+                last_stats = now
+
+    def stop(self):
+        # Runs after errors too (model load failure, all workers dead): always unlink the blocks and close the store
+        for worker_id, (_, jobs, _) in enumerate(self.workers):
+            if worker_id in self.retired:
+                continue  # its queue was closed when it died
+            try:
+                jobs.put(None)
+            except (ValueError, OSError):
+                pass
+        for proc, _, _ in self.workers:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self.views.clear()
+        for output in self.outputs.values():
+            output.status.close()
+        for _, _, shm in self.workers:
+            shm.close()
+            shm.unlink()
+        if self.store is not None:
+            self.store.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify many ECG device streams with a worker pool.")
+    parser.add_argument("--watch", default=WATCH_DIR, help="directory of per-device CSV streams")
+    parser.add_argument("--out-dir", default=OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--backend", choices=["auto", "keras", "tflite", "fused"], default="auto")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--alert-log", default=ALERT_LOG_PATH, help="append-only alert log read by /ecg/alerts")
+    parser.add_argument("--store", default=STORE_FILE, help="prediction time-series store read by /trends ('' disables)")
+    args = parser.parse_args(argv)
+
+    # SIGTERM takes the same path as Ctrl+C so shared memory is unlinked
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    supervisor = Supervisor(args.watch, args.out_dir, args.workers, args.backend, args.max_batch, args.alert_log,
+                            args.store)
+    print(f"Starting {args.workers} ECG workers, watching {args.watch}")
+    try:
+        supervisor.start()
+        supervisor.run()
+    except KeyboardInterrupt:
+        print("\nStopping supervisor...")
+    finally:
+        supervisor.report()
+        supervisor.stop()
+
+
+if __name__ == "__main__":
+    main()
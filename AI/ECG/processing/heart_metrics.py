@@ -0,0 +1,272 @@
+"""Rolling heart-health metrics over the live beat stream.
+
+Per patient, the last CAPACITY classified beats (timestamp, class, heartbeat
+score, class probabilities) live in NumPy ring buffers. For each window in
+WINDOWS (1, 5 and 60 minutes) running sums are kept:
+- beats and per-class counts -> abnormal beat burden (S, V and F beats over
+  all beats) and the unclassifiable share,
+- summed class probabilities -> mean probabilities,
+- a heartbeat score histogram -> mean and percentiles of the score.
+
+A new batch of beats is aggregated once (bincount) and added to every
+window. Each window then advances its tail past beats older than the window
+and subtracts just those beats. Every beat is added and evicted once per
+window, so an update is O(1) amortized and a snapshot never rescans history.
+
+Ectopic runs (consecutive abnormal beats) are found with a vectorized
+run-length pass that carries the open run across batches. Completed runs of
+2 beats are couplets, and runs of RUN_ALERT or more are reported back to the
+caller for alerting.
+
+    heart = HeartMetrics()
+    runs = heart.add("default", ts, cls, probs, score)   # per beat, or add_batch
+    heart.snapshot("default")["windows"]["5m"]["abnormal_burden"]
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+# ------------------ CONFIG ------------------
+WINDOWS = {"1m": 60.0, "5m": 300.0, "60m": 3600.0}
+CAPACITY = 16384            # beats per patient, ~90 min at 180 bpm
+N_CLASSES = 5
+CLASS_LABELS = ["N", "S", "V", "F", "Q"]
+ABNORMAL_CLASSES = (1, 2, 3)  # S, V, F count towards burden; Q is signal quality, reported separately
+UNCLASSIFIABLE = 4
+SCORE_MAX = 10.0            # calculate_heartbeat_score range
+SCORE_BINS = 20
+RUN_ALERT = 3               # consecutive abnormal beats reported as a run
+SNAPSHOT_PATH = "AI/Data/heart_metrics.json"
+
+
+class _Window:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.tail = 0                                   # oldest beat (sequence number) in the window
+        self.counts = np.zeros(N_CLASSES, dtype=np.int64)
+        self.prob_sum = np.zeros(N_CLASSES, dtype=np.float64)
+        self.score_sum = 0.0
+        self.score_hist = np.zeros(SCORE_BINS, dtype=np.int64)
+        self.forced_until = -np.inf                     # newest beat pushed out by the ring capacity
+
+    def add(self, agg, sign=1):
+        counts, prob_sum, score_sum, hist = agg
+        self.counts += sign * counts
+        self.prob_sum += sign * prob_sum
+        self.score_sum += sign * score_sum
+        self.score_hist += sign * hist
+
+
+def _aggregate(cls, probs, scores):
+    bins = np.clip((scores * (SCORE_BINS / SCORE_MAX)).astype(np.int64), 0, SCORE_BINS - 1)
+    return (np.bincount(cls, minlength=N_CLASSES)[:N_CLASSES], probs.sum(axis=0, dtype=np.float64),
+            float(scores.sum(dtype=np.float64)), np.bincount(bins, minlength=SCORE_BINS))
+
+
+def _hist_percentile(hist, q):
+    total = hist.sum()
+    if not total:
+        return None
+    i = int(np.searchsorted(np.cumsum(hist), q * total))
+    return round((min(i, SCORE_BINS - 1) + 0.5) * SCORE_MAX / SCORE_BINS, 2)
+
+
+class RollingHeart:
+    """Ring buffers and windowed sums for one patient."""
+
+    def __init__(self, capacity=CAPACITY, windows=WINDOWS):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.cls = np.zeros(capacity, dtype=np.int64)
+        self.scores = np.zeros(capacity, dtype=np.float32)
+        self.probs = np.zeros((capacity, N_CLASSES), dtype=np.float32)
+        self.head = 0                                   # beats ever added
+        self.windows = {name: _Window(seconds) for name, seconds in windows.items()}
+        self.horizon = max(windows.values())
+        self.run_len = 0
+        self.run_start = self.run_end = None
+        self.run_counts = np.zeros(N_CLASSES, dtype=np.int64)
+        self.runs = deque()                             # completed runs >= 2 beats within the horizon
+
+    def _seqs(self, start, end):
+        return np.arange(start, end) % self.capacity
+
+    def _aggregate_span(self, start, end):
+        idx = self._seqs(start, end)
+        return _aggregate(self.cls[idx], self.probs[idx], self.scores[idx])
+
+    def _first_at_or_after(self, start, end, t):
+        """First sequence in [start, end) with ts >= t (timestamps are non-decreasing)."""
+        a, b = start % self.capacity, end % self.capacity
+        if end - start == 0:
+            return end
+        if a < b:
+            return start + int(np.searchsorted(self.ts[a:b], t))
+        first = self.ts[a:]
+        i = int(np.searchsorted(first, t))
+        if i < len(first):
+            return start + i
+        return start + len(first) + int(np.searchsorted(self.ts[:b], t))
+
+    def _evict(self, window, new_tail):
+        if new_tail > window.tail:
+            window.add(self._aggregate_span(window.tail, new_tail), sign=-1)
+            window.tail = new_tail
+
+    def _expire(self, window, now):
+        cutoff = now - window.seconds
+        # Common case: the oldest beat is still inside the window, nothing to search
+        if window.tail < self.head and self.ts[window.tail % self.capacity] < cutoff:
+            self._evict(window, self._first_at_or_after(window.tail, self.head, cutoff))
+
+    def _track_runs(self, ts, cls):
+        """Vectorized run-length over the batch, continuing the open run; returns new runs >= RUN_ALERT."""
+        abnormal = np.isin(cls, ABNORMAL_CLASSES)
+        edges = np.diff(np.concatenate(([0], abnormal.astype(np.int8), [0])))
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        completed = []
+        if self.run_len and (len(starts) == 0 or starts[0] != 0):
+            # The open run ended with the last batch
+            completed.append(self._close_run())
+        for s, e in zip(starts.tolist(), ends.tolist()):
+            if not self.run_len:
+                self.run_start = float(ts[s])
+            self.run_len += e - s
+            self.run_end = float(ts[e - 1])
+            self.run_counts += np.bincount(cls[s:e], minlength=N_CLASSES)[:N_CLASSES]
+            if e < len(cls):
+                completed.append(self._close_run())
+        return [run for run in completed if run is not None and run["beats"] >= RUN_ALERT]
+
+    def _close_run(self):
+        run = None
+        if self.run_len >= 2:
+            label = int(self.run_counts.argmax())
+            run = {"start": self.run_start, "end": self.run_end, "beats": self.run_len,
+                   "class": label, "label": CLASS_LABELS[label]}
+            self.runs.append(run)
+        self.run_len = 0
+        self.run_counts[:] = 0
+        return run
+
+    def add_batch(self, ts, cls, probs, scores):
+        """Add beats (arrays in arrival order); returns completed ectopic runs of RUN_ALERT+ beats."""
+        ts = np.asarray(ts, dtype=np.float64).reshape(-1)
+        if not len(ts):
+            return []
+        cls = np.asarray(cls, dtype=np.int64).reshape(-1)
+        probs = np.asarray(probs, dtype=np.float32).reshape(len(ts), N_CLASSES)
+        scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        last = self.ts[(self.head - 1) % self.capacity] if self.head else -np.inf
+        ts = np.maximum.accumulate(np.maximum(ts, last))  # keep the buffer sorted for searchsorted
+        runs = self._track_runs(ts, cls)
+
+        if len(ts) > self.capacity:
+            ts, cls, probs, scores = ts[-self.capacity:], cls[-self.capacity:], probs[-self.capacity:], scores[-self.capacity:]
+        n = len(ts)
+        # Beats about to be overwritten leave every window first
+        floor = self.head + n - self.capacity
+        for window in self.windows.values():
+            if window.tail < floor:
+                window.forced_until = float(self.ts[(floor - 1) % self.capacity])
+                self._evict(window, floor)
+
+        idx = self._seqs(self.head, self.head + n)
+        self.ts[idx], self.cls[idx], self.probs[idx], self.scores[idx] = ts, cls, probs, scores
+        agg = _aggregate(cls, probs, scores)
+        self.head += n
+
+        now = float(ts[-1])
+        for window in self.windows.values():
+            window.add(agg)
+            self._expire(window, now)
+        while self.runs and self.runs[0]["end"] < now - self.horizon:
+            self.runs.popleft()
+        return runs
+
+    def add(self, ts, cls, probs, score):
+        return self.add_batch([ts], [cls], [probs], [score])
+
+    def snapshot(self, now=None):
+        """
+        Windowed metrics as plain JSON-able values at `now` (default time.time(),
+        so beats age out while the stream is quiet; pass it for replayed data).
+        """
+        last = float(self.ts[(self.head - 1) % self.capacity]) if self.head else None
+        now = time.time() if now is None else now
+        windows = {}
+        for name, window in self.windows.items():
+            # Windows only advance on new beats; drop what aged out since then
+            self._expire(window, now)
+            beats = int(window.counts.sum())
+            runs = [r for r in self.runs if r["end"] >= now - window.seconds]
+            windows[name] = {
+                "beats": beats,
+                "abnormal_burden": round(float(window.counts[list(ABNORMAL_CLASSES)].sum()) / beats, 4) if beats else None,
+                "unclassifiable": round(float(window.counts[UNCLASSIFIABLE]) / beats, 4) if beats else None,
+                "class_counts": dict(zip(CLASS_LABELS, window.counts.tolist())),
+                "mean_probabilities": [round(float(p), 4) for p in window.prob_sum / beats] if beats else None,
+                "score": {
+                    "mean": round(window.score_sum / beats, 3) if beats else None,
+                    "p10": _hist_percentile(window.score_hist, 0.10),
+                    "p50": _hist_percentile(window.score_hist, 0.50),
+                    "p90": _hist_percentile(window.score_hist, 0.90),
+                    "histogram": window.score_hist.tolist(),
+                },
+                "couplets": sum(1 for r in runs if r["beats"] == 2),
+                "runs": sum(1 for r in runs if r["beats"] >= RUN_ALERT),
+                "longest_run": max((r["beats"] for r in runs), default=0),
+                "covered_seconds": round(now - float(self.ts[window.tail % self.capacity]), 1)
+                if window.tail < self.head else 0.0,
+                "truncated": window.forced_until >= now - window.seconds,
+            }
+        return {"ts": now, "last_beat": last, "beats_total": self.head, "open_run": self.run_len,
+                "score_bins": [round(SCORE_MAX / SCORE_BINS * i, 2) for i in range(SCORE_BINS + 1)],
+                "windows": windows}
+
+
+class HeartMetrics:
+    """RollingHeart per patient, thread-safe."""
+
+    def __init__(self, capacity=CAPACITY, windows=WINDOWS):
+        self.capacity = capacity
+        self.window_spec = windows
+        self.patients = {}
+        self._lock = threading.Lock()
+
+    def _patient(self, patient):
+        heart = self.patients.get(patient)
+        if heart is None:
+            heart = self.patients[patient] = RollingHeart(self.capacity, self.window_spec)
+        return heart
+
+    def add(self, patient, ts, cls, probs, score):
+        with self._lock:
+            return self._patient(patient).add(ts, cls, probs, score)
+
+    def add_batch(self, patient, ts, cls, probs, scores):
+        with self._lock:
+            return self._patient(patient).add_batch(ts, cls, probs, scores)
+
+    def snapshot(self, patient=None, now=None):
+        """One patient's metrics, or {patient: metrics} for all of them."""
+        with self._lock:
+            if patient is not None:
+                heart = self.patients.get(patient)
+                return heart.snapshot(now) if heart is not None else None
+            return {p: heart.snapshot(now) for p, heart in self.patients.items()}
+
+    def write_snapshot(self, path=SNAPSHOT_PATH):
+        """Write all patients' metrics as JSON (temp file + rename, so readers never see a partial file)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"updated": time.time(), "patients": self.snapshot()}, f)
+        os.replace(tmp, path)
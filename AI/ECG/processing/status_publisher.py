@@ -0,0 +1,101 @@
+"""Atomic, coalesced writes of the live ECG status file.
+
+The status file holds one line, "<value> <seq> <timestamp>":
+- value: the class served by /ecg/status (first token, so readers that only
+  parse an int from the start still work),
+- seq: number of beats published so far,
+- timestamp: time.time() of the beat that was written.
+
+Each write goes to a temp file in the same directory followed by
+os.replace(), so a reader sees either the old or the new file, never a
+truncated one. Writes are coalesced:
+- a changed value is written at most once per MIN_INTERVAL; later beats in
+  that window replace the pending value (last one wins),
+- an unchanged value is rewritten once per HEARTBEAT, so the file's mtime and
+  timestamp show that the classifier is alive.
+Everything else is skipped, so readers can cache by mtime.
+
+    status = StatusPublisher("/abs/path/ecg_live_status.txt")
+    status.publish(pred_class)   # per beat
+    status.flush()               # once per poll, writes a pending change
+"""
+
+import os
+import time
+from pathlib import Path
+
+import metrics
+
+# ------------------ CONFIG ------------------
+MIN_INTERVAL = 0.05   # seconds between writes of changed values
+HEARTBEAT = 1.0       # seconds between rewrites of an unchanged value
+
+STATUS_WRITE_SECONDS = metrics.histogram("ecg_status_write_seconds", "Status file write latency")
+STATUS_WRITES = metrics.counter("ecg_status_writes_total", "Status file writes")
+STATUS_COALESCED = metrics.counter("ecg_status_coalesced_total", "Status updates not written (coalesced)")
+
+
+def parse_status(raw):
+    """(value, seq, timestamp) from a status file's text; older single-int files give seq/timestamp None."""
+    parts = raw.split()
+    if not parts:
+        return 0, None, None
+    value = int(parts[0])
+    seq = int(parts[1]) if len(parts) > 1 else None
+    ts = float(parts[2]) if len(parts) > 2 else None
+    return value, seq, ts
+
+
+class StatusPublisher:
+    def __init__(self, path, min_interval=MIN_INTERVAL, heartbeat=HEARTBEAT):
+        self.path = Path(path).expanduser().resolve()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.min_interval = min_interval
+        self.heartbeat = heartbeat
+        self.seq = 0
+        self.written = None       # last value on disk
+        self.written_at = 0.0     # time.monotonic() of the last write
+        self.pending = None       # (value, ts) waiting for MIN_INTERVAL to pass
+        self._tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+
+    def publish(self, value, ts=None):
+        """Record one beat's status; returns True if the file was written."""
+        self.seq += 1
+        ts = time.time() if ts is None else ts
+        now = time.monotonic()
+        since = now - self.written_at
+        if value != self.written:
+            if since >= self.min_interval:
+                self._write(value, ts, now)
+                return True
+            self.pending = (value, ts)
+        else:
+            # A change that reverted before it was written never happened for readers
+            self.pending = None
+            if since >= self.heartbeat:
+                self._write(value, ts, now)
+                return True
+        STATUS_COALESCED.inc()
+        return False
+
+    def flush(self):
+        """Write a pending change if MIN_INTERVAL has passed; call once per poll."""
+        if self.pending is not None and time.monotonic() - self.written_at >= self.min_interval:
+            value, ts = self.pending
+            self._write(value, ts, time.monotonic())
+            return True
+        return False
+
+    def close(self):
+        if self.pending is not None:
+            self._write(*self.pending, time.monotonic())
+
+    def _write(self, value, ts, now):
+        with STATUS_WRITE_SECONDS.time():
+            with open(self._tmp, "w") as f:
+                f.write(f"{value} {self.seq} {ts:.3f}\n")
+            os.replace(self._tmp, self.path)
+        STATUS_WRITES.inc()
+        self.written = value
+        self.written_at = now
+        self.pending = None
@@ -1,34 +1,50 @@
 import numpy as np
-import pandas as pd
+import tensorflow as tf
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Dense
-from tensorflow.keras.utils import to_categorical
 
-# ---------- 1. Load CSV ----------
-data = pd.read_csv('AI/ECG/data_ecg/mitbih_train.csv', header=None)  # replace with your CSV path
-X = data.iloc[:, :-1].values  # all columns except last
-y = data.iloc[:, -1].values   # last column is the class
+from AI.datasets import CsvDataset
+
+# ---------- CONFIG ----------
+DATA_PATH = 'AI/ECG/data_ecg/mitbih_train.csv'  # replace with your CSV path
+EPOCHS = 20
+BATCH_SIZE = 32
+LEARNING_RATE = 1e-3
+USE_CACHE = True  # parse the CSV once into memory-mapped .npy arrays (AI/.cache/datasets)
 
-# Convert labels to one-hot encoding
-num_classes = len(np.unique(y))
-y_cat = to_categorical(y, num_classes=num_classes)
+# ---------- 1. Load CSV ----------
+def load_dataset(path=DATA_PATH):
+    # No header; last column is the class. Rows are streamed, not loaded.
+    data = CsvDataset(path, label=-1, header=False)
+    return data.cached() if USE_CACHE else data
 
 # ---------- 2. Build a simple neural network ----------
-model = Sequential([
-    Dense(64, activation='relu', input_shape=(X.shape[1],)),
-    Dense(32, activation='relu'),
-    Dense(num_classes, activation='softmax')
-])
+def build_model(input_dim, num_classes, hidden=(64, 32), learning_rate=LEARNING_RATE):
+    model = Sequential([tf.keras.layers.Input(shape=(input_dim,))] +
+                       [Dense(units, activation='relu') for units in hidden] +
+                       [Dense(num_classes, activation='softmax')])
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate),
+                  loss='categorical_crossentropy', metrics=['accuracy'])
+    return model
+
+if __name__ == "__main__":
+    data = load_dataset()
+
+    # Label counts come from one streaming pass; the scaler is not used (raw features as before)
+    _, label_counts = data.fit_scaler()
+    num_classes = max(label_counts) + 1
+    print(f"Rows per class: {label_counts}")
 
-model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    model = build_model(data.n_features, num_classes)
 
-# ---------- 3. Train the model ----------
-model.fit(X, y_cat, epochs=20, batch_size=32, verbose=1)
+    # ---------- 3. Train the model ----------
+    train_ds = data.tf_dataset("train", BATCH_SIZE, num_classes=num_classes)
+    model.fit(train_ds, epochs=EPOCHS, verbose=1)
 
-# ---------- 4. Simulate predictions on training data ----------
-preds = model.predict(X)
-pred_labels = np.argmax(preds, axis=1)
+    # ---------- 4. Simulate predictions on training data ----------
+    X, y = next(iter(data.tf_dataset("train", BATCH_SIZE, shuffle=False)))
+    pred_labels = np.argmax(model.predict(X, verbose=0), axis=1)
 
-# Print sample results
-for i in range(10):
-    print(f"Sample {i}: True={y[i]}, Predicted={pred_labels[i]}")
+    # Print sample results
+    for i in range(10):
+        print(f"Sample {i}: True={int(y[i])}, Predicted={pred_labels[i]}")
@@ -1,11 +1,10 @@
 import os
-import pandas as pd
 import numpy as np
 import tensorflow as tf
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
 import joblib
 
+from AI.datasets import CsvDataset, split_ranges
+
 # -------------------------------
 # CONFIG
 # -------------------------------
@@ -18,59 +17,57 @@ VALIDATION_SPLIT = 0.2  # 20% of train used for validation
 EPOCHS = 50
 BATCH_SIZE = 32
 DROPOUT_RATE = 0.3
+USE_CACHE = True  # parse the CSV once into memory-mapped .npy arrays (AI/.cache/datasets)
 
 # -------------------------------
 # HELPER FUNCTIONS
 # -------------------------------
 def load_eeg_csv(path):
-    """Load filtered Alzheimer's EEG dataset"""
-    df = pd.read_csv(path)
-    X = df.drop(columns=['status']).values
-    y = df['status'].values
-    return X, y
+    """Streaming view of the filtered Alzheimer's EEG dataset"""
+    data = CsvDataset(path, label='status', splits=split_ranges(test=TRAIN_TEST_SPLIT, val=VALIDATION_SPLIT))
+    return data.cached() if USE_CACHE else data
 
-def build_model(input_dim):
+def build_model(input_dim, dropout_rate=DROPOUT_RATE, learning_rate=None):
     """Simple feedforward neural network"""
     model = tf.keras.Sequential([
         tf.keras.layers.Input(shape=(input_dim,)),
         tf.keras.layers.Dense(64, activation='relu'),
-        tf.keras.layers.Dropout(DROPOUT_RATE),
+        tf.keras.layers.Dropout(dropout_rate),
         tf.keras.layers.Dense(32, activation='relu'),
-        tf.keras.layers.Dropout(DROPOUT_RATE),
+        tf.keras.layers.Dropout(dropout_rate),
         tf.keras.layers.Dense(1, activation='sigmoid')
     ])
     model.compile(
-        optimizer='adam',
+        optimizer=tf.keras.optimizers.Adam(learning_rate) if learning_rate else 'adam',
         loss='binary_crossentropy',
         metrics=['accuracy']
     )
     return model
 
-def train_model(X, y):
-    """Train TensorFlow model with early stopping"""
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+def train_model(data):
+    """Train TensorFlow model with early stopping, streaming the CSV"""
+    scaler, label_counts = data.fit_scaler("train")
+    print(f"Training rows per label: {label_counts}")
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X_scaled, y, test_size=TRAIN_TEST_SPLIT, random_state=42, stratify=y
-    )
+    train_ds = data.tf_dataset("train", BATCH_SIZE, scaler)
+    val_ds = data.tf_dataset("val", BATCH_SIZE, scaler, shuffle=False)
+    test_ds = data.tf_dataset("test", BATCH_SIZE, scaler, shuffle=False)
 
-    model = build_model(X.shape[1])
+    model = build_model(data.n_features)
 
     early_stop = tf.keras.callbacks.EarlyStopping(
         monitor='val_loss', patience=5, restore_best_weights=True
     )
 
     model.fit(
-        X_train, y_train,
+        train_ds,
         epochs=EPOCHS,
-        batch_size=BATCH_SIZE,
-        validation_split=VALIDATION_SPLIT,
+        validation_data=val_ds,
         callbacks=[early_stop],
         verbose=2
     )
 
-    test_loss, test_acc = model.evaluate(X_test, y_test, verbose=0)
+    test_loss, test_acc = model.evaluate(test_ds, verbose=0)
     print(f"✅ Test accuracy: {test_acc*100:.2f}%")
 
     # Save scaler
@@ -100,14 +97,14 @@ def predict_live(eeg_vector, model, scaler):
 # -------------------------------
 if __name__ == "__main__":
     print("⏳ Loading filtered Alzheimer's EEG dataset...")
-    X, y = load_eeg_csv(DATA_PATH)
+    data = load_eeg_csv(DATA_PATH)
 
     print("🚀 Training TensorFlow model...")
-    model, scaler = train_model(X, y)
+    model, scaler = train_model(data)
 
     save_model(model, MODEL_PATH)
 
     # Example: predict live EEG
-    example_live_eeg = np.random.rand(5)  # replace with actual EEG
+    example_live_eeg = np.random.rand(data.n_features)  # replace with actual EEG
     prediction = predict_live(example_live_eeg, model, scaler)
     print(f"🔮 Live EEG prediction: {'AD' if prediction == 1 else 'Healthy'}")
@@ -1,11 +1,10 @@
 import os
-import pandas as pd
 import numpy as np
 import tensorflow as tf
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
 import joblib
 
+from AI.datasets import CsvDataset, split_ranges
+
 # -------------------------------
 # CONFIG
 # -------------------------------
@@ -19,6 +18,7 @@ EPOCHS = 30
 BATCH_SIZE = 32
 DROPOUT_RATE = 0.4
 LEARNING_RATE = 1e-4
+USE_CACHE = True  # parse the CSV once into memory-mapped .npy arrays (AI/.cache/datasets)
 
 # -------------------------------
 # GPU CONFIGURATION
@@ -38,46 +38,48 @@ else:
 # HELPER FUNCTIONS
 # -------------------------------
 def load_filtered_csv(path):
-    df = pd.read_csv(path)
-    if 'diagnosis' not in df.columns:
+    """Streaming view of the dataset; rows are read per epoch, never all at once."""
+    try:
+        data = CsvDataset(path, label='diagnosis',
+                          splits=split_ranges(test=TRAIN_TEST_SPLIT, val=VALIDATION_SPLIT))
+    except ValueError:
         raise ValueError("❌ Missing 'diagnosis' column in dataset!")
-    X = df.drop(columns=['diagnosis']).values
-    y = df['diagnosis'].values
-    return X, y
+    return data.cached() if USE_CACHE else data
 
-def build_model(input_dim):
+def build_model(input_dim, dropout_rate=DROPOUT_RATE, learning_rate=LEARNING_RATE):
     model = tf.keras.Sequential([
         tf.keras.layers.Input(shape=(input_dim,)),
         tf.keras.layers.Dense(256, activation='relu'),
         tf.keras.layers.BatchNormalization(),
-        tf.keras.layers.Dropout(DROPOUT_RATE),
+        tf.keras.layers.Dropout(dropout_rate),
 
         tf.keras.layers.Dense(128, activation='relu'),
         tf.keras.layers.BatchNormalization(),
-        tf.keras.layers.Dropout(DROPOUT_RATE),
+        tf.keras.layers.Dropout(dropout_rate),
 
         tf.keras.layers.Dense(64, activation='relu'),
         tf.keras.layers.BatchNormalization(),
-        tf.keras.layers.Dropout(DROPOUT_RATE / 2),
+        tf.keras.layers.Dropout(dropout_rate / 2),
 
         tf.keras.layers.Dense(1, activation='sigmoid')
     ])
 
-    optimizer = tf.keras.optimizers.Adam(learning_rate=LEARNING_RATE)
+    optimizer = tf.keras.optimizers.Adam(learning_rate=learning_rate)
     model.compile(optimizer=optimizer,
                   loss='binary_crossentropy',
                   metrics=['accuracy'])
     return model
 
-def train_model(X, y):
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+def train_model(data):
+    # One streaming pass over the training split (partial_fit)
+    scaler, label_counts = data.fit_scaler("train")
+    print(f"📊 Training rows per label: {label_counts}")
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X_scaled, y, test_size=TRAIN_TEST_SPLIT, random_state=42, stratify=y
-    )
+    train_ds = data.tf_dataset("train", BATCH_SIZE, scaler)
+    val_ds = data.tf_dataset("val", BATCH_SIZE, scaler, shuffle=False)
+    test_ds = data.tf_dataset("test", BATCH_SIZE, scaler, shuffle=False)
 
-    model = build_model(X.shape[1])
+    model = build_model(data.n_features)
 
     early_stop = tf.keras.callbacks.EarlyStopping(
         monitor='val_loss', patience=10, restore_best_weights=True
@@ -88,15 +90,14 @@ def train_model(X, y):
     )
 
     history = model.fit(
-        X_train, y_train,
+        train_ds,
         epochs=EPOCHS,
-        batch_size=BATCH_SIZE,
-        validation_split=VALIDATION_SPLIT,
+        validation_data=val_ds,
         callbacks=[early_stop, lr_plateau],
         verbose=2
     )
 
-    test_loss, test_acc = model.evaluate(X_test, y_test, verbose=0)
+    test_loss, test_acc = model.evaluate(test_ds, verbose=0)
     print(f"✅ Final Test Accuracy: {test_acc*100:.2f}%")
 
     os.makedirs(os.path.dirname(SCALER_PATH), exist_ok=True)
@@ -126,14 +127,14 @@ def predict_live(eeg_vector, model, scaler):
 # -------------------------------
 if __name__ == "__main__":
     print("⏳ Loading filtered EEG dataset...")
-    X, y = load_filtered_csv(DATA_PATH)
+    data = load_filtered_csv(DATA_PATH)
 
     print("🚀 Training TensorFlow model...")
-    model, scaler = train_model(X, y)
+    model, scaler = train_model(data)
 
     save_model(model, MODEL_PATH)
 
     # Example: Predict on random EEG input (for testing)
-    example_live_eeg = np.random.rand(X.shape[1])
+    example_live_eeg = np.random.rand(data.n_features)
     prediction = predict_live(example_live_eeg, model, scaler)
     print(f"🔮 Live EEG Prediction: {'Sleep Deprived' if prediction == 1 else 'Normal Sleep'}")
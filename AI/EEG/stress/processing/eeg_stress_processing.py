@@ -0,0 +1,292 @@
+"""Streaming stress/anomaly scoring with the SAM-40 autoencoder.
+
+eeg_stress_training.py trains an autoencoder on 32-channel EEG vectors. A
+vector it reconstructs badly is unlike the training data, and that
+reconstruction error is the anomaly signal used here:
+
+- the model is loaded once. Its dense layers and the scaler are pulled out
+  of the .h5/.scaler pair (or a previously exported .npz, which needs no
+  TensorFlow) and run as NumPy matmuls, so a whole batch of samples is one
+  forward pass,
+- thresholds come from the training-error quantiles the trainer saves
+  (.calib.npz). An error maps to its percentile of the training errors, and
+  ELEVATED/HIGH are percentile levels,
+- each user has a rolling baseline: an EWMA of log error (mean and
+  variance) with a BASELINE_HALF_LIFE. A batch is scored as a z-score
+  against the baseline as it was before the batch, then folded in, so a
+  user whose resting EEG reconstructs worse than the training population
+  is not permanently "stressed".
+
+    scorer = StressScorer()
+    scorer.score(samples, user="alice")   # samples: (n, 32), e.g. one second at RATE Hz
+
+    python -m AI.EEG.stress.processing.eeg_stress_processing export
+    python -m AI.EEG.stress.processing.eeg_stress_processing calibrate data.csv
+    python -m AI.EEG.stress.processing.eeg_stress_processing score recording.csv --user alice
+    python -m AI.EEG.stress.processing.eeg_stress_processing bench
+"""
+
+import argparse
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+# ------------------ CONFIG ------------------
+MODEL_PATH = "sam40_autoencoder.h5"
+SCALER_PATH = MODEL_PATH + ".scaler"
+CALIB_PATH = MODEL_PATH + ".calib.npz"
+NPZ_PATH = "AI/EEG/stress/models/sam40_autoencoder.npz"
+N_CHANNELS = 32
+RATE = 128                  # SAM-40 sampling rate (Hz); one batch = one second
+ELEVATED = 0.95             # training-error percentile levels
+HIGH = 0.99
+BASELINE_HALF_LIFE = 300.0  # seconds
+BASELINE_WARMUP = 30.0      # seconds of data before baseline z-scores are reported
+Z_ELEVATED = 2.0
+Z_HIGH = 3.0
+
+_ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0, out=x),
+    "sigmoid": lambda x: 1.0 / (1.0 + np.exp(-x)),
+    "tanh": np.tanh,
+}
+
+
+# ------------------ MODEL ------------------
+def extract_layers(model_path=MODEL_PATH, scaler_path=SCALER_PATH):
+    """(dense layers [(W, b, activation)], scaler mean, scaler scale) from the Keras model and joblib scaler."""
+    import joblib
+    from tensorflow.keras.models import load_model
+
+    model = load_model(model_path, compile=False)
+    layers = []
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        if kind in ("InputLayer", "Dropout"):
+            continue
+        if kind != "Dense":
+            raise ValueError(f"Cannot run layer {layer.name} ({kind}) with NumPy")
+        W, b = layer.get_weights()
+        layers.append((W.astype(np.float32), b.astype(np.float32), layer.activation.__name__))
+    scaler = joblib.load(scaler_path)
+    scale = np.where(scaler.scale_ == 0, 1.0, scaler.scale_)
+    return layers, scaler.mean_.astype(np.float32), scale.astype(np.float32)
+
+
+def export_npz(model_path=MODEL_PATH, scaler_path=SCALER_PATH, out_path=NPZ_PATH):
+    """Save layers + scaler as a plain .npz, so scoring never imports TensorFlow."""
+    layers, mean, scale = extract_layers(model_path, scaler_path)
+    arrays = {"n_layers": np.array(len(layers)), "mean": mean, "scale": scale}
+    for i, (W, b, activation) in enumerate(layers):
+        arrays[f"W{i}"], arrays[f"b{i}"], arrays[f"act{i}"] = W, b, np.array(activation)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    np.savez(out_path, **arrays)
+    print(f"Autoencoder ({len(layers)} dense layers) and scaler saved to {out_path}")
+    return out_path
+
+
+class Autoencoder:
+    """Scaler + dense layers evaluated with NumPy; reconstruction error per sample."""
+
+    def __init__(self, npz_path=NPZ_PATH, model_path=MODEL_PATH, scaler_path=SCALER_PATH):
+        if npz_path and os.path.exists(npz_path):
+            artifact = np.load(npz_path)
+            self.layers = [(artifact[f"W{i}"], artifact[f"b{i}"], str(artifact[f"act{i}"]))
+                           for i in range(int(artifact["n_layers"]))]
+            self.mean, self.scale = artifact["mean"], artifact["scale"]
+        else:
+            self.layers, self.mean, self.scale = extract_layers(model_path, scaler_path)
+        for _, _, activation in self.layers:
+            if activation not in _ACTIVATIONS:
+                raise ValueError(f"Unsupported activation: {activation}")
+        self.n_channels = self.layers[0][0].shape[0]
+
+    def errors(self, X):
+        """Mean squared reconstruction error (in scaled units) for each row of X, one forward pass."""
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self.n_channels)
+        Xs = (X - self.mean) / self.scale
+        out = Xs
+        for W, b, activation in self.layers:
+            out = out @ W
+            out += b
+            out = _ACTIVATIONS[activation](out)
+        out -= Xs
+        return np.einsum("ij,ij->i", out, out) / self.n_channels
+
+
+# ------------------ CALIBRATION ------------------
+def save_calibration(errors, path=CALIB_PATH):
+    """Store training-error quantiles at 0.1% steps (what the trainer calls after fitting)."""
+    levels = np.linspace(0.0, 1.0, 1001)
+    np.savez(path, levels=levels, quantiles=np.quantile(np.asarray(errors, dtype=np.float64), levels),
+             n=np.array(len(errors)))
+    return path
+
+
+class Calibration:
+    def __init__(self, path=CALIB_PATH):
+        data = np.load(path)
+        self.levels = data["levels"]
+        self.quantiles = np.maximum.accumulate(data["quantiles"])
+        self.n = int(data["n"])
+
+    def threshold(self, level):
+        return float(np.interp(level, self.levels, self.quantiles))
+
+    def percentile(self, errors):
+        """Share of training samples reconstructed better than each error."""
+        return np.interp(errors, self.quantiles, self.levels)
+
+
+# ------------------ BASELINES ------------------
+class UserBaseline:
+    """EWMA of log reconstruction error, updated once per batch."""
+
+    def __init__(self, half_life_samples):
+        self.alpha = 1.0 - 0.5 ** (1.0 / half_life_samples)
+        self.mean = None
+        self.var = 0.0
+        self.samples = 0
+
+    def update(self, log_errors):
+        """
+        Fold in a batch (oldest first). The mean matches per-sample EWMA updates exactly; the
+        variance is a batched approximation, measuring deviations from the batch's final mean.
+        """
+        n = len(log_errors)
+        if self.mean is None:
+            self.mean, self.var = float(log_errors.mean()), float(log_errors.var())
+            self.samples = n
+            return
+        decay = 1.0 - self.alpha
+        # Weight of sample i after all n updates: alpha * decay**(n-1-i); the old state keeps decay**n
+        w = self.alpha * decay ** np.arange(n - 1, -1, -1, dtype=np.float64)
+        keep = decay ** n
+        new_mean = keep * self.mean + float(w @ log_errors)
+        # Var via EWMA of squared deviations around the running mean (West's incremental form, batched)
+        self.var = keep * (self.var + (self.mean - new_mean) ** 2) + float(w @ (log_errors - new_mean) ** 2)
+        self.mean = new_mean
+        self.samples += n
+
+
+# ------------------ SCORER ------------------
+class StressScorer:
+    def __init__(self, model=None, calibration=None, rate=RATE, half_life=BASELINE_HALF_LIFE,
+                 warmup=BASELINE_WARMUP):
+        self.model = model or Autoencoder()
+        self.calibration = calibration or Calibration()
+        self.rate = rate
+        self.half_life_samples = half_life * rate
+        self.warmup_samples = warmup * rate
+        self.elevated = self.calibration.threshold(ELEVATED)
+        self.high = self.calibration.threshold(HIGH)
+        self.baselines = {}
+        self._lock = threading.Lock()
+
+    def score_samples(self, X):
+        """Per-sample (errors, training percentiles) for a batch."""
+        errors = self.model.errors(X)
+        return errors, self.calibration.percentile(errors)
+
+    def score(self, X, user="default"):
+        """Score one batch for a user and fold it into their baseline."""
+        errors, percentiles = self.score_samples(X)
+        if not len(errors):
+            return {"user": user, "samples": 0}
+        log_errors = np.log(np.maximum(errors, 1e-12).astype(np.float64))
+        batch_log = float(np.median(log_errors))
+        with self._lock:
+            baseline = self.baselines.setdefault(user, UserBaseline(self.half_life_samples))
+            z = None
+            if baseline.mean is not None and baseline.samples >= self.warmup_samples:
+                z = (batch_log - baseline.mean) / math.sqrt(max(baseline.var, 1e-6))
+            baseline.update(log_errors)
+            baseline_state = {"samples": baseline.samples, "log_error_mean": round(baseline.mean, 4),
+                              "log_error_sd": round(math.sqrt(baseline.var), 4)}
+
+        error = float(np.exp(batch_log))
+        percentile = float(self.calibration.percentile(error))
+        if z is not None:
+            level = "high" if z >= Z_HIGH else "elevated" if z >= Z_ELEVATED else "normal"
+        else:
+            level = "high" if error >= self.high else "elevated" if error >= self.elevated else "normal"
+        return {
+            "user": user,
+            "samples": int(len(errors)),
+            "error": round(error, 5),
+            "error_p95": round(float(np.quantile(errors, 0.95)), 5),
+            "population_percentile": round(percentile, 4),
+            "anomalous_fraction": round(float((percentiles >= ELEVATED).mean()), 4),
+            "baseline_z": None if z is None else round(z, 3),
+            "level": level,
+            "baseline": baseline_state,
+        }
+
+
+# ------------------ CLI ------------------
+def load_rows(path):
+    """EEG rows from a CSV as (n, 32) float32; a leading index column (33 columns) is dropped."""
+    import pandas as pd
+
+    data = pd.read_csv(path, header=None)
+    if not np.issubdtype(data.dtypes.iloc[-1], np.number):
+        data = pd.read_csv(path)
+    if data.shape[1] == N_CHANNELS + 1:
+        data = data.iloc[:, 1:]
+    return data.to_numpy(dtype=np.float32)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streaming EEG stress/anomaly scoring with the SAM-40 autoencoder.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="write the model + scaler as a NumPy .npz (no TensorFlow at runtime)")
+    p_export.add_argument("--model", default=MODEL_PATH)
+    p_export.add_argument("--out", default=NPZ_PATH)
+    p_cal = sub.add_parser("calibrate", help="recompute training-error quantiles from a CSV")
+    p_cal.add_argument("csv")
+    p_score = sub.add_parser("score", help="score a recording one second at a time")
+    p_score.add_argument("csv")
+    p_score.add_argument("--user", default="default")
+    p_score.add_argument("--rate", type=int, default=RATE)
+    p_score.add_argument("--realtime", action="store_true", help="pace batches at the device rate")
+    p_bench = sub.add_parser("bench", help="throughput vs the device's native rate")
+    p_bench.add_argument("--seconds", type=int, default=600)
+    p_bench.add_argument("--rate", type=int, default=RATE)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        export_npz(args.model, args.model + ".scaler", args.out)
+    elif args.command == "calibrate":
+        errors = Autoencoder().errors(load_rows(args.csv))
+        save_calibration(errors)
+        print(f"Calibration from {len(errors)} samples saved to {CALIB_PATH} "
+              f"(p95 {np.quantile(errors, ELEVATED):.4f}, p99 {np.quantile(errors, HIGH):.4f})")
+    elif args.command == "score":
+        scorer = StressScorer(rate=args.rate)
+        rows = load_rows(args.csv)
+        start = time.perf_counter()
+        for i in range(0, len(rows), args.rate):
+            result = scorer.score(rows[i:i + args.rate], args.user)
+            print(f"t={i / args.rate:6.0f}s  {result['level']:8s} error {result['error']:.4f}  "
+                  f"pop {result['population_percentile']:.3f}  z {result['baseline_z']}")
+            if args.realtime:
+                time.sleep(max(0.0, start + (i + args.rate) / args.rate - time.perf_counter()))
+    else:
+        scorer = StressScorer(rate=args.rate)
+        rng = np.random.default_rng(0)
+        X = (rng.standard_normal((args.seconds * args.rate, scorer.model.n_channels)) * scorer.model.scale
+             + scorer.model.mean).astype(np.float32)
+        start = time.perf_counter()
+        for i in range(0, len(X), args.rate):
+            scorer.score(X[i:i + args.rate])
+        elapsed = time.perf_counter() - start
+        print(f"{args.seconds} s of {args.rate} Hz EEG scored in {elapsed:.3f} s "
+              f"({elapsed / args.seconds * 1000:.2f} ms per 1 s batch, {args.seconds / elapsed:.0f}x realtime)")
+
+
+if __name__ == "__main__":
+    main()
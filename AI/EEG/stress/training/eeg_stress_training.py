@@ -13,6 +13,8 @@ from tensorflow.keras.models import Model
 from tensorflow.keras.layers import Input, Dense
 from tensorflow.keras.callbacks import EarlyStopping
 
+from AI.EEG.stress.processing.eeg_stress_processing import save_calibration
+
 # -----------------------------
 # Hardcoded file paths
 # -----------------------------
@@ -62,3 +64,11 @@ autoencoder.save(output_model_path)
 import joblib
 joblib.dump(scaler, output_model_path + '.scaler')
 print(f"Autoencoder saved to {output_model_path}, scaler saved to {output_model_path}.scaler")
+
+# -----------------------------
+# Calibration: training reconstruction-error quantiles, used as thresholds
+# by AI/EEG/stress/processing/eeg_stress_processing.py
+# -----------------------------
+errors = np.mean((autoencoder.predict(X_scaled, batch_size=1024, verbose=0) - X_scaled) ** 2, axis=1)
+save_calibration(errors, output_model_path + '.calib.npz')
+print(f"Calibration ({len(errors)} samples, p95 error {np.quantile(errors, 0.95):.4f}) saved to {output_model_path}.calib.npz")
@@ -0,0 +1,371 @@
+"""Streaming dataset loading shared by the ECG and EEG trainers.
+
+Training data never has to fit in memory:
+
+- fit_scaler() makes one chunked pandas pass and fits a StandardScaler with
+  partial_fit (plus label counts), over the training split only.
+- tf_dataset() streams the CSV lines through tf.data: lines are shuffled in
+  a bounded buffer, batched, parsed with tf.io.decode_csv in parallel,
+  scaled and prefetched. Several CSV files are read interleaved.
+
+Splits are assigned per row from a hash of (file index, row index), so the
+pandas pass and the tf.data pipeline agree on which rows are train, val or
+test without ever holding the full dataset.
+
+    data = CsvDataset("AI/EEG/sleep/data_eeg_sleep/filtered_dataset.csv", label="diagnosis",
+                      splits=split_ranges(test=0.4, val=0.2))
+    scaler, counts = data.fit_scaler("train")
+    model.fit(data.tf_dataset("train", BATCH_SIZE, scaler), validation_data=data.tf_dataset("val", ...))
+
+data.cached() returns the same interface backed by float32 .npy arrays that
+are parsed once per source hash and memory-mapped on later runs (see
+DatasetCache).
+"""
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialised between processes
+    fcntl = None
+
+CACHE_DIR = os.getenv("DATASET_CACHE", "AI/.cache/datasets")
+CACHE_VERSION = 1
+CHUNK_ROWS = 50000
+SHUFFLE_BUFFER = 20000
+HASH_MULT = 2654435761  # Knuth multiplicative hash
+FILE_STRIDE = 1000003   # keeps row ids of different files apart
+
+
+def split_ranges(test=0.0, val=0.0):
+    """
+    Hash-bucket ranges (0-100) per split. `val` is a fraction of what is left
+    after the test split, like Keras' validation_split.
+    """
+    test_pct = int(round(test * 100))
+    val_pct = int(round((100 - test_pct) * val))
+    train_end = 100 - test_pct - val_pct
+    return {"train": (0, train_end), "val": (train_end, train_end + val_pct), "test": (train_end + val_pct, 100)}
+
+
+def row_buckets(file_index, row_index):
+    """Split bucket (0-99) per row; must match _tf_row_bucket."""
+    ids = (np.asarray(row_index, dtype=np.int64) + file_index * FILE_STRIDE) * HASH_MULT
+    return (ids % (1 << 32)) % 100
+
+
+def _tf_row_bucket(tf, file_index, row_index):
+    ids = (row_index + file_index * FILE_STRIDE) * HASH_MULT
+    return tf.math.floormod(tf.math.floormod(ids, 1 << 32), 100)
+
+
+class CsvDataset:
+    """
+    One or more CSV files with numeric feature columns and one label column.
+
+    label: column name, or an integer position (-1 = last column) for files
+    without a header such as mitbih_train.csv.
+    """
+
+    def __init__(self, paths, label=-1, header=True, drop=(), splits=None):
+        if isinstance(paths, str):
+            paths = sorted(glob.glob(paths)) or [paths]
+        self.paths = list(paths)
+        self.header = header
+        self.splits = splits or {"train": (0, 100)}
+
+        import pandas as pd
+        first = pd.read_csv(self.paths[0], header=0 if header else None, nrows=1)
+        columns = list(first.columns)
+        self.label_index = columns.index(label) if isinstance(label, str) else range(len(columns))[label]
+        drop_index = {columns.index(c) if isinstance(c, str) else c for c in drop}
+        self.n_columns = len(columns)
+        self.feature_index = [i for i in range(len(columns)) if i != self.label_index and i not in drop_index]
+        self.feature_names = [str(columns[i]) for i in self.feature_index]
+
+    @property
+    def n_features(self):
+        return len(self.feature_index)
+
+    def cached(self, root=CACHE_DIR):
+        """Memory-mapped ShardedDataset for these files, parsing them only on a cache miss."""
+        return DatasetCache(root).get(self)
+
+    # ------------------ PANDAS PASS ------------------
+    def chunks(self, split=None, chunksize=CHUNK_ROWS):
+        """Yield (X float32, y) chunks of one split (or all rows) in file order."""
+        import pandas as pd
+
+        lo, hi = self.splits[split] if split else (0, 100)
+        for file_index, path in enumerate(self.paths):
+            offset = 0
+            for chunk in pd.read_csv(path, header=0 if self.header else None, chunksize=chunksize):
+                values = chunk.to_numpy(dtype=np.float32, na_value=0.0)
+                buckets = row_buckets(file_index, np.arange(offset, offset + len(values)))
+                offset += len(values)
+                keep = (buckets >= lo) & (buckets < hi)
+                if keep.any():
+                    yield values[keep][:, self.feature_index], values[keep, self.label_index]
+
+    def fit_scaler(self, split="train", chunksize=CHUNK_ROWS):
+        """StandardScaler fitted in one streaming pass, plus {label: count} for that split."""
+        from sklearn.preprocessing import StandardScaler
+
+        scaler = StandardScaler()
+        counts = {}
+        for X, y in self.chunks(split, chunksize):
+            scaler.partial_fit(X)
+            labels, n = np.unique(y, return_counts=True)
+            for label, c in zip(labels.astype(int).tolist(), n.tolist()):
+                counts[label] = counts.get(label, 0) + c
+        return scaler, dict(sorted(counts.items()))
+
+    # ------------------ TF.DATA PIPELINE ------------------
+    def tf_dataset(self, split, batch_size, scaler=None, shuffle=True, shuffle_buffer=SHUFFLE_BUFFER,
+                   num_classes=None, seed=42, deterministic=False):
+        """
+        Batched (features, label) tf.data.Dataset for one split. num_classes
+        one-hot encodes the label (for categorical_crossentropy).
+        """
+        import tensorflow as tf
+
+        lo, hi = self.splits[split]
+        skip = 1 if self.header else 0
+
+        def read_file(file_index, path):
+            # pandas skips blank lines, so drop them before numbering rows
+            lines = tf.data.TextLineDataset(path).skip(skip).filter(
+                lambda line: tf.strings.length(tf.strings.strip(line)) > 0).enumerate()
+            return lines.filter(lambda i, line: tf.logical_and(
+                _tf_row_bucket(tf, file_index, i) >= lo, _tf_row_bucket(tf, file_index, i) < hi))
+
+        files = tf.data.Dataset.from_tensor_slices((tf.range(len(self.paths), dtype=tf.int64), self.paths))
+        ds = files.interleave(read_file, cycle_length=min(len(self.paths), 8),
+                              num_parallel_calls=tf.data.AUTOTUNE, deterministic=deterministic)
+        ds = ds.map(lambda i, line: line)
+        if shuffle:
+            ds = ds.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+
+        defaults = [[0.0]] * self.n_columns
+        feature_index = tf.constant(self.feature_index)
+        label_index = self.label_index
+        mean = tf.constant(scaler.mean_, tf.float32) if scaler is not None else None
+        scale = tf.constant(scaler.scale_, tf.float32) if scaler is not None else None
+
+        def parse(lines):
+            cols = tf.stack(tf.io.decode_csv(lines, record_defaults=defaults), axis=1)
+            x = tf.gather(cols, feature_index, axis=1)
+            if mean is not None:
+                x = (x - mean) / scale
+            y = cols[:, label_index]
+            if num_classes:
+                y = tf.one_hot(tf.cast(y, tf.int32), num_classes)
+            return x, y
+
+        # Parse whole batches at once: decode_csv is vectorized over lines
+        ds = ds.batch(batch_size).map(parse, num_parallel_calls=tf.data.AUTOTUNE, deterministic=deterministic)
+        return ds.prefetch(tf.data.AUTOTUNE)
+
+
+# ------------------ PREPROCESSED CACHE ------------------
+def _file_digest(path, index):
+    """sha256 of a source file, reusing the digest while (size, mtime) are unchanged."""
+    st = os.stat(path)
+    fingerprint = [st.st_size, st.st_mtime_ns]
+    entry = index.get(os.path.abspath(path))
+    if entry and entry["fingerprint"] == fingerprint:
+        return entry["sha256"]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    index[os.path.abspath(path)] = {"fingerprint": fingerprint, "sha256": h.hexdigest()}
+    return h.hexdigest()
+
+
+class DatasetCache:
+    """
+    Parsed float32 .npy arrays per split, keyed by the sha256 of the source
+    files and the preprocessing config (label/feature columns, splits).
+
+    The first run parses the CSVs once. Later runs memory-map the arrays and
+    reuse the stored scaler statistics. When a source file changes, its hash
+    changes, the key changes, and the old entry for the same config is
+    deleted; entries for other configs of the same files (e.g. the sweep's
+    splits vs. a trainer's) are kept. Builds hold a lock file, so concurrent
+    runs wait for one build instead of racing on it.
+    """
+
+    def __init__(self, root=CACHE_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {"files": {}, "entries": {}}
+
+    def _save_index(self, index):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp, self.index_path)
+
+    def key(self, dataset, index):
+        """(cache key, config id): the key covers config and source hashes, the config id only the config."""
+        config = {"paths": [os.path.abspath(p) for p in dataset.paths], "header": dataset.header,
+                  "label_index": dataset.label_index, "feature_index": dataset.feature_index,
+                  "splits": dataset.splits, "version": CACHE_VERSION}
+        digests = [_file_digest(p, index["files"]) for p in dataset.paths]
+        config_id = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+        blob = json.dumps({"config": config, "sources": digests}, sort_keys=True).encode()
+        return hashlib.sha256(blob).hexdigest()[:16], config_id
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get(self, dataset):
+        """ShardedDataset for `dataset`, building the cache entry if needed."""
+        with self._locked():
+            index = self._load_index()
+            key, config_id = self.key(dataset, index)
+            path = os.path.join(self.root, key)
+            if not os.path.exists(os.path.join(path, "meta.json")):
+                start = time.perf_counter()
+                self.build(dataset, path)
+                print(f"Cached {', '.join(dataset.paths)} -> {path} in {time.perf_counter() - start:.1f}s")
+                # Drop entries of this config built from older versions of the sources
+                for old, entry in list(index["entries"].items()):
+                    if old != key and isinstance(entry, dict) and entry.get("config") == config_id:
+                        shutil.rmtree(os.path.join(self.root, old), ignore_errors=True)
+                        del index["entries"][old]
+                index["entries"][key] = {"config": config_id, "paths": [os.path.abspath(p) for p in dataset.paths]}
+            self._save_index(index)
+        return ShardedDataset(path)
+
+    def build(self, dataset, path):
+        from sklearn.preprocessing import StandardScaler
+
+        tmp = f"{path}.partial-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        meta = {"n_features": dataset.n_features, "feature_names": dataset.feature_names, "splits": {}}
+        for split in dataset.splits:
+            # Parse once into chunk files, then join them into one mappable array
+            parts, rows, counts = [], 0, {}
+            for i, (X, y) in enumerate(dataset.chunks(split)):
+                np.save(os.path.join(tmp, f"{split}_x_{i}.npy"), X)
+                np.save(os.path.join(tmp, f"{split}_y_{i}.npy"), y)
+                parts.append(i)
+                rows += len(X)
+            x_all = np.lib.format.open_memmap(os.path.join(tmp, f"{split}_x.npy"), "w+", np.float32,
+                                              (rows, dataset.n_features))
+            y_all = np.lib.format.open_memmap(os.path.join(tmp, f"{split}_y.npy"), "w+", np.float32, (rows,))
+            scaler = StandardScaler()
+            offset = 0
+            for i in parts:
+                X = np.load(os.path.join(tmp, f"{split}_x_{i}.npy"))
+                y = np.load(os.path.join(tmp, f"{split}_y_{i}.npy"))
+                x_all[offset:offset + len(X)] = X
+                y_all[offset:offset + len(y)] = y
+                offset += len(X)
+                scaler.partial_fit(X)
+                labels, n = np.unique(y, return_counts=True)
+                for label, c in zip(labels.astype(int).tolist(), n.tolist()):
+                    counts[label] = counts.get(label, 0) + c
+                os.remove(os.path.join(tmp, f"{split}_x_{i}.npy"))
+                os.remove(os.path.join(tmp, f"{split}_y_{i}.npy"))
+            x_all.flush()
+            y_all.flush()
+            del x_all, y_all
+            meta["splits"][split] = {
+                "rows": rows,
+                "label_counts": dict(sorted(counts.items())),
+                "mean": scaler.mean_.tolist() if rows else None,
+                "var": scaler.var_.tolist() if rows else None,
+            }
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+
+class ShardedDataset:
+    """Cached splits as memory-mapped arrays, with the CsvDataset training interface."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.n_features = self.meta["n_features"]
+        self.feature_names = self.meta["feature_names"]
+        self.splits = self.meta["splits"]
+
+    def arrays(self, split):
+        """(X, y) memory-mapped read-only; pages are shared between processes."""
+        return (np.load(os.path.join(self.path, f"{split}_x.npy"), mmap_mode="r"),
+                np.load(os.path.join(self.path, f"{split}_y.npy"), mmap_mode="r"))
+
+    def fit_scaler(self, split="train"):
+        """Scaler rebuilt from the statistics stored at cache time (no pass over the data)."""
+        from sklearn.preprocessing import StandardScaler
+
+        info = self.splits[split]
+        scaler = StandardScaler()
+        if info["rows"]:
+            scaler.mean_ = np.asarray(info["mean"])
+            scaler.var_ = np.asarray(info["var"])
+            scaler.scale_ = np.sqrt(np.where(scaler.var_ == 0, 1.0, scaler.var_))
+            scaler.n_samples_seen_ = info["rows"]
+            scaler.n_features_in_ = self.n_features
+        return scaler, {int(k): v for k, v in info["label_counts"].items()}
+
+    def tf_dataset(self, split, batch_size, scaler=None, shuffle=True, num_classes=None, seed=42, **_):
+        """Batched (features, label) tf.data.Dataset gathered from the memory-mapped split."""
+        import tensorflow as tf
+
+        X, y = self.arrays(split)
+        n = len(X)
+        epoch = [0]
+
+        def batches():
+            order = np.random.default_rng(seed + epoch[0]).permutation(n) if shuffle else np.arange(n)
+            epoch[0] += 1
+            for start in range(0, n, batch_size):
+                # Sorted indices keep the memmap reads mostly sequential
+                idx = np.sort(order[start:start + batch_size])
+                yield X[idx], y[idx]
+
+        ds = tf.data.Dataset.from_generator(batches, output_signature=(
+            tf.TensorSpec((None, self.n_features), tf.float32), tf.TensorSpec((None,), tf.float32)))
+        mean = tf.constant(scaler.mean_, tf.float32) if scaler is not None else None
+        scale = tf.constant(scaler.scale_, tf.float32) if scaler is not None else None
+
+        def transform(x, label):
+            if mean is not None:
+                x = (x - mean) / scale
+            if num_classes:
+                label = tf.one_hot(tf.cast(label, tf.int32), num_classes)
+            return x, label
+
+        return ds.map(transform, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,267 @@
+"""Parallel hyperparameter sweep for the ECG and EEG trainers.
+
+Trials run in a process pool sized to the CPU count. Each worker pins the
+TensorFlow intra/inter-op thread pools to its share of the cores. The
+dataset is parsed once into the AI/datasets.py cache, and every worker
+memory-maps the same arrays, so the page cache is shared rather than copied.
+
+Bad trials stop early with the median stopping rule: after `--grace-epochs`,
+a trial whose best val_loss so far is worse than the median of the other
+trials' best at the same epoch is ended.
+
+    python -m AI.sweep eeg_sleep --space '{"dropout_rate": [0.2, 0.4], "learning_rate": [1e-3, 1e-4], "batch_size": [32, 64]}'
+    python -m AI.sweep ecg --space space.json --samples 12 --workers 4 --epochs 10
+
+Results go to <out>/trials.jsonl (one line per finished trial) and
+<out>/leaderboard.csv, sorted by best validation loss.
+"""
+
+import argparse
+import ast
+import importlib
+import importlib.util
+import itertools
+import json
+import multiprocessing as mp
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# target -> trainer module and how its CSV is laid out
+TARGETS = {
+    "ecg": {"module": "AI.ECG.trainer.ecg_classifier", "label": -1, "header": False,
+            "categorical": True, "scaled": False},
+    "eeg_sleep": {"module": "AI.EEG.sleep.trainer.eeg_classifier_sleep", "label": "diagnosis", "header": True,
+                  "categorical": False, "scaled": True},
+    "eeg_diagnostic": {"module": "AI.EEG.diagnostic.training.eeg_training_diagnostic", "label": "status",
+                       "header": True, "categorical": False, "scaled": True},
+}
+TRAINING_KEYS = {"batch_size", "epochs"}
+VAL_SPLIT = 0.2  # only for trainers without TRAIN_TEST_SPLIT/VALIDATION_SPLIT constants
+GRACE_EPOCHS = 3
+PATIENCE = 5
+
+
+def expand_space(space, samples=None, seed=0):
+    """Grid over list-valued keys; `samples` draws that many grid points at random instead."""
+    keys = sorted(space)
+    values = [v if isinstance(v, list) else [v] for v in (space[k] for k in keys)]
+    grid = [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+    if samples and samples < len(grid):
+        grid = random.Random(seed).sample(grid, samples)
+    return grid
+
+
+# ------------------ WORKER ------------------
+def init_worker(threads):
+    """Runs once per worker process, before TensorFlow is imported."""
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def _median_stopping(tf, trial_id, shared, grace_epochs):
+    class MedianStopping(tf.keras.callbacks.Callback):
+        def __init__(self):
+            super().__init__()
+            self.curve = []
+            self.stopped_by_rule = False
+
+        def on_epoch_end(self, epoch, logs=None):
+            val = (logs or {}).get("val_loss")
+            if val is None:
+                return
+            self.curve.append(min(val, self.curve[-1]) if self.curve else val)
+            shared[trial_id] = list(self.curve)  # best-so-far curve, visible to other trials
+            if epoch + 1 < grace_epochs:
+                return
+            others = [c[epoch] for t, c in shared.items() if t != trial_id and len(c) > epoch]
+            if len(others) >= 2 and self.curve[-1] > statistics.median(others):
+                self.stopped_by_rule = True
+                self.model.stop_training = True
+
+    return MedianStopping()
+
+
+def run_trial(target, cache_path, trial_id, params, shared, grace_epochs=GRACE_EPOCHS):
+    import tensorflow as tf
+    from AI.datasets import ShardedDataset
+
+    spec = TARGETS[target]
+    trainer = importlib.import_module(spec["module"])
+    data = ShardedDataset(cache_path)
+    scaler, label_counts = data.fit_scaler("train")
+    num_classes = max(label_counts) + 1 if spec["categorical"] else None
+
+    model_kwargs = {k: v for k, v in params.items() if k not in TRAINING_KEYS}
+    if "hidden" in model_kwargs:
+        model_kwargs["hidden"] = tuple(model_kwargs["hidden"])
+    if spec["categorical"]:
+        model = trainer.build_model(data.n_features, num_classes, **model_kwargs)
+    else:
+        model = trainer.build_model(data.n_features, **model_kwargs)
+
+    batch_size = params.get("batch_size", trainer.BATCH_SIZE)
+    epochs = params.get("epochs", trainer.EPOCHS)
+    scaler = scaler if spec["scaled"] else None
+    train_ds = data.tf_dataset("train", batch_size, scaler, num_classes=num_classes, seed=trial_id)
+    val_ds = data.tf_dataset("val", batch_size, scaler, shuffle=False, num_classes=num_classes)
+
+    median_stop = _median_stopping(tf, trial_id, shared, grace_epochs)
+    early_stop = tf.keras.callbacks.EarlyStopping(monitor="val_loss", patience=PATIENCE, restore_best_weights=True)
+    start = time.perf_counter()
+    history = model.fit(train_ds, validation_data=val_ds, epochs=epochs, callbacks=[median_stop, early_stop],
+                        verbose=0).history
+
+    val_loss = history.get("val_loss", [float("inf")])
+    best = min(range(len(val_loss)), key=val_loss.__getitem__)
+    return {
+        "trial": trial_id,
+        "params": params,
+        "best_val_loss": float(val_loss[best]),
+        "best_val_accuracy": float(history.get("val_accuracy", [float("nan")] * len(val_loss))[best]),
+        "best_epoch": best + 1,
+        "epochs_run": len(val_loss),
+        "pruned": median_stop.stopped_by_rule,
+        "seconds": round(time.perf_counter() - start, 1),
+        "pid": os.getpid(),
+    }
+
+
+# ------------------ DRIVER ------------------
+def prepare_dataset(target, data_path=None):
+    """Build (or reuse) the cached, memory-mapped dataset in the parent; returns its directory."""
+    from AI.datasets import CsvDataset
+
+    spec = TARGETS[target]
+    trainer_path = importlib.util.find_spec(spec["module"]).origin
+    path = data_path or _module_constant(trainer_path, "DATA_PATH")
+    data = CsvDataset(path, label=spec["label"], header=spec["header"], splits=trainer_splits(trainer_path))
+    return data.cached().path
+
+
+def trainer_splits(trainer_path):
+    """The trainer's own train/val/test buckets, so trials never see its test rows (and share its cache entry).
+
+    The ECG trainer has no split constants: it trains on all of mitbih_train.csv and mitbih_test.csv is the
+    held-out set, so only VAL_SPLIT is carved out for validation.
+    """
+    from AI.datasets import split_ranges
+
+    test = _module_constant(trainer_path, "TRAIN_TEST_SPLIT", 0.0)
+    val = _module_constant(trainer_path, "VALIDATION_SPLIT", VAL_SPLIT)
+    return split_ranges(test=test, val=val)
+
+
+_MISSING = object()
+
+
+def _module_constant(path, name, default=_MISSING):
+    # Read DATA_PATH without importing the trainer (and TensorFlow) in the parent
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == name for t in node.targets):
+            return ast.literal_eval(node.value)
+    if default is not _MISSING:
+        return default
+    raise KeyError(f"{name} not found in {path}")
+
+
+def check_params(target, trials):
+    spec = TARGETS[target]
+    trainer_path = importlib.util.find_spec(spec["module"]).origin
+    with open(trainer_path, encoding="utf-8") as f:
+        source = f.read()
+    fn = next(n for n in ast.parse(source).body if isinstance(n, ast.FunctionDef) and n.name == "build_model")
+    # input_dim (and num_classes) come from the data, the rest is tunable
+    fixed = 2 if spec["categorical"] else 1
+    allowed = {a.arg for a in fn.args.args[fixed:]} | TRAINING_KEYS
+    unknown = {k for t in trials for k in t} - allowed
+    if unknown:
+        raise SystemExit(f"unknown parameters for {target}: {sorted(unknown)} (allowed: {sorted(allowed)})")
+
+
+def write_leaderboard(results, out_dir):
+    ranked = sorted(results, key=lambda r: r["best_val_loss"])
+    keys = sorted({k for r in ranked for k in r["params"]})
+    with open(os.path.join(out_dir, "leaderboard.csv"), "w") as f:
+        f.write(",".join(["rank", "trial", "best_val_loss", "best_val_accuracy", "best_epoch", "epochs_run",
+                          "pruned", "seconds"] + keys) + "\n")
+        for rank, r in enumerate(ranked, 1):
+            row = [rank, r["trial"], f"{r['best_val_loss']:.5f}", f"{r['best_val_accuracy']:.4f}", r["best_epoch"],
+                   r["epochs_run"], int(r["pruned"]), r["seconds"]]
+            row += [json.dumps(r["params"].get(k)).replace(",", ";") for k in keys]
+            f.write(",".join(map(str, row)) + "\n")
+    return ranked
+
+
+def run_sweep(target, trials, workers, out_dir, data_path=None, grace_epochs=GRACE_EPOCHS):
+    os.makedirs(out_dir, exist_ok=True)
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers, len(trials)))
+    threads = max(1, cores // workers)
+
+    print(f"Preparing {target} dataset cache...")
+    cache_path = prepare_dataset(target, data_path)
+    print(f"{len(trials)} trials on {workers} workers x {threads} TF threads ({cores} cores), data {cache_path}")
+
+    ctx = mp.get_context("spawn")
+    results = []
+    start = time.perf_counter()
+    with ctx.Manager() as manager:
+        shared = manager.dict()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=init_worker,
+                                 initargs=(threads,)) as pool, \
+                open(os.path.join(out_dir, "trials.jsonl"), "a") as log:
+            futures = {pool.submit(run_trial, target, cache_path, i, params, shared, grace_epochs): i
+                       for i, params in enumerate(trials)}
+            for fut in as_completed(futures):
+                try:
+                    r = fut.result()
+                except Exception as e:
+                    print(f"trial {futures[fut]} failed: {e!r}")
+                    continue
+                results.append(r)
+                log.write(json.dumps(r) + "\n")
+                log.flush()
+                print(f"trial {r['trial']:>3}  val_loss {r['best_val_loss']:.4f}  val_acc {r['best_val_accuracy']:.4f}  "
+                      f"epochs {r['epochs_run']:>3}{'  pruned' if r['pruned'] else ''}  {r['seconds']}s  {r['params']}")
+
+    ranked = write_leaderboard(results, out_dir)
+    print(f"\nSweep finished in {time.perf_counter() - start:.0f}s; leaderboard: {os.path.join(out_dir, 'leaderboard.csv')}")
+    for rank, r in enumerate(ranked[:5], 1):
+        print(f"{rank}. val_loss {r['best_val_loss']:.4f}  val_acc {r['best_val_accuracy']:.4f}  {r['params']}")
+    return ranked
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep for the ECG/EEG trainers.")
+    parser.add_argument("target", choices=sorted(TARGETS))
+    parser.add_argument("--space", required=True, help="JSON object or path to a JSON file: param -> value or list")
+    parser.add_argument("--samples", type=int, default=None, help="random subset of the grid")
+    parser.add_argument("--epochs", type=int, default=None, help="override epochs for every trial")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--grace-epochs", type=int, default=GRACE_EPOCHS, help="epochs before median stopping applies")
+    parser.add_argument("--data", default=None, help="override the trainer's DATA_PATH")
+    parser.add_argument("--out", default=None, help="default: AI/sweeps/<target>-<timestamp>")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    space = json.load(open(args.space)) if os.path.exists(args.space) else json.loads(args.space)
+    if args.epochs:
+        space["epochs"] = args.epochs
+    trials = expand_space(space, args.samples, args.seed)
+    check_params(args.target, trials)
+    out = args.out or os.path.join("AI", "sweeps", f"{args.target}-{time.strftime('%Y%m%d-%H%M%S')}")
+    run_sweep(args.target, trials, args.workers, out, args.data, args.grace_epochs)
+
+
+if __name__ == "__main__":
+    main()
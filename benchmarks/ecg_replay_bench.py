@@ -0,0 +1,271 @@
+"""Replay / load-test harness for the live ECG pipeline.
+
+Replays MIT-BIH rows (headerless `mitbih_train.csv` format: 187 samples +
+label) or synthetic beats into a fresh live input CSV at a fixed rate, runs
+the real `ecg_processing.run_live` loop against it, and measures per beat:
+
+  - arrival -> classification (row flushed to CSV -> model output)
+  - arrival -> status update  (row flushed to CSV -> status published)
+
+plus achieved throughput, backlog, CPU and RSS. With --endpoint it also
+measures how fast `/ecg/status` (server.get_ecg_status) can be polled.
+Everything runs offline in temp files; results are written as JSON so
+releases can be compared.
+
+    python benchmarks/ecg_replay_bench.py --rate 200 --duration 30 --json replay.json
+    python benchmarks/ecg_replay_bench.py --source AI/ECG/data_ecg/mitbih_train.csv --backend fused
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from AI.ECG.processing import ecg_processing  # noqa: E402
+from AI.ECG.processing.ecg_runtime import N_FEATURES, load_predictor  # noqa: E402
+
+
+# ------------------ BEAT SOURCES ------------------
+def synthetic_beats(n, seed=0):
+    """MIT-BIH-like beats: P/QRS/T bumps on a 0..1 scale, zero padded, with labels."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(N_FEATURES, dtype=np.float32)
+    beats = np.zeros((n, N_FEATURES), dtype=np.float32)
+    for center, width, height in ((10, 4, 0.25), (30, 2.5, 1.0), (70, 8, 0.35)):
+        c = center + rng.normal(0, 2, (n, 1))
+        h = height * rng.uniform(0.7, 1.2, (n, 1))
+        beats += h * np.exp(-0.5 * ((t - c) / width) ** 2)
+    beats += rng.normal(0, 0.02, beats.shape)
+    length = rng.integers(90, 150, n)
+    beats[t[None, :] >= length[:, None]] = 0.0
+    beats = np.clip(beats / beats.max(axis=1, keepdims=True), 0, 1)
+    labels = rng.choice(5, size=n, p=[0.83, 0.03, 0.07, 0.01, 0.06])
+    return beats, labels
+
+
+def csv_beats(path):
+    data = np.loadtxt(path, delimiter=",", dtype=np.float32)
+    return data[:, :N_FEATURES], data[:, -1].astype(int)
+
+
+# ------------------ MEASUREMENT ------------------
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def percentiles(values_s):
+    if not values_s:
+        return None
+    ms = np.asarray(values_s) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "mean_ms": float(ms.mean()),
+    }
+
+
+class Replayer(threading.Thread):
+    """Appends rows to the live CSV at `rate` rows/s and stamps their arrival."""
+
+    def __init__(self, path, beats, labels, rate, duration, tick=0.01):
+        super().__init__(daemon=True)
+        self.path = path
+        self.beats = beats
+        self.labels = labels
+        self.rate = rate
+        self.duration = duration
+        self.tick = tick
+        self.arrivals = []  # row index -> perf_counter at flush
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def run(self):
+        with open(self.path, "w") as f:
+            f.write(",".join(f"f{i}" for i in range(N_FEATURES)) + ",label\n")
+            f.flush()
+            start = time.perf_counter()
+            sent = 0
+            while True:
+                elapsed = time.perf_counter() - start
+                if elapsed >= self.duration:
+                    break
+                due = int(elapsed * self.rate) - sent
+                if due > 0:
+                    for _ in range(due):
+                        i = sent % len(self.beats)
+                        f.write(",".join(f"{v:.5f}" for v in self.beats[i]) + f",{self.labels[i]}\n")
+                        sent += 1
+                    f.flush()
+                    now = time.perf_counter()
+                    self.arrivals.extend([now] * due)
+                time.sleep(self.tick)
+        self.finished_at = time.perf_counter()
+        self.done.set()
+
+
+def bench_pipeline(predictor, beats, labels, rate, duration, drain_timeout):
+    tmp = Path(tempfile.mkdtemp(prefix="ecg_replay_"))
+    input_csv, output_csv, status_file = tmp / "ecg_live.csv", tmp / "predictions.csv", tmp / "status.txt"
+
+    replayer = Replayer(input_csv, beats, labels, rate, duration)
+    classified, status = {}, {}
+
+    def on_beat(idx, pred_class, classified_at):
+        classified[idx] = classified_at
+        status[idx] = time.perf_counter()
+
+    def should_stop():
+        # Stop once the replay is over and the backlog drained (or timed out)
+        if not replayer.done.is_set():
+            return False
+        if len(status) >= len(replayer.arrivals):
+            return True
+        return time.perf_counter() - replayer.finished_at > drain_timeout
+
+    cpu0, wall0 = cpu_seconds(), time.perf_counter()
+    replayer.start()
+
+    # Keep run_live's banner out of the benchmark output
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        ecg_processing.run_live(predictor, str(input_csv), str(output_csv), str(status_file), 0,
+                                on_beat=on_beat, should_stop=should_stop)
+    wall = time.perf_counter() - wall0
+    cpu = cpu_seconds() - cpu0
+
+    arrivals = replayer.arrivals
+    to_class = [classified[i] - arrivals[i] for i in classified if i < len(arrivals)]
+    to_status = [status[i] - arrivals[i] for i in status if i < len(arrivals)]
+    return {
+        "beats_sent": len(arrivals),
+        "beats_classified": len(classified),
+        "backlog_at_stop": len(arrivals) - len(classified),
+        "achieved_beats_per_s": len(classified) / wall if wall else 0.0,
+        "wall_s": wall,
+        "arrival_to_classification": percentiles(to_class),
+        "arrival_to_status": percentiles(to_status),
+        "cpu_s": cpu,
+        "cpu_pct": 100.0 * cpu / wall if wall else 0.0,
+    }
+
+
+def bench_endpoint(duration):
+    """Tight-loop calls to server.get_ecg_status() against a status file."""
+    tmp = Path(tempfile.mkdtemp(prefix="ecg_status_"))
+    status_file = tmp / "ecg_live_status.txt"
+    status_file.write_text("0")
+    os.environ["ECG_STATUS_PATH"] = str(status_file)
+    os.environ.setdefault("GROQ_API_KEY", "replay-bench")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import server
+
+    latencies = []
+    cpu0 = cpu_seconds()
+    end = time.perf_counter() + duration
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            server.get_ecg_status()
+            latencies.append(time.perf_counter() - start)
+    return {
+        "calls": len(latencies),
+        "calls_per_s": len(latencies) / duration,
+        "latency": percentiles(latencies),
+        "cpu_s": cpu_seconds() - cpu0,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay beats into the live ECG pipeline and measure it.")
+    parser.add_argument("--source", default="synthetic",
+                        help="'synthetic' or a headerless MIT-BIH CSV (e.g. AI/ECG/data_ecg/mitbih_train.csv)")
+    parser.add_argument("--rate", type=float, default=100.0, help="beats per second to replay")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of replay")
+    parser.add_argument("--drain-timeout", type=float, default=10.0, help="max seconds to wait for backlog")
+    parser.add_argument("--backend", choices=["auto", "keras", "tflite", "fused"], default="auto")
+    parser.add_argument("--endpoint", action="store_true", help="also benchmark /ecg/status")
+    parser.add_argument("--endpoint-duration", type=float, default=5.0)
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to this file")
+    args = parser.parse_args(argv)
+
+    os.chdir(ROOT)
+    if args.source == "synthetic":
+        beats, labels = synthetic_beats(5000)
+    else:
+        beats, labels = csv_beats(args.source)
+
+    rss_start = rss_mb()
+    predictor = load_predictor(args.backend)
+    rss_model = rss_mb()
+    print(f"Replaying {args.source} at {args.rate:g} beats/s for {args.duration:g}s ({predictor.backend} model)")
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": time.time(),
+        "config": {"source": args.source, "rate": args.rate, "duration": args.duration,
+                   "backend": predictor.backend},
+        "pipeline": bench_pipeline(predictor, beats, labels, args.rate, args.duration, args.drain_timeout),
+    }
+    if args.endpoint:
+        results["status_endpoint"] = bench_endpoint(args.endpoint_duration)
+    results["memory"] = {
+        "rss_start_mb": rss_start,
+        "rss_after_model_mb": rss_model,
+        "rss_end_mb": rss_mb(),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+    pipeline = results["pipeline"]
+    print(f"classified {pipeline['beats_classified']}/{pipeline['beats_sent']} beats "
+          f"({pipeline['achieved_beats_per_s']:.1f}/s, backlog {pipeline['backlog_at_stop']}, "
+          f"cpu {pipeline['cpu_pct']:.0f}%)")
+    for key in ("arrival_to_classification", "arrival_to_status"):
+        p = pipeline[key]
+        if p:
+            print(f"{key:>26}: p50 {p['p50_ms']:.1f} ms  p90 {p['p90_ms']:.1f} ms  p99 {p['p99_ms']:.1f} ms")
+    if args.endpoint:
+        e = results["status_endpoint"]
+        print(f"{'/ecg/status':>26}: {e['calls_per_s']:.0f} calls/s  p50 {e['latency']['p50_ms']:.3f} ms  "
+              f"p99 {e['latency']['p99_ms']:.3f} ms")
+    print(f"{'max RSS':>26}: {results['memory']['max_rss_mb']:.0f} MB")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
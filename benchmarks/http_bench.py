@@ -0,0 +1,162 @@
+"""HTTP benchmark for the server.py routes, with Groq replaced by FakeGroq.
+
+Drives concurrent requests at /questions, /analyze, /transcribe, /tts and
+/ecg/status and reports throughput and p50/p99 latency per route. By default
+the FastAPI app runs in-process through httpx's ASGI transport; pass --url to
+hit a running uvicorn instead (start it with GROQ_FAKE=1).
+
+An event-loop lag probe runs alongside the load: it sleeps 10 ms in a loop
+and records how late it wakes up. Large lag means a route is blocking the
+loop (e.g. a synchronous SDK call inside an `async def` handler).
+
+    python benchmarks/http_bench.py --concurrency 16 --requests 200 --latency-ms 200
+    python benchmarks/http_bench.py --routes analyze,tts --failure-rate 0.1 --json http.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+ANSWERS = {
+    "med": ["Yes, all of them", "8am and 8pm", "No symptoms"],
+    "food": ["Oatmeal with berries", "Salad, then chicken and rice", "One soda"],
+    "sleep": ["11pm to 7am", "About eight hours", "7"],
+}
+
+# route name -> (method, path, request kwargs)
+ROUTES = {
+    "questions": ("GET", "/questions", {}),
+    "analyze": ("POST", "/analyze", {"json": {"answers": ANSWERS}}),
+    "transcribe": ("POST", "/transcribe", {"files": {"file": ("audio.webm", b"\x1a\x45\xdf\xa3" + b"\x00" * 4096, "audio/webm")}}),
+    "tts": ("POST", "/tts", {"data": {"text": "How rested do you feel on a 1-10 scale?"}}),
+    "ecg_status": ("GET", "/ecg/status", {}),
+}
+
+
+def summarize(latencies, errors, wall):
+    ms = np.asarray(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+async def loop_lag_probe(stop, interval=0.01):
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+    return lags
+
+
+async def bench_route(client, name, n_requests, concurrency):
+    method, path, kwargs = ROUTES[name]
+    latencies, errors = [], 0
+    remaining = iter(range(n_requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                r = await client.request(method, path, **kwargs)
+                if r.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(loop_lag_probe(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    stop.set()
+    lags = await probe
+
+    result = summarize(latencies, errors, wall)
+    result["loop_lag_max_ms"] = max(lags) * 1000 if lags else 0.0
+    result["loop_lag_p99_ms"] = float(np.percentile(np.asarray(lags) * 1000, 99)) if lags else 0.0
+    return result
+
+
+async def run(args, routes):
+    if args.url:
+        transport, base_url = None, args.url
+    else:
+        import server
+        transport, base_url = httpx.ASGITransport(app=server.app), "http://bench"
+
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60.0, limits=limits) as client:
+        for name in routes:
+            results[name] = await bench_route(client, name, args.requests, args.concurrency)
+            r = results[name]
+            print(f"{name:<12} {r['throughput_rps']:8.1f} req/s  p50 {r['p50_ms']:8.1f} ms  "
+                  f"p99 {r['p99_ms']:8.1f} ms  errors {r['errors']:<4} loop lag max {r['loop_lag_max_ms']:.1f} ms",
+                  file=sys.__stdout__)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test server.py routes against a fake Groq.")
+    parser.add_argument("--routes", default=",".join(ROUTES), help="comma-separated subset of " + ",".join(ROUTES))
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="fake Groq latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of fake Groq calls that fail")
+    parser.add_argument("--url", default=None, help="benchmark a running server instead of in-process")
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to this file")
+    args = parser.parse_args(argv)
+
+    routes = [r.strip() for r in args.routes.split(",") if r.strip()]
+    unknown = [r for r in routes if r not in ROUTES]
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(unknown)}")
+
+    # Configure the in-process server before it is imported
+    os.environ["GROQ_FAKE"] = "1"
+    os.environ["GROQ_FAKE_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["GROQ_FAKE_JITTER_MS"] = str(args.jitter_ms)
+    os.environ["GROQ_FAKE_FAILURE_RATE"] = str(args.failure_rate)
+    status_file = Path(tempfile.mkdtemp(prefix="http_bench_")) / "ecg_live_status.txt"
+    status_file.write_text("0")
+    os.environ.setdefault("ECG_STATUS_PATH", str(status_file))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    # The server prints on every /analyze and /ecg/status call
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = asyncio.run(run(args, routes))
+
+    if args.json_path:
+        payload = {
+            "config": {k: v for k, v in vars(args).items() if k != "json_path"},
+            "timestamp": time.time(),
+            "routes": results,
+        }
+        with open(args.json_path, "w") as f:
+            json.dump(payload, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Startup-time benchmark for the server and the Python CLI tools.
+
+Each target is started in a fresh interpreter from the repo root, timed a few
+times, and checked against a time budget. A target also fails if importing it
+pulled in TensorFlow, which is what made startup take seconds.
+
+    python benchmarks/startup_bench.py
+    python benchmarks/startup_bench.py --budget 0.8 --repeat 7 --json startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ("tensorflow", "keras", "sklearn", "torch")
+
+# name -> python arguments
+TARGETS = {
+    "server": ["-c", "import server"],
+    "ecg_runtime": ["-c", "import AI.ECG.processing.ecg_runtime"],
+    "ecg_processing": ["-c", "import AI.ECG.processing.ecg_processing"],
+    "ecg_processing --help": ["-m", "AI.ECG.processing.ecg_processing", "--help"],
+}
+
+
+def time_command(args, env):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable] + args, cwd=ROOT, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return time.perf_counter() - start, proc
+
+
+def heavy_imports(args, env):
+    """Return heavy modules left in sys.modules after importing the target."""
+    if args[0] != "-c":
+        return []
+    code = args[1] + "; import sys; print('HEAVY:' + ','.join(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                          capture_output=True, text=True)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith("HEAVY:")]
+    return [m for m in (lines[-1][len("HEAVY:"):].split(",") if lines else []) if m]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start time of server and CLI tools.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.0, help="max median seconds per target")
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to this file")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    # server.py builds the Groq client at import and refuses to start without a key
+    env.setdefault("GROQ_API_KEY", "startup-bench")
+
+    baseline = statistics.median(time_command(["-c", "pass"], env)[0] for _ in range(args.repeat))
+    print(f"interpreter baseline: {baseline * 1000:.0f} ms")
+
+    results = {"baseline_s": baseline, "budget_s": args.budget, "targets": {}}
+    failed = False
+    for name, target_args in TARGETS.items():
+        times = []
+        error = None
+        for _ in range(args.repeat):
+            elapsed, proc = time_command(target_args, env)
+            if proc.returncode != 0:
+                error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+                break
+            times.append(elapsed)
+
+        heavy = [] if error else heavy_imports(target_args, env)
+        median = statistics.median(times) if times else None
+        ok = error is None and not heavy and median <= args.budget
+        failed |= not ok
+
+        results["targets"][name] = {
+            "median_s": median,
+            "min_s": min(times) if times else None,
+            "heavy_modules": heavy,
+            "error": error,
+            "ok": ok,
+        }
+        if error:
+            print(f"{name:<24} FAILED: {error}")
+        else:
+            flag = "ok" if ok else "OVER BUDGET" if not heavy else "HEAVY IMPORT: " + ", ".join(heavy)
+            print(f"{name:<24} median {median * 1000:6.0f} ms  min {min(times) * 1000:6.0f} ms  {flag}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
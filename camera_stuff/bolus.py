@@ -0,0 +1,163 @@
+"""Carbohydrate and meal-bolus estimation from meal-photo detections.
+
+Turns MealAnalyzer results into grams of carbohydrate with uncertainty and
+a suggested insulin range. Per detection:
+
+- portion: the box's share of the image relative to REFERENCE_AREA (the
+  share one standard serving covers), clipped to PORTION_RANGE,
+- carbs: carbs_g per serving (nutrition index) x portion,
+- the detection counts with probability = its confidence, so the item's
+  expected carbs are confidence x carbs. Variance combines that Bernoulli
+  term with the relative error of area-based portions (PORTION_CV), of
+  the table values (NUTRITION_CV) and of fuzzy name matches (1 - match score),
+- a food missing from the nutrition index gets a wide prior
+  (UNKNOWN_CARBS_G per serving, UNKNOWN_CV), and no bolus is suggested for
+  the meal until those items are counted by hand.
+
+Items are summed as independent, giving a central estimate and a
+Z-sigma interval. Dividing by the patient's carb ratio (g per unit) gives
+the bolus range. An optional correction dose is
+(current_bg - target_bg) / isf; below target it is negative and reduces the
+meal dose, and only the final dose is clamped at 0. Everything is computed with numpy over all
+detections of the meal at once. Results are cached per (meal images,
+patient parameters).
+
+This is decision support. The range is shown next to the patient's own
+calculation, never applied automatically.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# ------------------ CONFIG ------------------
+REFERENCE_AREA = 0.12        # fraction of the photo one serving covers on a plate at ESP32 distance
+PORTION_RANGE = (0.25, 3.0)  # servings
+PORTION_CV = 0.35            # relative error of area-based portion size
+NUTRITION_CV = 0.15          # relative error of per-serving table values
+UNKNOWN_CARBS_G = 30.0       # prior for a food missing from the nutrition index (g per serving)
+UNKNOWN_CV = 1.0             # ...and its relative error
+Z = 1.645                    # 90% interval
+DOSE_STEP = 0.5              # insulin pen increment (units)
+CACHE_SIZE = 256
+
+
+def estimate_carbs(carbs_per_serving, box_area, image_area, confidence, match_score=None):
+    """
+    Vectorized per-item carbs: arrays of equal length (NaN carbs = unknown food,
+    which gets the UNKNOWN_CARBS_G prior). Returns (expected grams, variance, portions) per item.
+    """
+    carbs = np.asarray(carbs_per_serving, dtype=np.float64)
+    unknown = np.isnan(carbs)
+    carbs = np.where(unknown, UNKNOWN_CARBS_G, carbs)
+    share = np.asarray(box_area, dtype=np.float64) / np.maximum(np.asarray(image_area, dtype=np.float64), 1.0)
+    portions = np.clip(share / REFERENCE_AREA, *PORTION_RANGE)
+    p = np.clip(np.asarray(confidence, dtype=np.float64), 0.0, 1.0)
+    score = np.ones_like(carbs) if match_score is None else np.nan_to_num(
+        np.asarray(match_score, dtype=np.float64), nan=1.0)
+
+    grams = carbs * portions
+    table_var = np.where(unknown, UNKNOWN_CV ** 2, NUTRITION_CV ** 2 + (1.0 - np.clip(score, 0.0, 1.0)) ** 2)
+    rel_var = PORTION_CV ** 2 + table_var
+    # E[X] = p*g; Var[X] = p*g^2*(1 + cv^2) - (p*g)^2  for X = Bernoulli(p) * g * (1 + error)
+    mean = p * grams
+    var = p * grams ** 2 * (1 + rel_var) - mean ** 2
+    return mean, var, portions
+
+
+def round_dose(units, up=False):
+    step = DOSE_STEP
+    return (math.ceil(units / step - 1e-9) if up else math.floor(units / step + 1e-9)) * step
+
+
+def suggest_bolus(carbs_low, carbs_mid, carbs_high, carb_ratio, current_bg=None, target_bg=None, isf=None):
+    """Meal (+ correction) dose range in units, rounded outward to the pen increment."""
+    correction = 0.0
+    if current_bg is not None and target_bg is not None and isf:
+        # Negative below target: it reduces the meal dose
+        correction = (current_bg - target_bg) / isf
+    low = max(0.0, carbs_low / carb_ratio + correction)
+    high = max(0.0, carbs_high / carb_ratio + correction)
+    return {
+        "units_low": round_dose(low),
+        "units": round(max(0.0, carbs_mid / carb_ratio + correction), 2),
+        "units_high": round_dose(high, up=True),
+        "correction_units": round(correction, 2),
+    }
+
+
+class BolusEstimator:
+    def __init__(self, cache_size=CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def estimate(self, analysis, carb_ratio, current_bg=None, target_bg=None, isf=None):
+        """
+        analysis: MealAnalyzer.analyze() output. carb_ratio in grams of carbs
+        per unit of insulin; current/target BG and isf in the same unit (mg/dL or mmol/L).
+        """
+        if not carb_ratio or carb_ratio <= 0:
+            raise ValueError("carb_ratio must be positive (grams per unit)")
+        key = (tuple(im["hash"] for im in analysis["images"]), carb_ratio, current_bg, target_bg, isf)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        rows = [(pred, im) for im in analysis["images"] for pred in im.get("predictions", [])]
+        carbs = [np.nan if p.get("carbs_g") is None else p["carbs_g"] for p, _ in rows]
+        box_area = [p["width"] * p["height"] for p, _ in rows]
+        image_area = [(im.get("image") or {}).get("width", 0) * (im.get("image") or {}).get("height", 0)
+                      for _, im in rows]
+        confidence = [p["confidence"] for p, _ in rows]
+        match_score = [p.get("match_score", 1.0) if p.get("carbs_g") is not None else 1.0 for p, _ in rows]
+        mean, var, portions = estimate_carbs(carbs, box_area, image_area, confidence, match_score)
+
+        total = float(mean.sum())
+        sd = float(math.sqrt(max(var.sum(), 0.0)))
+        low, high = max(0.0, total - Z * sd), total + Z * sd
+        items = [{
+            "class": p["class"],
+            "food": p.get("food"),
+            "confidence": p["confidence"],
+            "portion_servings": round(float(portions[i]), 2),
+            "carbs_g": round(float(mean[i]), 1),
+            "carbs_sd_g": round(float(math.sqrt(max(var[i], 0.0))), 1),
+            "carbs_source": "prior" if p.get("carbs_g") is None else "table" if p.get("match_exact", True)
+            else "fuzzy match",
+        } for i, (p, _) in enumerate(rows)]
+        unknown = sorted({p["class"] for p, _ in rows if p.get("carbs_g") is None}
+                         | {f for im in analysis["images"] for f in im.get("unknown_foods", [])})
+        failed = [im.get("filename") or im["hash"][:12] for im in analysis["images"] if "error" in im]
+        # A dose needs the whole meal: a photo that did not decode, or no food seen at all, is not a 0 g meal
+        if failed:
+            note = f"Could not read {', '.join(failed)}: retake the photo or count the carbs yourself; no bolus suggested."
+        elif not rows:
+            note = "No food detected: retake the photo or count the carbs yourself; no bolus suggested."
+        elif unknown:
+            note = f"Unrecognised foods ({', '.join(unknown)}): count their carbs yourself; no bolus suggested."
+        else:
+            note = "Estimate from photo only; confirm against your own carb count before dosing."
+
+        result = {
+            "carbs_g": round(total, 1),
+            "carbs_low_g": round(low, 1),
+            "carbs_high_g": round(high, 1),
+            "interval": f"{int(round(100 * math.erf(Z / math.sqrt(2))))}%",
+            "carb_ratio": carb_ratio,
+            # No dose while part of the meal is a guess; the carb range above still includes the prior
+            "bolus": None if (unknown or failed or not rows)
+            else suggest_bolus(low, total, high, carb_ratio, current_bg, target_bg, isf),
+            "items": items,
+            "unknown_foods": unknown,
+            "failed_images": failed,
+            "note": note,
+        }
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
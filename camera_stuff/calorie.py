@@ -1,56 +1,30 @@
-import json
-from inference_sdk import InferenceHTTPClient
+from camera_stuff.detector import load_detector
+from camera_stuff.nutrition import NutritionIndex
 
 # -------------------------------
-# LOAD CONFIG
+# CONFIG
 # -------------------------------
-with open("secret.json", "r") as f:
-    config = json.load(f)
-
-API_KEY = config["roboflow_api_key"]
-MODEL_ID = config["model_id"]
 IMAGE_PATH = 'esp32_photos/capture.jpg'
+DETECTOR_BACKEND = None  # None: $DETECTOR_BACKEND or auto (local ONNX/OpenVINO export, else Roboflow)
 
 # -------------------------------
-# CREATE CLIENT
+# LOAD DETECTOR
 # -------------------------------
-client = InferenceHTTPClient(
-    api_url="https://serverless.roboflow.com",
-    api_key=API_KEY
-)
+detector = load_detector(DETECTOR_BACKEND)
 
 # -------------------------------
-# CALORIE DATA
+# NUTRITION DATA
 # -------------------------------
-calorie_list = [
-    ["Dhokla", 130],
-    ["Aloo Gobhi", 200],
-    ["Aloo Tikki", 87],
-    ["Apple", 52],
-    ["Banana", 90],
-    ["Beetroot", 43],
-    ["Boiled Egg", 155],
-    ["Bread", 80],
-    ["Brown Rice", 111],
-    ["Chapati", 120],
-    ["Chicken", 240],
-    ["Cucumber", 16],
-    ["Daal", 271],
-    ["Dosa", 168],
-    ["Rice", 130],
-    ["Smoothie", 300],
-    ["White Rice", 130]
-]
-
-# Convert list to dictionary for faster lookup
-calorie_dict = {name.lower(): cal for name, cal in calorie_list}
+# camera_stuff/nutrition.csv; class names are matched fuzzily ("boiled-egg" -> Boiled Egg)
+nutrition = NutritionIndex()
 
 # -------------------------------
 # RUN INFERENCE
 # -------------------------------
-result = client.infer(IMAGE_PATH, model_id=MODEL_ID)
+result = detector.infer(IMAGE_PATH)
 
 total_calories = 0
+total_carbs = 0
 
 print("Predictions:")
 for pred in result['predictions']:
@@ -59,9 +33,14 @@ for pred in result['predictions']:
     x, y = pred.get('x'), pred.get('y')
     w, h = pred.get('width'), pred.get('height')
 
-    calories = calorie_dict.get(class_name, 0)
+    food = nutrition.lookup(class_name)
+    calories = food["calories"] if food else 0
+    carbs = food["carbs_g"] if food else 0
+    food_name = food["name"] if food else "unknown"
     total_calories += calories
+    total_carbs += carbs or 0
 
-    print(f"Class: {class_name} | Confidence: {conf:.2f} | Calories: {calories} | Box: ({x}, {y}, {w}, {h})")
+    print(f"Class: {class_name} | Confidence: {conf:.2f} | Food: {food_name} | Calories: {calories} | Carbs: {carbs}g | Box: ({x}, {y}, {w}, {h})")
 
 print(f"\nTotal estimated calories in image: {total_calories}")
+print(f"Total estimated carbs in image: {total_carbs:.1f} g")
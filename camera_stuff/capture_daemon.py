@@ -0,0 +1,245 @@
+"""Continuous ESP32 camera capture with near-duplicate frame dropping.
+
+Grabs frames from the ESP32 at a fixed rate, either by polling /capture over
+one pooled keep-alive session or by reading the MJPEG /stream. Each frame
+gets a 64-bit difference hash (dHash) computed from a tiny greyscale
+thumbnail; JPEG draft mode decodes it at 1/8 scale, so hashing costs far
+less than a full decode. A frame whose hash is within DUPLICATE_BITS of the
+last kept frame is dropped. Only changed frames are saved and, with
+--detect, sent to the food detector, so a static plate is analysed once
+rather than on every frame.
+
+    python -m camera_stuff.capture_daemon --ip 172.20.10.5 --fps 2 --detect
+    python -m camera_stuff.capture_daemon --mode stream --stream-url http://172.20.10.5:81/stream
+
+Try it without hardware against camera_stuff/fake_esp32.py:
+
+    python -m camera_stuff.fake_esp32 --port 8081 &
+    python -m camera_stuff.capture_daemon --ip 127.0.0.1:8081 --mode stream --duration 30
+"""
+
+import argparse
+import io
+import os
+import signal
+import time
+from datetime import datetime
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+# ------------------ CONFIG ------------------
+ESP32_IP = "172.20.10.5"
+SAVE_FOLDER = "esp32_photos"
+FPS = 2.0
+TIMEOUT = 5
+HASH_SIZE = 8           # 8x8 gradient bits -> 64-bit hash
+DUPLICATE_BITS = 6      # hamming distance at or below which a frame counts as unchanged
+RECONNECT_BACKOFF = (0.5, 10.0)
+MJPEG_CHUNK = 16384
+
+running = True
+
+
+def signal_handler(signum, frame):
+    global running
+    running = False
+
+
+# ------------------ PERCEPTUAL HASH ------------------
+def dhash(jpeg, size=HASH_SIZE):
+    """Difference hash of an encoded image: one bit per horizontal gradient sign."""
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(jpeg))
+    # Let the JPEG decoder downscale by up to 8x while decoding, in greyscale
+    img.draft("L", (size * 8, size * 8))
+    pixels = np.asarray(img.convert("L").resize((size + 1, size), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, :-1] > pixels[:, 1:]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+# ------------------ SOURCES ------------------
+def make_session():
+    """One keep-alive connection to the camera, reused for every request."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+
+class SnapshotSource:
+    """Polls GET /capture; each call returns one JPEG."""
+
+    streaming = False
+
+    def __init__(self, url, session=None, timeout=TIMEOUT):
+        self.url = url
+        self.session = session or make_session()
+        self.timeout = timeout
+
+    def frames(self):
+        while True:
+            response = self.session.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            yield response.content
+
+    def close(self):
+        self.session.close()
+
+
+class MjpegSource:
+    """Reads a multipart/x-mixed-replace MJPEG stream, yielding JPEGs as they arrive."""
+
+    streaming = True
+
+    def __init__(self, url, session=None, timeout=TIMEOUT):
+        self.url = url
+        self.session = session or make_session()
+        self.timeout = timeout
+
+    def frames(self):
+        with self.session.get(self.url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            buf = bytearray()
+            for chunk in response.iter_content(MJPEG_CHUNK):
+                buf += chunk
+                # Frames are delimited by JPEG start/end markers, whatever the part boundary is
+                while True:
+                    start = buf.find(b"\xff\xd8")
+                    if start < 0:
+                        # Keep the last byte: it may be the \xff of a marker split across chunks
+                        del buf[:-1]
+                        break
+                    end = buf.find(b"\xff\xd9", start + 2)
+                    if end < 0:
+                        del buf[:start]
+                        break
+                    yield bytes(buf[start:end + 2])
+                    del buf[:end + 2]
+
+    def close(self):
+        self.session.close()
+
+
+# ------------------ DAEMON ------------------
+class CaptureDaemon:
+    def __init__(self, source, fps=FPS, duplicate_bits=DUPLICATE_BITS, save_folder=SAVE_FOLDER, on_frame=None):
+        self.source = source
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.duplicate_bits = duplicate_bits
+        self.save_folder = save_folder
+        self.on_frame = on_frame
+        self.last_hash = None
+        self.stats = {"frames": 0, "kept": 0, "duplicates": 0, "errors": 0, "callback_errors": 0}
+
+    def handle(self, jpeg):
+        """Hash one frame; save and forward it unless it matches the last kept frame."""
+        self.stats["frames"] += 1
+        try:
+            h = dhash(jpeg)
+        except Exception:
+            self.stats["errors"] += 1
+            return None
+        if self.last_hash is not None and hamming(h, self.last_hash) <= self.duplicate_bits:
+            self.stats["duplicates"] += 1
+            return None
+        self.last_hash = h
+        self.stats["kept"] += 1
+
+        path = None
+        if self.save_folder:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+            path = os.path.join(self.save_folder, f"capture_{timestamp}.jpg")
+            with open(path, "wb") as f:
+                f.write(jpeg)
+        if self.on_frame:
+            # A failing consumer (e.g. the detector) costs this frame, not the capture loop
+            try:
+                self.on_frame(jpeg, path)
+            except Exception as e:
+                self.stats["callback_errors"] += 1
+                print(f"Frame callback failed: {e!r}")
+        return path
+
+    def run(self, duration=None):
+        if self.save_folder:
+            os.makedirs(self.save_folder, exist_ok=True)
+        deadline = time.monotonic() + duration if duration else None
+        backoff = RECONNECT_BACKOFF[0]
+        while running and (deadline is None or time.monotonic() < deadline):
+            try:
+                next_at = time.monotonic()
+                for jpeg in self.source.frames():
+                    backoff = RECONNECT_BACKOFF[0]
+                    now = time.monotonic()
+                    if not running or (deadline and now >= deadline):
+                        break
+                    # A stream runs at the camera's rate: skip frames until the next slot
+                    if now < next_at:
+                        continue
+                    next_at = max(next_at + self.interval, now)
+                    self.handle(jpeg)
+                    if not self.source.streaming:
+                        # Snapshots are fetched on demand: wait before asking for the next one
+                        time.sleep(max(0.0, next_at - time.monotonic()))
+            except requests.exceptions.RequestException as e:
+                self.stats["errors"] += 1
+                print(f"Camera error: {e}; retrying in {backoff:.1f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, RECONNECT_BACKOFF[1])
+        self.source.close()
+        return self.stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Capture ESP32 camera frames, dropping near-duplicates.")
+    parser.add_argument("--ip", default=ESP32_IP, help="camera host[:port]")
+    parser.add_argument("--mode", choices=["snapshot", "stream"], default="snapshot")
+    parser.add_argument("--capture-url", default=None, help="default http://<ip>/capture")
+    parser.add_argument("--stream-url", default=None, help="default http://<ip>/stream")
+    parser.add_argument("--fps", type=float, default=FPS)
+    parser.add_argument("--duplicate-bits", type=int, default=DUPLICATE_BITS,
+                        help="max dHash distance (of 64 bits) treated as the same frame")
+    parser.add_argument("--out", default=SAVE_FOLDER)
+    parser.add_argument("--duration", type=float, default=None, help="seconds; default: until Ctrl+C")
+    parser.add_argument("--detect", action="store_true", help="run meal analysis on every kept frame")
+    args = parser.parse_args(argv)
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    if args.mode == "stream":
+        source = MjpegSource(args.stream_url or f"http://{args.ip}/stream")
+    else:
+        source = SnapshotSource(args.capture_url or f"http://{args.ip}/capture")
+
+    on_frame = None
+    if args.detect:
+        from camera_stuff.meals import MealAnalyzer
+        analyzer = MealAnalyzer()
+
+        def on_frame(jpeg, path):
+            result = analyzer.analyze([jpeg], [path])
+            items = ", ".join(f"{k} x{v}" for k, v in result["items"].items()) or "nothing"
+            print(f"{path}: {items} | {result['total_calories']} kcal ({result['seconds'] * 1000:.0f} ms)")
+    else:
+        def on_frame(jpeg, path):
+            print(f"Saved {path}")
+
+    daemon = CaptureDaemon(source, args.fps, args.duplicate_bits, args.out, on_frame)
+    start = time.monotonic()
+    stats = daemon.run(args.duration)
+    elapsed = time.monotonic() - start
+    print(f"\n{stats['frames']} frames in {elapsed:.0f}s: {stats['kept']} kept, {stats['duplicates']} duplicates dropped, "
+          f"{stats['errors']} errors")
+
+
+if __name__ == "__main__":
+    main()
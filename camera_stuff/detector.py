@@ -0,0 +1,340 @@
+"""Local food detector: runs the YOLOv8 weights trained under runs/detect/ on the CPU.
+
+Returns the same response as Roboflow's InferenceHTTPClient.infer, so scripts
+can swap the remote client for a local one without touching how they read
+the predictions:
+
+    {"time": 0.031, "image": {"width": 640, "height": 480},
+     "predictions": [{"x", "y", "width", "height", "confidence", "class", "class_id", "detection_id"}]}
+
+x/y are box centres in source-image pixels.
+
+The .pt weights are exported once to ONNX (or OpenVINO IR) and then loaded
+with onnxruntime / openvino; ultralytics and torch are only needed to export:
+
+    python -m camera_stuff.detector export --weights runs/detect/train7/weights/best.pt
+    python -m camera_stuff.detector detect esp32_photos/capture.jpg --runs 20
+"""
+
+import abc
+import argparse
+import ast
+import io
+import json
+import os
+import time
+import uuid
+
+import numpy as np
+
+# ------------------ CONFIG ------------------
+WEIGHTS_PATH = "runs/detect/train7/weights/best.pt"
+ONNX_PATH = os.getenv("DETECTOR_ONNX", "runs/detect/train7/weights/best.onnx")
+OPENVINO_DIR = os.getenv("DETECTOR_OPENVINO", "runs/detect/train7/weights/best_openvino_model")
+SECRET_PATH = "secret.json"
+ROBOFLOW_URL = "https://serverless.roboflow.com"
+IMGSZ = 640
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.7      # same as the training runs' val NMS (args.yaml)
+MAX_DETECTIONS = 100
+THREADS = int(os.getenv("DETECTOR_THREADS", "0")) or None  # None: runtime default
+
+
+# ------------------ PRE/POST PROCESSING ------------------
+def load_image(image):
+    """Path, bytes, PIL image or HxWx3 uint8 RGB array -> HxWx3 uint8 RGB array."""
+    if isinstance(image, np.ndarray):
+        return image
+    try:
+        from PIL import Image
+    except ImportError as e:
+        raise ImportError("decoding images needs Pillow: pip install pillow") from e
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(io.BytesIO(image))
+    elif isinstance(image, (str, os.PathLike)):
+        image = Image.open(image)
+    return np.asarray(image.convert("RGB"))
+
+
+def letterbox(rgb, size=IMGSZ):
+    """Resize keeping aspect ratio and pad to size x size with grey, like ultralytics."""
+    from PIL import Image
+
+    h, w = rgb.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = round(h * scale), round(w * scale)
+    resized = np.asarray(Image.fromarray(rgb).resize((nw, nh), Image.BILINEAR))
+    top, left = (size - nh) // 2, (size - nw) // 2
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[top:top + nh, left:left + nw] = resized
+    return canvas, scale, left, top
+
+
+def to_blob(canvases):
+    """N letterboxed HxWx3 uint8 images -> (N, 3, H, W) float32 in [0, 1]."""
+    return np.ascontiguousarray(np.stack(canvases).transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+
+
+def nms(boxes, scores, iou_threshold):
+    """Greedy NMS on (n, 4) xyxy boxes; returns kept indices, best first."""
+    order = scores.argsort()[::-1]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def decode_output(output, names, scale, left, top, width, height,
+                  conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, max_det=MAX_DETECTIONS):
+    """
+    One image's YOLOv8 head output (4 + num_classes, anchors), boxes as cx, cy, w, h
+    in letterboxed pixels -> Roboflow-style predictions in source-image pixels.
+    """
+    output = output.T
+    class_scores = output[:, 4:]
+    class_ids = class_scores.argmax(axis=1)
+    confidences = class_scores[np.arange(len(class_ids)), class_ids]
+    mask = confidences >= conf
+    if not mask.any():
+        return []
+    cxcywh, confidences, class_ids = output[mask, :4], confidences[mask], class_ids[mask]
+
+    # Undo the letterbox, then clip to the image
+    cx = (cxcywh[:, 0] - left) / scale
+    cy = (cxcywh[:, 1] - top) / scale
+    w, h = cxcywh[:, 2] / scale, cxcywh[:, 3] / scale
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+
+    # Class-aware NMS: offset boxes per class so different foods never suppress each other
+    offset = class_ids[:, None] * float(max(width, height) + 1)
+    keep = nms(boxes + offset, confidences, iou)[:max_det]
+
+    predictions = []
+    for i in keep:
+        x1, y1, x2, y2 = boxes[i]
+        cls = int(class_ids[i])
+        predictions.append({
+            "x": round(float(x1 + x2) / 2, 1),
+            "y": round(float(y1 + y2) / 2, 1),
+            "width": round(float(x2 - x1), 1),
+            "height": round(float(y2 - y1), 1),
+            "confidence": round(float(confidences[i]), 4),
+            "class": names.get(cls, str(cls)),
+            "class_id": cls,
+            "detection_id": str(uuid.uuid4()),
+        })
+    return predictions
+
+
+def parse_names(value):
+    """ultralytics stores class names as a dict literal in model metadata."""
+    if isinstance(value, dict):
+        return {int(k): v for k, v in value.items()}
+    if isinstance(value, str):
+        return {int(k): v for k, v in ast.literal_eval(value).items()}
+    return {i: n for i, n in enumerate(value or [])}
+
+
+def parse_imgsz(value):
+    if isinstance(value, str):
+        value = ast.literal_eval(value)
+    if isinstance(value, (list, tuple)):
+        value = value[0]
+    return int(value or IMGSZ)
+
+
+# ------------------ BACKENDS ------------------
+class LocalDetector(abc.ABC):
+    """Common batching/decoding around a runtime-specific _run(blob) -> (N, 4 + nc, anchors)."""
+
+    names = {}
+    imgsz = IMGSZ
+
+    def __init__(self, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD):
+        self.conf = conf
+        self.iou = iou
+
+    @abc.abstractmethod
+    def _run(self, blob):
+        """Raw model output for a (N, 3, imgsz, imgsz) float32 blob."""
+
+    def prepare(self, image):
+        """Decode and letterbox one image (thread-safe, so it can run in a pool)."""
+        rgb = load_image(image)
+        canvas, scale, left, top = letterbox(rgb, self.imgsz)
+        return canvas, scale, left, top, rgb.shape[1], rgb.shape[0]
+
+    def detect_prepared(self, prepared):
+        """One forward pass over prepare() outputs; returns one response per image."""
+        start = time.perf_counter()
+        outputs = self._run(to_blob([p[0] for p in prepared]))
+        elapsed = time.perf_counter() - start
+        return [{
+            "inference_id": str(uuid.uuid4()),
+            "time": round(elapsed / len(prepared), 4),
+            "image": {"width": w, "height": h},
+            "predictions": decode_output(output, self.names, scale, left, top, w, h, self.conf, self.iou),
+        } for (_, scale, left, top, w, h), output in zip(prepared, outputs)]
+
+    def detect_batch(self, images):
+        """Detect on several images in one forward pass."""
+        return self.detect_prepared([self.prepare(im) for im in images])
+
+    def infer(self, image, model_id=None):
+        """Drop-in for InferenceHTTPClient.infer (model_id is ignored)."""
+        return self.detect_batch([image])[0]
+
+
+class OnnxDetector(LocalDetector):
+    def __init__(self, path=ONNX_PATH, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, threads=THREADS):
+        super().__init__(conf, iou)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = parse_names(meta.get("names"))
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.imgsz = inp.shape[-1] if isinstance(inp.shape[-1], int) else parse_imgsz(meta.get("imgsz"))
+        # Exports without dynamic=True have a fixed batch of 1
+        self.fixed_batch = isinstance(inp.shape[0], int)
+
+    def _run(self, blob):
+        if self.fixed_batch and len(blob) > 1:
+            return np.concatenate([self.session.run(None, {self.input_name: b[None]})[0] for b in blob])
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoDetector(LocalDetector):
+    def __init__(self, model_dir=OPENVINO_DIR, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, threads=THREADS):
+        super().__init__(conf, iou)
+        import openvino as ov
+        import yaml
+
+        core = ov.Core()
+        config = {"INFERENCE_NUM_THREADS": threads} if threads else {}
+        xml = next(os.path.join(model_dir, f) for f in os.listdir(model_dir) if f.endswith(".xml"))
+        model = core.read_model(xml)
+        self.fixed_batch = model.inputs[0].get_partial_shape()[0].is_static
+        self.compiled = core.compile_model(model, "CPU", config)
+        with open(os.path.join(model_dir, "metadata.yaml")) as f:
+            meta = yaml.safe_load(f)
+        self.names = parse_names(meta.get("names"))
+        self.imgsz = parse_imgsz(meta.get("imgsz"))
+
+    def _run(self, blob):
+        if self.fixed_batch and len(blob) > 1:
+            return np.concatenate([self.compiled(b[None])[0] for b in blob])
+        return self.compiled(blob)[0]
+
+
+class RoboflowDetector:
+    """The hosted Roboflow model, for when no local export is available."""
+
+    def __init__(self, secret_path=SECRET_PATH):
+        from inference_sdk import InferenceHTTPClient
+
+        with open(secret_path, "r") as f:
+            config = json.load(f)
+        self.client = InferenceHTTPClient(api_url=ROBOFLOW_URL, api_key=config["roboflow_api_key"])
+        self.model_id = config["model_id"]
+
+    def infer(self, image, model_id=None):
+        return self.client.infer(image, model_id=model_id or self.model_id)
+
+    def prepare(self, image):
+        from PIL import Image
+        return Image.fromarray(load_image(image))
+
+    def detect_prepared(self, prepared):
+        # One HTTP request per image: the hosted API has no batch call
+        return [self.infer(im) for im in prepared]
+
+    def detect_batch(self, images):
+        return self.detect_prepared([self.prepare(im) for im in images])
+
+
+def load_detector(backend=None, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, base_dir="."):
+    """
+    backend: "openvino", "onnx", "roboflow" or "auto" (DETECTOR_BACKEND env, default auto).
+    auto prefers a local OpenVINO/ONNX export and falls back to Roboflow.
+    Relative model/secret paths are resolved against base_dir.
+    """
+    backend = backend or os.getenv("DETECTOR_BACKEND", "auto")
+    openvino_dir, onnx_path, secret_path = (os.path.join(base_dir, p) for p in (OPENVINO_DIR, ONNX_PATH, SECRET_PATH))
+    if backend == "openvino" or (backend == "auto" and os.path.isdir(openvino_dir)):
+        try:
+            return OpenVinoDetector(openvino_dir, conf, iou)
+        except ImportError:
+            if backend == "openvino":
+                raise
+    if backend == "onnx" or (backend == "auto" and os.path.exists(onnx_path)):
+        return OnnxDetector(onnx_path, conf, iou)
+    if backend in ("auto", "roboflow"):
+        return RoboflowDetector(secret_path)
+    raise ValueError(f"unknown detector backend: {backend}")
+
+
+# ------------------ EXPORT ------------------
+def export(weights=WEIGHTS_PATH, fmt="onnx", imgsz=IMGSZ, dynamic=True, half=False):
+    """Export trained .pt weights next to themselves with ultralytics (needs torch)."""
+    from ultralytics import YOLO
+
+    kwargs = {"format": fmt, "imgsz": imgsz, "dynamic": dynamic}
+    if fmt == "onnx":
+        kwargs["simplify"] = True
+    if fmt == "openvino":
+        kwargs["half"] = half
+    return YOLO(weights).export(**kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local food detector (YOLOv8 via ONNX/OpenVINO).")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_exp = sub.add_parser("export", help="export .pt weights to ONNX or OpenVINO")
+    p_exp.add_argument("--weights", default=WEIGHTS_PATH)
+    p_exp.add_argument("--format", choices=["onnx", "openvino"], default="onnx")
+    p_exp.add_argument("--imgsz", type=int, default=IMGSZ)
+    p_exp.add_argument("--half", action="store_true", help="FP16 weights (OpenVINO)")
+    p_det = sub.add_parser("detect", help="run detection on images and print the predictions")
+    p_det.add_argument("images", nargs="+")
+    p_det.add_argument("--backend", choices=["auto", "onnx", "openvino", "roboflow"], default="auto")
+    p_det.add_argument("--conf", type=float, default=CONF_THRESHOLD)
+    p_det.add_argument("--runs", type=int, default=1, help="repeat to measure latency")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        print(f"Exported to {export(args.weights, args.format, args.imgsz, half=args.half)}")
+        return
+
+    detector = load_detector(args.backend, conf=args.conf)
+    for path in args.images:
+        result = detector.infer(path)
+        timings = []
+        for _ in range(args.runs - 1):
+            t0 = time.perf_counter()
+            detector.infer(path)
+            timings.append((time.perf_counter() - t0) * 1000)
+        print(json.dumps(result, indent=2))
+        if timings:
+            print(f"{path}: {np.median(timings):.1f} ms median over {len(timings)} runs ({type(detector).__name__})")
+
+
+if __name__ == "__main__":
+    main()
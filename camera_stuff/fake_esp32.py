@@ -0,0 +1,138 @@
+"""Local stand-in for the ESP32-CAM web server, for testing capture without hardware.
+
+Serves the same endpoints as the CameraWebServer sketch:
+    GET /capture   one JPEG
+    GET /stream    multipart/x-mixed-replace MJPEG at --fps
+
+Frames are a "meal" that changes every --scene-seconds (the base photo
+mirrored, zoomed or half eaten). Within a scene every frame carries fresh sensor
+noise and JPEG artefacts, so the frames are near-duplicates rather than
+byte-identical ones.
+
+    python -m camera_stuff.fake_esp32 --port 8081 --image esp32_photos/capture.jpg
+"""
+
+import argparse
+import io
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# ------------------ CONFIG ------------------
+IMAGE_PATH = "esp32_photos/capture.jpg"
+PORT = 8081
+FPS = 10.0
+SCENE_SECONDS = 5.0
+NOISE = 6.0            # std-dev of per-pixel sensor noise
+VARIANTS = 8           # pre-encoded noisy frames per scene
+BOUNDARY = "123456789000000000000987654321"  # the ESP32 sketch's part boundary
+
+
+def make_scenes(path, count=4):
+    from PIL import Image, ImageOps
+
+    base = Image.open(path).convert("RGB")
+    w, h = base.size
+    eaten = base.copy()
+    eaten.paste((235, 230, 220), (w // 2, 0, w, h))  # half the plate cleared
+    scenes = [base, ImageOps.mirror(base), base.crop((w // 3, 0, w, h)).resize(base.size), eaten]
+    return [np.asarray(s, dtype=np.float32) for s in scenes[:count]]
+
+
+def encode_variants(scene, n=VARIANTS, noise=NOISE, seed=0):
+    """JPEG-encode n copies of a scene, each with its own noise."""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(n):
+        noisy = np.clip(scene + rng.normal(0, noise, scene.shape), 0, 255).astype(np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(noisy).save(buf, format="JPEG", quality=random.Random(seed).randint(70, 90))
+        frames.append(buf.getvalue())
+    return frames
+
+
+class FakeCamera:
+    def __init__(self, image_path=IMAGE_PATH, scene_seconds=SCENE_SECONDS, noise=NOISE):
+        self.scenes = [encode_variants(s, noise=noise, seed=i) for i, s in enumerate(make_scenes(image_path))]
+        self.scene_seconds = scene_seconds
+        self.start = time.monotonic()
+        self.served = 0
+        self._lock = threading.Lock()
+
+    def frame(self):
+        scene = int((time.monotonic() - self.start) / self.scene_seconds) % len(self.scenes)
+        with self._lock:
+            self.served += 1
+        return random.choice(self.scenes[scene])
+
+
+def make_handler(camera, fps):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the ESP32's httpd
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.startswith("/capture"):
+                jpeg = camera.frame()
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(jpeg)))
+                self.end_headers()
+                self.wfile.write(jpeg)
+            elif self.path.startswith("/stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/x-mixed-replace;boundary={BOUNDARY}")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                try:
+                    while True:
+                        jpeg = camera.frame()
+                        self.wfile.write(f"\r\n--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                         f"Content-Length: {len(jpeg)}\r\n\r\n".encode() + jpeg)
+                        self.wfile.flush()
+                        time.sleep(1.0 / fps)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                self.close_connection = True
+            else:
+                self.send_error(404)
+
+    return Handler
+
+
+def serve(port=PORT, image_path=IMAGE_PATH, fps=FPS, scene_seconds=SCENE_SECONDS, noise=NOISE):
+    camera = FakeCamera(image_path, scene_seconds, noise)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(camera, fps))
+    server.daemon_threads = True
+    server.camera = camera
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake ESP32-CAM HTTP server.")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--image", default=IMAGE_PATH)
+    parser.add_argument("--fps", type=float, default=FPS, help="MJPEG stream rate")
+    parser.add_argument("--scene-seconds", type=float, default=SCENE_SECONDS, help="how often the plate changes")
+    parser.add_argument("--noise", type=float, default=NOISE)
+    args = parser.parse_args(argv)
+
+    server = serve(args.port, args.image, args.fps, args.scene_seconds, args.noise)
+    print(f"Fake ESP32 on http://127.0.0.1:{args.port}/capture and /stream "
+          f"({len(server.camera.scenes)} scenes, {args.scene_seconds}s each)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"Served {server.camera.served} frames")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Meal-photo analysis: food detection plus calorie totals for one or many images.
+
+Used by the server's POST /meals/analyze. For each request:
+1. every upload is hashed (sha256 of the bytes); images already in the
+   result cache are answered from it,
+2. the remaining images are decoded and letterboxed in a thread pool,
+3. detection runs in batches of up to BATCH_SIZE images per forward pass,
+4. each detection is matched to the nutrition index (camera_stuff/nutrition.py)
+   and its calories and carbs are summed per image and per meal.
+
+    analyzer = MealAnalyzer()
+    analyzer.analyze([open("esp32_photos/capture.jpg", "rb").read()])
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from camera_stuff.detector import load_detector
+from camera_stuff.nutrition import NutritionIndex
+
+# ------------------ CONFIG ------------------
+BATCH_SIZE = 8        # images per detector forward pass
+DECODE_WORKERS = 4
+CACHE_SIZE = 512      # analysed images kept by content hash
+
+
+class MealAnalyzer:
+    def __init__(self, detector=None, nutrition=None, batch_size=BATCH_SIZE, workers=DECODE_WORKERS,
+                 cache_size=CACHE_SIZE):
+        self.detector = detector or load_detector()
+        self.nutrition = nutrition or NutritionIndex()
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="meal-decode")
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+    # ------------------ CACHE ------------------
+    def _cached(self, key):
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+            return result
+
+    def _store(self, key, result):
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # ------------------ ANALYSIS ------------------
+    def price(self, response):
+        """Attach nutrition (fuzzy-matched by class name) to each prediction of one detector response."""
+        predictions = []
+        calories = carbs = 0.0
+        unknown = []
+        for pred in response["predictions"]:
+            food = self.nutrition.lookup(pred["class"])
+            if food is None:
+                unknown.append(pred["class"])
+                predictions.append(dict(pred, food=None, calories=None, carbs_g=None))
+                continue
+            calories += food["calories"] or 0.0
+            carbs += food["carbs_g"] or 0.0
+            # Fuzzy matches (score < 1) are flagged so carb estimates can widen their uncertainty
+            predictions.append(dict(pred, food=food["name"], match_score=food["score"], match_exact=food["score"] >= 1.0,
+                                    calories=food["calories"], carbs_g=food["carbs_g"]))
+        return {"image": response.get("image"), "predictions": predictions, "calories": round(calories, 1),
+                "carbs_g": round(carbs, 1), "unknown_foods": sorted(set(unknown))}
+
+    def analyze(self, images, names=None):
+        """
+        images: list of encoded image bytes. Returns per-image detections with
+        calories and carbs (in input order) and the meal's totals.
+        """
+        start = time.perf_counter()
+        names = names or [None] * len(images)
+        keys = [hashlib.sha256(data).hexdigest() for data in images]
+
+        results = {}
+        todo = {}  # hash -> bytes, duplicates within the request are analysed once
+        for key, data in zip(keys, images):
+            cached = self._cached(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                todo.setdefault(key, data)
+
+        errors = {}
+        if todo:
+            pending = list(todo)
+            futures = [self._pool.submit(self.detector.prepare, todo[key]) for key in pending]
+            prepared = []
+            for key, fut in zip(pending, futures):
+                try:
+                    prepared.append((key, fut.result()))
+                except Exception as e:  # not an image, truncated upload...
+                    errors[key] = f"could not decode image: {e}"
+            for i in range(0, len(prepared), self.batch_size):
+                batch = prepared[i:i + self.batch_size]
+                for (key, _), response in zip(batch, self.detector.detect_prepared([p for _, p in batch])):
+                    results[key] = self.price(response)
+                    self._store(key, results[key])
+
+        out = []
+        for key, name in zip(keys, names):
+            if key in errors:
+                out.append({"filename": name, "hash": key, "error": errors[key]})
+            else:
+                out.append(dict(results[key], filename=name, hash=key, cached=key not in todo))
+        items = {}
+        for r in out:
+            for pred in r.get("predictions", []):
+                items[pred["class"]] = items.get(pred["class"], 0) + 1
+        return {
+            "images": out,
+            "total_calories": round(sum(r.get("calories", 0.0) for r in out), 1),
+            "total_carbs_g": round(sum(r.get("carbs_g", 0.0) for r in out), 1),
+            "items": items,
+            "analyzed": len(todo) - len(errors),
+            "cache_hits": sum(1 for key in keys if key not in todo),
+            "seconds": round(time.perf_counter() - start, 4),
+        }
@@ -0,0 +1,227 @@
+"""Nutrition lookup for detected food classes.
+
+Loads one or more food CSVs (the bundled nutrition.csv, or larger exports
+such as a USDA FoodData Central table) into an index with:
+- normalized keys: lowercase, '-'/'_' as spaces, collapsed whitespace, so
+  'Boiled-Egg', 'boiled_egg' and 'boiled egg' are the same food,
+- an exact map over names and aliases,
+- a trigram inverted index for fuzzy matches ('boild egg' -> Boiled Egg),
+  scored by trigram Jaccard similarity times word coverage, so a composite
+  dish is not matched to its first word ('chicken biryani' is not Chicken),
+- a per-class match cache: detectors emit a small, fixed set of class
+  names, so each distinct name is matched once.
+
+    index = NutritionIndex()
+    index.lookup("boiled-egg")   # {"name": "Boiled Egg", "calories": 155.0, "carbs_g": 1.1, "score": 1.0, ...}
+
+    python -m camera_stuff.nutrition "aloo gobi" "boild egg"
+    python -m camera_stuff.nutrition --bench 20000
+"""
+
+import argparse
+import csv
+import difflib
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+# ------------------ CONFIG ------------------
+NUTRITION_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nutrition.csv")
+MIN_SIMILARITY = 0.45   # trigram Jaccard x word coverage below this is "unknown food"
+WORD_SIMILARITY = 0.75  # difflib ratio for two words to count as the same ('boild' ~ 'boiled')
+RERANK = 8              # trigram candidates rescored with word coverage
+CACHE_SIZE = 4096
+
+# Header spellings accepted for each field, so external databases load as-is
+COLUMNS = {
+    "name": ("name", "food", "description", "food_name"),
+    "calories": ("calories", "kcal", "energy_kcal", "energy (kcal)", "calories_kcal"),
+    "carbs_g": ("carbs_g", "carbs", "carbohydrate", "carbohydrate_g", "carbohydrate, by difference (g)"),
+    "aliases": ("aliases", "synonyms"),
+}
+
+
+def normalize_food(name):
+    """'Boiled-Egg', 'boiled_egg' and 'boiled egg' are the same food."""
+    return " ".join(name.lower().replace("-", " ").replace("_", " ").split())
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def word_coverage(query, key):
+    """Fuzzy word-level Jaccard: words of either name without a counterpart in the other lower it."""
+    q, k = query.split(), key.split()
+    unmatched = list(k)
+    matched = 0
+    for word in q:
+        best = max(unmatched, key=lambda w: difflib.SequenceMatcher(None, word, w).ratio(), default=None)
+        if best is not None and difflib.SequenceMatcher(None, word, best).ratio() >= WORD_SIMILARITY:
+            unmatched.remove(best)
+            matched += 1
+    return matched / (len(q) + len(k) - matched) if q or k else 0.0
+
+
+def _column(fieldnames, field):
+    lowered = {f.strip().lower(): f for f in fieldnames}
+    return next((lowered[c] for c in COLUMNS[field] if c in lowered), None)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class NutritionIndex:
+    def __init__(self, paths=(NUTRITION_CSV,), min_similarity=MIN_SIMILARITY):
+        self.min_similarity = min_similarity
+        self.foods = []        # id -> {"name", "calories", "carbs_g"}
+        self.exact = {}        # normalized name/alias -> id
+        self.keys = []         # (normalized key, id) for every name and alias
+        self.key_grams = []    # key index -> trigram set
+        self.postings = {}     # trigram -> [key index]
+        self._arrays = None
+        self._cache = {}
+        self._lock = threading.Lock()
+        for path in paths:
+            self.load(path)
+
+    def __len__(self):
+        return len(self.foods)
+
+    # ------------------ LOADING ------------------
+    def load(self, path):
+        """Add foods from a CSV; a food already in the index is overridden by name."""
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            cols = {field: _column(reader.fieldnames or [], field) for field in COLUMNS}
+            if cols["name"] is None or cols["calories"] is None:
+                raise ValueError(f"{path}: needs a name and a calories column, got {reader.fieldnames}")
+            for row in reader:
+                aliases = (row.get(cols["aliases"]) or "").split("|") if cols["aliases"] else []
+                self.add(row[cols["name"]], _number(row[cols["calories"]]),
+                         _number(row.get(cols["carbs_g"])) if cols["carbs_g"] else None, aliases)
+
+    def add(self, name, calories, carbs_g=None, aliases=()):
+        key = normalize_food(name)
+        if not key:
+            return None
+        food = {"name": name.strip(), "calories": calories, "carbs_g": carbs_g}
+        with self._lock:
+            food_id = self.exact.get(key)
+            if food_id is not None and normalize_food(self.foods[food_id]["name"]) == key:
+                self.foods[food_id] = food
+            else:
+                food_id = len(self.foods)
+                self.foods.append(food)
+            for k in [key] + [normalize_food(a) for a in aliases]:
+                if not k or self.exact.get(k) == food_id:
+                    continue
+                self.exact[k] = food_id
+                self.keys.append((k, food_id))
+                grams = trigrams(k)
+                self.key_grams.append(grams)
+                for g in grams:
+                    self.postings.setdefault(g, []).append(len(self.keys) - 1)
+            self._arrays = None
+            self._cache.clear()
+        return food_id
+
+    # ------------------ MATCHING ------------------
+    def _frozen(self):
+        # numpy postings are rebuilt lazily after add(); lookups then share them read-only
+        if self._arrays is None:
+            with self._lock:
+                self._arrays = ({g: np.asarray(ids, dtype=np.int32) for g, ids in self.postings.items()},
+                                np.array([len(g) for g in self.key_grams], dtype=np.float32))
+        return self._arrays
+
+    def _fuzzy(self, key):
+        postings, sizes = self._frozen()
+        grams = trigrams(key)
+        hits = [postings[g] for g in grams if g in postings]
+        if not hits:
+            return None, 0.0
+        shared = np.bincount(np.concatenate(hits), minlength=len(sizes))
+        scores = shared / (len(grams) + sizes - shared)  # trigram Jaccard per key
+        top = np.argsort(scores)[::-1][:RERANK]
+        ranked = [(float(scores[i]) * word_coverage(key, self.keys[i][0]), int(i)) for i in top if scores[i] > 0]
+        score, best = max(ranked)
+        if score < self.min_similarity:
+            return None, score
+        return self.keys[best][1], score
+
+    def match(self, name):
+        """(food id or None, similarity) for a detector class name."""
+        key = normalize_food(name)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        food_id = self.exact.get(key)
+        result = (food_id, 1.0) if food_id is not None else self._fuzzy(key)
+        with self._lock:
+            if len(self._cache) >= CACHE_SIZE:
+                self._cache.clear()
+            self._cache[key] = result
+        return result
+
+    def lookup(self, name):
+        """Nutrition for a detected class (with the matched name and score), or None if unknown."""
+        food_id, score = self.match(name)
+        if food_id is None:
+            return None
+        return dict(self.foods[food_id], score=round(score, 3), query=name)
+
+
+# ------------------ CLI ------------------
+def synthetic_foods(n, seed=0):
+    """n made-up food names, for timing the index at database scale."""
+    rng = random.Random(seed)
+    words = ["aloo", "gobhi", "rice", "daal", "paneer", "masala", "chicken", "egg", "bread", "roti", "curry",
+             "fried", "boiled", "spicy", "sweet", "banana", "apple", "dosa", "idli", "sambar", "chutney",
+             "tikka", "palak", "chana", "rajma", "kheer", "halwa", "pulao", "biryani", "raita", "salad"]
+    names = set()
+    while len(names) < n:
+        names.add(" ".join(rng.sample(words, rng.randint(1, 3))) + f" {rng.randint(0, 999)}")
+    return sorted(names)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nutrition lookup with fuzzy class matching.")
+    parser.add_argument("names", nargs="*", help="class names to look up")
+    parser.add_argument("--csv", action="append", default=None, help="food CSV(s); default: nutrition.csv")
+    parser.add_argument("--bench", type=int, default=0, help="add N synthetic foods and time lookups")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    index = NutritionIndex(args.csv or [NUTRITION_CSV])
+    if args.bench:
+        for name in synthetic_foods(args.bench):
+            index.add(name, 100.0, 10.0)
+    print(f"{len(index)} foods, {len(index.postings)} trigrams, built in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    for name in args.names:
+        print(f"{name!r}: {index.lookup(name)}")
+
+    if args.bench:
+        queries = ["boild egg", "aloo gobi", "chapatti", "brown-rice", "palak paneer 12", "unknown thing"]
+        index.lookup("warm up")
+        for cached in (False, True):
+            if not cached:
+                index._cache.clear()
+            t0 = time.perf_counter()
+            for q in queries:
+                index.lookup(q)
+            per = (time.perf_counter() - t0) / len(queries) * 1000
+            print(f"{'cached' if cached else 'uncached'} lookup: {per:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""CPU training for the YOLOv8 food detector on a pre-decoded image cache.
+
+The earlier runs (runs/detect/train*/args.yaml) trained with cache: false,
+so every epoch decoded and resized every JPEG again before augmenting it.
+This script does that work once:
+
+- prepare: decodes each train/val image, resizes its long side to imgsz
+  (as ultralytics' load_image does) and writes it as BGR uint8 into one
+  memory-mapped .npy store under camera_stuff/.cache/yolo/<key>/ (key: image
+  files' size/mtime + imgsz). Decoding runs in a process pool.
+- train: runs the ultralytics DetectionTrainer with a dataset whose
+  load_image() slices the memmap instead of decoding. Augmentation is seeded
+  per sample from (seed, epoch, image index). Mosaic still picks its partner
+  images from each loader worker's own buffer, so batches only repeat exactly
+  across reruns with the same worker count and scheduling. Per-epoch
+  data-loading vs compute time goes to <run dir>/timings.csv.
+- bench: compares JPEG decode+resize with memmap reads.
+
+    python -m camera_stuff.train_detector prepare --data models/yolo8/data.yaml
+    python -m camera_stuff.train_detector train --data models/yolo8/data.yaml --epochs 50
+    python -m camera_stuff.train_detector bench --data models/yolo8/data.yaml
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# ------------------ CONFIG ------------------
+CACHE_DIR = os.getenv("DETECTOR_CACHE", "camera_stuff/.cache/yolo")
+MODEL = "yolov8n.pt"
+IMGSZ = 640
+EPOCHS = 50
+BATCH = 16
+WORKERS = 2        # decoding is cached, so few loader workers keep up with the CPU
+SEED = 0
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+DECODE_CHUNK = 64
+
+
+# ------------------ DATASET FILES ------------------
+def list_images(data_yaml, split):
+    """Image paths of a split in an ultralytics data.yaml (directories, list files or lists of both)."""
+    import yaml
+
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+    root = data.get("path") or os.path.dirname(os.path.abspath(data_yaml))
+    if not os.path.isabs(root):
+        root = os.path.join(os.path.dirname(os.path.abspath(data_yaml)), root)
+    entries = data.get(split) or []
+    files = []
+    for entry in entries if isinstance(entries, list) else [entries]:
+        path = entry if os.path.isabs(entry) else os.path.join(root, entry)
+        if os.path.isdir(path):
+            for dirpath, _, names in os.walk(path):
+                files += [os.path.join(dirpath, n) for n in names if n.lower().endswith(IMAGE_EXTS)]
+        elif path.endswith(".txt"):
+            with open(path) as f:
+                base = os.path.dirname(path)
+                files += [os.path.normpath(os.path.join(base, line.strip())) for line in f if line.strip()]
+    return sorted(os.path.abspath(p) for p in files)
+
+
+# ------------------ IMAGE STORE ------------------
+def decode_resized(path, imgsz):
+    """BGR uint8 image with its long side resized to imgsz, plus the original (h, w)."""
+    from PIL import Image, ImageOps
+
+    img = ImageOps.exif_transpose(Image.open(path)).convert("RGB")
+    w0, h0 = img.size
+    r = imgsz / max(h0, w0)
+    if r != 1:
+        w, h = min(math.ceil(w0 * r), imgsz), min(math.ceil(h0 * r), imgsz)
+        img = img.resize((w, h), Image.BILINEAR)
+    return np.asarray(img)[:, :, ::-1], (h0, w0)
+
+
+def _decode_chunk(store_path, paths, offset, imgsz):
+    images = np.load(store_path, mmap_mode="r+")
+    shapes = []
+    for i, path in enumerate(paths):
+        im, hw0 = decode_resized(path, imgsz)
+        h, w = im.shape[:2]
+        images[offset + i, :h, :w] = im
+        shapes.append((hw0, (h, w)))
+    images.flush()
+    return offset, shapes
+
+
+class ImageStore:
+    """Resized BGR images in one (n, imgsz, imgsz, 3) uint8 memmap, plus per-image shapes."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.imgsz = meta["imgsz"]
+        self.files = meta["files"]
+        self.hw0 = [tuple(s) for s in meta["hw0"]]
+        self.hw = [tuple(s) for s in meta["hw"]]
+        self.index = {f: i for i, f in enumerate(self.files)}
+        self.images = np.load(os.path.join(path, "images.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.files)
+
+    def load(self, i):
+        h, w = self.hw[i]
+        # Copy: augmentations write into the array
+        return np.array(self.images[i, :h, :w]), self.hw0[i], (h, w)
+
+    @staticmethod
+    def key(files, imgsz):
+        h = hashlib.sha256(f"v1:{imgsz}".encode())
+        for path in files:
+            st = os.stat(path)
+            h.update(f"{path}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+        return h.hexdigest()[:16]
+
+    @classmethod
+    def get(cls, files, imgsz=IMGSZ, root=CACHE_DIR, workers=None):
+        """Store for these files at this size, decoding them first if not cached."""
+        files = sorted(os.path.abspath(p) for p in files)
+        path = os.path.join(root, cls.key(files, imgsz))
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            start = time.perf_counter()
+            cls.build(files, imgsz, path, workers)
+            size = os.path.getsize(os.path.join(path, "images.npy")) / (1 << 20)
+            print(f"Cached {len(files)} images at {imgsz}px -> {path} ({size:.0f} MB) in {time.perf_counter() - start:.1f}s")
+        return cls(path)
+
+    @staticmethod
+    def build(files, imgsz, path, workers=None):
+        tmp = path + ".partial"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        store_path = os.path.join(tmp, "images.npy")
+        np.lib.format.open_memmap(store_path, mode="w+", dtype=np.uint8, shape=(len(files), imgsz, imgsz, 3)).flush()
+
+        hw0, hw = [None] * len(files), [None] * len(files)
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, mp_context=mp.get_context("spawn")) as pool:
+            futures = [pool.submit(_decode_chunk, store_path, files[i:i + DECODE_CHUNK], i, imgsz)
+                       for i in range(0, len(files), DECODE_CHUNK)]
+            for fut in futures:
+                offset, shapes = fut.result()
+                for i, (s0, s) in enumerate(shapes):
+                    hw0[offset + i], hw[offset + i] = s0, s
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"imgsz": imgsz, "files": files, "hw0": hw0, "hw": hw}, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+
+# ------------------ ULTRALYTICS INTEGRATION ------------------
+def memmap_dataset_class(base):
+    """
+    Subclass of an ultralytics dataset class (YOLODataset) whose images come
+    from an ImageStore and whose per-sample augmentation RNG is seeded from
+    (seed, epoch, index). Built as a direct subclass, not a mixin, so an
+    existing dataset's __class__ can be swapped in place (torch's Generic
+    Dataset rejects that for mixed-in layouts).
+    """
+
+    class MemmapDataset(base):
+        def attach_store(self, store, seed, epoch):
+            self.store = store
+            self.store_index = [store.index.get(os.path.abspath(f)) for f in self.im_files]
+            self.aug_seed = seed
+            self.epoch = epoch  # mp.Value shared with forked loader workers
+
+        def load_image(self, i, rect_mode=True, **kwargs):
+            j = self.store_index[i]
+            if j is None or not rect_mode or kwargs.get("resize_short") or self.store.imgsz != self.imgsz:
+                return super().load_image(i, rect_mode, **kwargs)
+            if self.ims[i] is not None:
+                return self.ims[i], self.im_hw0[i], self.im_hw[i]
+            im, hw0, hw = self.store.load(j)
+            # Same bookkeeping as BaseDataset.load_image: Mosaic draws its partner images from self.buffer
+            if self.augment and self.cache != "ram":
+                self.ims[i], self.im_hw0[i], self.im_hw[i] = im, hw0, hw
+                self.buffer.append(i)
+                if 1 < len(self.buffer) >= self.max_buffer_length:
+                    k = self.buffer.pop(0)
+                    self.ims[k], self.im_hw0[k], self.im_hw[k] = None, None, None
+            return im, hw0, hw
+
+        def __getitem__(self, index):
+            # Seeds the per-sample transforms; mosaic partners depend on which images this worker has buffered
+            seed = (self.aug_seed * 1000003 + self.epoch.value * 100003 + index) % (1 << 32)
+            random.seed(seed)
+            np.random.seed(seed)
+            return super().__getitem__(index)
+
+    MemmapDataset.__name__ = MemmapDataset.__qualname__ = f"Memmap{base.__name__}"
+    return MemmapDataset
+
+
+class EpochTimer:
+    """Splits each training epoch into time waiting for batches and time computing on them."""
+
+    FIELDS = ["epoch", "batches", "data_s", "compute_s", "data_pct", "epoch_s"]
+
+    def __init__(self):
+        self.rows = []
+
+    def on_train_epoch_start(self, trainer):
+        self.epoch_start = self.last = time.perf_counter()
+        self.data = self.compute = 0.0
+        self.batches = 0
+
+    def on_train_batch_start(self, trainer):
+        now = time.perf_counter()
+        self.data += now - self.last
+        self.last = now
+
+    def on_train_batch_end(self, trainer):
+        now = time.perf_counter()
+        self.compute += now - self.last
+        self.batches += 1
+        self.last = now
+
+    def on_train_epoch_end(self, trainer):
+        total = time.perf_counter() - self.epoch_start
+        row = {"epoch": trainer.epoch + 1, "batches": self.batches, "data_s": round(self.data, 2),
+               "compute_s": round(self.compute, 2), "data_pct": round(100 * self.data / total, 1) if total else 0.0,
+               "epoch_s": round(total, 2)}
+        self.rows.append(row)
+        path = os.path.join(str(trainer.save_dir), "timings.csv")
+        new = not os.path.exists(path)
+        with open(path, "a") as f:
+            if new:
+                f.write(",".join(self.FIELDS) + "\n")
+            f.write(",".join(str(row[k]) for k in self.FIELDS) + "\n")
+        print(f"epoch {row['epoch']}: data {row['data_s']}s ({row['data_pct']}%), compute {row['compute_s']}s")
+
+
+def make_trainer(stores, **overrides):
+    """DetectionTrainer whose datasets read from the given {split: ImageStore}; overrides["seed"] seeds augmentation."""
+    seed = overrides.setdefault("seed", SEED)
+    from ultralytics.models.yolo.detect import DetectionTrainer
+
+    epoch = mp.Value("i", 0)
+
+    class CachedDetectionTrainer(DetectionTrainer):
+        def build_dataset(self, img_path, mode="train", batch=None):
+            dataset = super().build_dataset(img_path, mode, batch)
+            store = stores.get("train" if mode == "train" else "val")
+            if store is not None:
+                dataset.__class__ = memmap_dataset_class(type(dataset))
+                dataset.attach_store(store, seed, epoch)
+            return dataset
+
+    trainer = CachedDetectionTrainer(overrides=overrides)
+    timer = EpochTimer()
+    for event in ("on_train_epoch_start", "on_train_batch_start", "on_train_batch_end", "on_train_epoch_end"):
+        trainer.add_callback(event, getattr(timer, event))
+    trainer.add_callback("on_train_epoch_start", lambda t: setattr(epoch, "value", t.epoch))
+    return trainer, timer
+
+
+# ------------------ CLI ------------------
+def prepare(data_yaml, imgsz=IMGSZ, workers=None):
+    return {split: ImageStore.get(files, imgsz, workers=workers)
+            for split in ("train", "val") if (files := list_images(data_yaml, split))}
+
+
+def bench(data_yaml, imgsz=IMGSZ, n=200):
+    files = list_images(data_yaml, "train")
+    store = ImageStore.get(files, imgsz)
+    picks = random.Random(SEED).choices(range(len(files)), k=n)
+    t0 = time.perf_counter()
+    for i in picks:
+        decode_resized(files[i], imgsz)
+    t1 = time.perf_counter()
+    for i in picks:
+        store.load(store.index[files[i]])
+    t2 = time.perf_counter()
+    decode_ms, cached_ms = (t1 - t0) / n * 1000, (t2 - t1) / n * 1000
+    print(f"JPEG decode+resize {decode_ms:.2f} ms/image, memmap {cached_ms:.3f} ms/image "
+          f"({decode_ms / cached_ms:.0f}x) over {n} reads")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cached CPU training for the YOLOv8 food detector.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("prepare", "train", "bench"):
+        p = sub.add_parser(name)
+        p.add_argument("--data", required=True, help="ultralytics data.yaml")
+        p.add_argument("--imgsz", type=int, default=IMGSZ)
+    p_train = sub.choices["train"]
+    p_train.add_argument("--model", default=MODEL)
+    p_train.add_argument("--epochs", type=int, default=EPOCHS)
+    p_train.add_argument("--batch", type=int, default=BATCH)
+    p_train.add_argument("--workers", type=int, default=WORKERS)
+    p_train.add_argument("--seed", type=int, default=SEED)
+    p_train.add_argument("--name", default=None, help="run name under runs/detect")
+    args = parser.parse_args(argv)
+
+    if args.command == "prepare":
+        prepare(args.data, args.imgsz)
+    elif args.command == "bench":
+        bench(args.data, args.imgsz)
+    else:
+        stores = prepare(args.data, args.imgsz)
+        overrides = {"model": args.model, "data": args.data, "imgsz": args.imgsz, "epochs": args.epochs,
+                     "batch": args.batch, "workers": args.workers, "device": "cpu", "seed": args.seed,
+                     "deterministic": True, "cache": False}
+        if args.name:
+            overrides["name"] = args.name
+        trainer, timer = make_trainer(stores, **overrides)
+        trainer.train()
+        data = sum(r["data_s"] for r in timer.rows)
+        compute = sum(r["compute_s"] for r in timer.rows)
+        print(f"Data loading {data:.0f}s vs compute {compute:.0f}s over {len(timer.rows)} epochs "
+              f"(timings in {os.path.join(str(trainer.save_dir), 'timings.csv')})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Per-patient history of questionnaire results (/analyze).
+
+SQLite store with one row per check-in plus aggregates that are updated in
+the same transaction as the insert, so reads never scan a patient's history:
+
+- daily: per patient and day, check-in count and per-category score sums.
+  7- and 30-day averages read at most 30 of these rows.
+- streaks: per patient and category, the current run of consecutive days at
+  the same red/yellow/green level, plus the longest run seen per level.
+
+    store = CheckinStore("AI/Data/checkins.db")
+    store.add("patient-1", scores, average, levels, overview_text)
+    store.history("patient-1", start, end)
+    store.aggregates("patient-1")
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+CHECKIN_STORE = os.getenv("CHECKIN_STORE", "AI/Data/checkins.db")
+CATEGORIES = ("med", "food", "sleep")
+WINDOWS = (7, 30)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkins (
+    id INTEGER PRIMARY KEY, patient_id TEXT NOT NULL, ts REAL NOT NULL, day TEXT NOT NULL,
+    med INTEGER, food INTEGER, sleep INTEGER, average REAL,
+    level_med TEXT, level_food TEXT, level_sleep TEXT, overview TEXT
+);
+CREATE INDEX IF NOT EXISTS checkins_patient_ts ON checkins (patient_id, ts);
+CREATE TABLE IF NOT EXISTS daily (
+    patient_id TEXT NOT NULL, day TEXT NOT NULL, n INTEGER NOT NULL,
+    med_sum REAL NOT NULL, food_sum REAL NOT NULL, sleep_sum REAL NOT NULL,
+    PRIMARY KEY (patient_id, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS streaks (
+    patient_id TEXT NOT NULL, category TEXT NOT NULL, level TEXT NOT NULL,
+    length INTEGER NOT NULL, start_day TEXT NOT NULL, last_day TEXT NOT NULL,
+    PRIMARY KEY (patient_id, category)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS best_streaks (
+    patient_id TEXT NOT NULL, category TEXT NOT NULL, level TEXT NOT NULL, length INTEGER NOT NULL,
+    PRIMARY KEY (patient_id, category, level)
+) WITHOUT ROWID;
+"""
+
+
+def day_of(ts):
+    """Local calendar day of a check-in, as YYYY-MM-DD."""
+    return datetime.fromtimestamp(ts).date().isoformat()
+
+
+class CheckinStore:
+    def __init__(self, path=CHECKIN_STORE):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.conn.close()
+
+    # ------------------ WRITES ------------------
+    def add(self, patient_id, scores, average, levels, overview="", ts=None):
+        """Store one /analyze result and update the daily sums and streaks."""
+        ts = time.time() if ts is None else ts
+        day = day_of(ts)
+        with self._lock:
+            c = self.conn
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                cur = c.execute(
+                    "INSERT INTO checkins (patient_id, ts, day, med, food, sleep, average, "
+                    "level_med, level_food, level_sleep, overview) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (patient_id, ts, day, *(scores[k] for k in CATEGORIES), average,
+                     *(levels[k] for k in CATEGORIES), overview))
+                c.execute(
+                    "INSERT INTO daily VALUES (?, ?, 1, ?, ?, ?) ON CONFLICT (patient_id, day) DO UPDATE SET "
+                    "n = n + 1, med_sum = med_sum + excluded.med_sum, food_sum = food_sum + excluded.food_sum, "
+                    "sleep_sum = sleep_sum + excluded.sleep_sum",
+                    (patient_id, day, *(scores[k] for k in CATEGORIES)))
+                for category in CATEGORIES:
+                    self._update_streak(patient_id, category, levels[category], day)
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
+        return cur.lastrowid
+
+    def _update_streak(self, patient_id, category, level, day):
+        row = self.conn.execute("SELECT level, length, start_day, last_day FROM streaks "
+                                "WHERE patient_id = ? AND category = ?", (patient_id, category)).fetchone()
+        today = date.fromisoformat(day)
+        if row is None:
+            length, start_day = 1, day
+        else:
+            cur_level, length, start_day, last_day = row
+            gap = (today - date.fromisoformat(last_day)).days
+            if cur_level == level and gap == 0:
+                # Another check-in on the same day at the same level
+                pass
+            elif cur_level == level and gap == 1:
+                length += 1
+            elif gap < 0:
+                # Back-dated check-in: counted in daily sums, streaks only move forward
+                return
+            else:
+                length, start_day = 1, day
+        self.conn.execute("INSERT OR REPLACE INTO streaks VALUES (?, ?, ?, ?, ?, ?)",
+                          (patient_id, category, level, length, start_day, day))
+        self.conn.execute("INSERT INTO best_streaks VALUES (?, ?, ?, ?) ON CONFLICT (patient_id, category, level) "
+                          "DO UPDATE SET length = MAX(length, excluded.length)",
+                          (patient_id, category, level, length))
+
+    # ------------------ READS ------------------
+    def history(self, patient_id, start=None, end=None, limit=500):
+        """Check-ins in [start, end) (epoch seconds), newest first."""
+        rows = self.conn.execute(
+            "SELECT id, ts, day, med, food, sleep, average, level_med, level_food, level_sleep, overview "
+            "FROM checkins WHERE patient_id = ? AND ts >= ? AND ts < ? ORDER BY ts DESC LIMIT ?",
+            (patient_id, start if start is not None else 0.0, end if end is not None else float("inf"), limit))
+        return [{
+            "id": r[0], "ts": r[1], "day": r[2],
+            "scores": dict(zip(CATEGORIES, r[3:6])),
+            "average": r[6],
+            "levels": dict(zip(CATEGORIES, r[7:10])),
+            "overview": r[10],
+        } for r in rows]
+
+    def aggregates(self, patient_id, today=None):
+        """Rolling 7/30-day averages, current streaks and longest streaks for one patient."""
+        today = date.fromisoformat(today) if today else date.today()
+        first = (today - timedelta(days=max(WINDOWS) - 1)).isoformat()
+        days = self.conn.execute("SELECT day, n, med_sum, food_sum, sleep_sum FROM daily "
+                                 "WHERE patient_id = ? AND day >= ? AND day <= ?",
+                                 (patient_id, first, today.isoformat())).fetchall()
+        out = {}
+        for window in WINDOWS:
+            since = (today - timedelta(days=window - 1)).isoformat()
+            rows = [r for r in days if r[0] >= since]
+            n = sum(r[1] for r in rows)
+            avg = {k: (round(sum(r[2 + i] for r in rows) / n, 2) if n else None) for i, k in enumerate(CATEGORIES)}
+            avg["overall"] = round(sum(avg.values()) / len(CATEGORIES), 2) if n else None
+            out[f"avg_{window}d"] = dict(avg, checkins=n, days=len(rows))
+
+        streaks = {}
+        for category, level, length, start_day, last_day in self.conn.execute(
+                "SELECT category, level, length, start_day, last_day FROM streaks WHERE patient_id = ?", (patient_id,)):
+            # A streak is only current if it reached yesterday or today
+            active = (today - date.fromisoformat(last_day)).days <= 1
+            streaks[category] = {"level": level, "length": length if active else 0,
+                                 "start_day": start_day, "last_day": last_day}
+        best = {}
+        for category, level, length in self.conn.execute(
+                "SELECT category, level, length FROM best_streaks WHERE patient_id = ?", (patient_id,)):
+            best.setdefault(category, {})[level] = length
+        out["streaks"] = streaks
+        out["best_streaks"] = best
+        return out
@@ -0,0 +1,219 @@
+"""Durable ECG alert log.
+
+The classifier appends one event per alert to a JSON-lines file; every event
+gets a monotonically increasing id that doubles as a cursor. Readers ask for
+"events after cursor N", so any number of dashboards and notifiers can follow
+the same log without stealing alerts from each other, and a class that flips
+back before the next poll is still recorded.
+
+    log = AlertLog("ecg_alerts.jsonl")
+    emitter = AlertEmitter(log, source="live")
+    emitter.observe(value)                     # per classified beat
+    events, cursor = log.read_since(cursor)    # per poll
+    log.ack("dashboard", cursor)               # remember where a subscriber is
+
+AlertEmitter debounces (a class must hold for `debounce_beats` beats) and
+dedupes (the same class from the same source is not re-alerted within
+`dedupe_seconds`).
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: single writer only
+    fcntl = None
+
+ALERT_LOG = os.getenv("ECG_ALERT_LOG", "ecg_alerts.jsonl")
+DEBOUNCE_BEATS = 1
+DEDUPE_SECONDS = 30.0
+MAX_READ = 500
+
+# Map numeric ECG classes to alert objects
+ECG_MESSAGES = {
+    1: {
+        "title": "Irregular Heartbeat Detected",
+        "message": "Your ECG shows signs of supraventricular ectopic beats. Monitor symptoms.",
+        "severity": "caution"
+    },
+    2: {
+        "title": "Abnormal Ventricular Activity",
+        "message": "Signs of Ventricular ectopic beats detected. Recommended to follow up clinically.",
+        "severity": "critical"
+    },
+    3: {
+        "title": "Fusion Beat Detected",
+        "message": "Signs of mixed ventricular activity observed. Monitoring advised.",
+        "severity": "caution"
+    },
+    4: {
+        "title": "ECG Signal Unclear",
+        "message": "Poor ECG signal quality. Re-adjust sensor placement.",
+        "severity": "caution"
+    }
+}
+
+
+def generate_ecg_alert(value):
+    """Return a standardized alert object or None."""
+    return ECG_MESSAGES.get(value, None)
+
+
+class AlertLog:
+    """
+    Append-only JSON-lines alert log with per-subscriber cursors.
+
+    Events are cached in memory and the file is tailed from the last byte
+    offset on each read, so read_since() costs one stat() plus whatever was
+    appended since the previous call. Appends take an exclusive file lock so
+    several processes (classifier, supervisor, server demo endpoint) can share
+    one log without colliding ids.
+    """
+
+    def __init__(self, path=ALERT_LOG, cursor_path=None):
+        self.path = str(path)
+        self.cursor_path = cursor_path or os.path.splitext(self.path)[0] + "_cursors.json"
+        self._lock = threading.Lock()
+        self._events = []
+        self._ids = []
+        self._offset = 0
+        self._inode = None
+        self._cursors = None
+
+    # ---------- tailing ----------
+    def _sync(self):
+        """Load events appended since the last call (caller holds self._lock)."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._events, self._ids, self._offset, self._inode = [], [], 0, None
+            return
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            # New or truncated file: start over
+            self._events, self._ids, self._offset, self._inode = [], [], 0, st.st_ino
+        if st.st_size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read(st.st_size - self._offset)
+        # Only consume complete lines; a half-written tail is picked up next time
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            self._events.append(event)
+            self._ids.append(event["id"])
+        self._offset += end
+
+    @property
+    def last_id(self):
+        with self._lock:
+            self._sync()
+            return self._ids[-1] if self._ids else 0
+
+    # ---------- writing ----------
+    def append(self, value, source="live", **fields):
+        """Append an alert for ECG class `value`; returns the stored event."""
+        alert = generate_ecg_alert(value)
+        if alert is None:
+            return None
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a+b") as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    self._sync()
+                    event = {"id": (self._ids[-1] if self._ids else 0) + 1, "ts": time.time(),
+                             "value": int(value), "source": source, **alert, **fields}
+                    f.write((json.dumps(event) + "\n").encode("utf-8"))
+                    f.flush()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+        return event
+
+    # ---------- reading ----------
+    def read_since(self, cursor=0, limit=MAX_READ):
+        """Events with id > cursor (oldest first) and the cursor to pass next time."""
+        with self._lock:
+            self._sync()
+            start = bisect.bisect_right(self._ids, cursor)
+            events = self._events[start:start + limit]
+        next_cursor = events[-1]["id"] if events else max(cursor, 0)
+        return events, next_cursor
+
+    # ---------- subscriber cursors ----------
+    def _load_cursors(self):
+        if self._cursors is None:
+            try:
+                with open(self.cursor_path, encoding="utf-8") as f:
+                    self._cursors = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._cursors = {}
+        return self._cursors
+
+    def cursor(self, subscriber):
+        with self._lock:
+            return int(self._load_cursors().get(subscriber, 0))
+
+    def ack(self, subscriber, cursor):
+        """Record that `subscriber` has handled everything up to `cursor`."""
+        with self._lock:
+            cursors = self._load_cursors()
+            # Cursors only move forward, so a late ack cannot replay alerts
+            cursors[subscriber] = max(int(cursor), int(cursors.get(subscriber, 0)))
+            tmp = self.cursor_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(cursors, f)
+            os.replace(tmp, self.cursor_path)
+            return cursors[subscriber]
+
+
+class AlertEmitter:
+    """
+    Turns a per-beat class stream into alert events.
+
+    A class becomes the current state once it has been seen for
+    `debounce_beats` consecutive beats; entering a non-normal state appends an
+    alert unless the same class was alerted within `dedupe_seconds`.
+    """
+
+    def __init__(self, log, source="live", debounce_beats=DEBOUNCE_BEATS, dedupe_seconds=DEDUPE_SECONDS):
+        self.log = log
+        self.source = source
+        self.debounce_beats = max(1, debounce_beats)
+        self.dedupe_seconds = dedupe_seconds
+        self.state = 0
+        self._candidate = None
+        self._run = 0
+        self._last_alerted = {}
+
+    def observe(self, value, now=None, **fields):
+        """Feed one classified beat; returns the appended event or None."""
+        if value is None:
+            return None
+        value = int(value)
+        if value == self._candidate:
+            self._run += 1
+        else:
+            self._candidate, self._run = value, 1
+        if self._run < self.debounce_beats or value == self.state:
+            return None
+
+        self.state = value
+        if value not in ECG_MESSAGES:
+            return None
+        now = time.time() if now is None else now
+        if now - self._last_alerted.get(value, float("-inf")) < self.dedupe_seconds:
+            return None
+        self._last_alerted[value] = now
+        return self.log.append(value, source=self.source, **fields)
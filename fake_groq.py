@@ -0,0 +1,85 @@
+"""Local stand-in for the Groq client used by server.py.
+
+Mirrors the three SDK calls the server makes (speech, transcription, chat
+completion) with configurable latency and failure rate, so the API can be
+load-tested without network access or an API key.
+
+Enable it for the server with:
+
+    GROQ_FAKE=1 GROQ_FAKE_LATENCY_MS=300 GROQ_FAKE_FAILURE_RATE=0.05 uvicorn server:app
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+# 0.1 s of silence as a tiny valid MP3 frame header + padding
+_FAKE_MP3 = b"\xff\xfb\x90\x64" + b"\x00" * 412
+
+
+class FakeGroqError(Exception):
+    """Raised for injected failures; carries an HTTP-like status code."""
+
+    def __init__(self, message, status_code=503):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FakeGroq:
+    """Drop-in for groq.Groq with `audio.speech`, `audio.transcriptions` and `chat.completions`."""
+
+    def __init__(self, latency_ms=200.0, jitter_ms=50.0, failure_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.failures = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.audio = SimpleNamespace(
+            speech=SimpleNamespace(create=self._speech),
+            transcriptions=SimpleNamespace(create=self._transcription),
+        )
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency_ms=float(os.getenv("GROQ_FAKE_LATENCY_MS", "200")),
+            jitter_ms=float(os.getenv("GROQ_FAKE_JITTER_MS", "50")),
+            failure_rate=float(os.getenv("GROQ_FAKE_FAILURE_RATE", "0")),
+            seed=int(os.environ["GROQ_FAKE_SEED"]) if os.getenv("GROQ_FAKE_SEED") else None,
+        )
+
+    def _simulate(self, name):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            fail = self._rng.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        # Blocking sleep on purpose: the real SDK client is synchronous too
+        time.sleep(delay)
+        if fail:
+            raise FakeGroqError(f"fake {name} failure")
+
+    def _speech(self, model, voice, input, **kwargs):
+        self._simulate("speech")
+        return SimpleNamespace(audio=_FAKE_MP3)
+
+    def _transcription(self, model, file, **kwargs):
+        self._simulate("transcription")
+        filename, data = file[0], file[1]
+        return SimpleNamespace(text=f"fake transcript of {filename} ({len(data)} bytes)")
+
+    def _chat(self, model, messages, **kwargs):
+        self._simulate("chat")
+        answers = json.loads(messages[-1]["content"]) if messages else {}
+        scores = {k: 1 + (len(" ".join(answers.get(k, []))) % 10) for k in ("med", "food", "sleep")}
+        content = json.dumps({"scores": scores, "overview": "Fake overview for load testing."})
+        message = SimpleNamespace(role="assistant", content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message)])
@@ -0,0 +1,221 @@
+"""Resilient call layer around the Groq SDK.
+
+- build_groq_client(): one Groq client on a pooled keep-alive httpx transport
+  (the SDK's own retries are disabled; retries happen here).
+- ResilientGroq.acall(): runs a blocking SDK call on a worker thread with a
+  per-call deadline, jittered exponential-backoff retries on retryable
+  errors, optional hedging (a second identical request if the first is
+  slower than the recent p90), and a circuit breaker that fails fast while
+  Groq is down.
+
+    groq_api = ResilientGroq(build_groq_client(api_key))
+    chat = await groq_api.acall("chat", lambda c, timeout: c.chat.completions.create(..., timeout=timeout),
+                                deadline=12.0, hedge=True)
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import random
+import threading
+import time
+
+import metrics
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_NAMES = {"APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout",
+                   "ConnectTimeout", "RemoteProtocolError", "ReadError"}
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+RETRIES = metrics.counter("groq_retries_total", "Groq call retries", ["call"])
+HEDGES = metrics.counter("groq_hedges_total", "Hedged (duplicate) Groq requests sent", ["call"])
+FAST_FAILS = metrics.counter("groq_circuit_rejections_total", "Groq calls rejected by the open circuit", ["call"])
+CIRCUIT_STATE = metrics.gauge("groq_circuit_state", "Groq circuit breaker state (0 closed, 1 half-open, 2 open)")
+
+
+class CircuitOpenError(Exception):
+    """Groq is considered down; the call was not attempted."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The per-call deadline ran out before Groq answered."""
+
+
+def build_groq_client(api_key, timeout=30.0, max_connections=32):
+    """Groq client sharing one keep-alive connection pool across all calls."""
+    import httpx
+    from groq import Groq
+
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=max_connections,
+                            max_keepalive_connections=max_connections,
+                            keepalive_expiry=60.0),
+        timeout=httpx.Timeout(timeout, connect=5.0),
+    )
+    return Groq(api_key=api_key, http_client=http_client, max_retries=0, timeout=timeout)
+
+
+def is_retryable(exc):
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    return type(exc).__name__ in RETRYABLE_NAMES
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive retryable failures.
+    Open -> half-open after `reset_timeout` seconds; one probe call decides
+    whether to close again or re-open.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(0)
+
+    def _set(self, state):
+        self.state = state
+        CIRCUIT_STATE.set(CIRCUIT_STATES[state])
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._set("half_open")
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            self._set("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set("open")
+
+    def release(self):
+        """Free the probe slot of a call that ended without an outcome (e.g. cancelled)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+class ResilientGroq:
+    def __init__(self, client, breaker=None, retries=2, base_backoff=0.2, max_backoff=2.0,
+                 min_hedge_delay=0.5, max_workers=32):
+        self.client = client
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.min_hedge_delay = min_hedge_delay
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="groq")
+        self._latencies = collections.defaultdict(lambda: collections.deque(maxlen=200))
+
+    def hedge_delay(self, name):
+        """Recent p90 latency of this call, so only the slow tail gets hedged."""
+        samples = sorted(self._latencies[name])
+        if len(samples) < 20:
+            return max(self.min_hedge_delay, 2.0)
+        return max(self.min_hedge_delay, samples[int(0.9 * (len(samples) - 1))])
+
+    def _submit(self, name, fn, timeout):
+        client = self.client
+
+        def run():
+            start = time.monotonic()
+            result = fn(client, timeout)
+            self._latencies[name].append(time.monotonic() - start)
+            return result
+
+        return asyncio.wrap_future(self._pool.submit(run))
+
+    async def _attempt(self, name, fn, remaining, hedge):
+        first = self._submit(name, fn, remaining)
+        pending = {first}
+        if hedge:
+            delay = self.hedge_delay(name)
+            if delay < remaining:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    HEDGES.inc(call=name)
+                    pending.add(self._submit(name, fn, remaining - delay))
+                    remaining -= delay
+
+        deadline = time.monotonic() + remaining
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for fut in done:
+                if fut.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return fut.result()
+                error = fut.exception()
+        for fut in pending:
+            fut.cancel()
+        if error is not None and not pending:
+            raise error
+        raise DeadlineExceeded(f"groq {name} exceeded its deadline")
+
+    async def acall(self, name, fn, deadline=15.0, hedge=False):
+        """
+        Run fn(client, timeout) with retries, deadline, optional hedging and
+        the circuit breaker. Raises CircuitOpenError, DeadlineExceeded or the
+        last SDK error.
+        """
+        end = time.monotonic() + deadline
+        attempt = 0
+        while True:
+            # Check the deadline first: a call that gives up here must not take the half-open probe
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"groq {name} exceeded its deadline")
+            if not self.breaker.allow():
+                FAST_FAILS.inc(call=name)
+                raise CircuitOpenError(f"groq circuit open, {name} not attempted")
+            try:
+                result = await self._attempt(name, fn, remaining, hedge)
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    # The service answered; a bad request says nothing about its health
+                    self.breaker.record_success()
+                if isinstance(e, DeadlineExceeded) or not retryable or attempt >= self.retries:
+                    raise
+                # Full jitter: sleep anywhere in [0, capped exponential backoff]
+                backoff = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+                if time.monotonic() + backoff >= end:
+                    raise
+                RETRIES.inc(call=name)
+                await asyncio.sleep(backoff)
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancellation is not an Exception; free the half-open probe slot or it stays taken for good
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return result
@@ -0,0 +1,265 @@
+"""Embedded time-series store for per-beat ECG/EEG predictions.
+
+SQLite file with:
+- beats_YYYYMM: one table per calendar month (UTC) holding every prediction
+  (timestamp, stream, source, class, heartbeat score, float32 probabilities).
+  Old months can be dropped or archived as a whole table.
+- rollups / rollup_counts: per minute, hour and day buckets with beat count,
+  summed heartbeat score and per-class counts. They are updated with UPSERTs
+  in the same transaction as the raw insert, so trend queries never scan
+  beats.
+
+    store = PredictionStore("AI/Data/predictions.db")
+    store.add("ecg", ts, pred_class, probabilities, score)
+    store.trend("ecg", start, end)          # auto-picks minute/hour/day buckets
+
+    python -m prediction_store import AI/Data/ecg_predictions.csv --stream ecg
+    python -m prediction_store trend --stream ecg --days 30
+"""
+
+import argparse
+import ast
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import numpy as np
+
+STORE_PATH = os.getenv("PREDICTION_STORE", "AI/Data/predictions.db")
+RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+MAX_POINTS = 500  # trend() picks the finest resolution with at most this many buckets
+BATCH_SIZE = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS partitions (name TEXT PRIMARY KEY, start REAL NOT NULL, end REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS rollups (
+    stream TEXT NOT NULL, source TEXT NOT NULL, res TEXT NOT NULL, bucket INTEGER NOT NULL,
+    n INTEGER NOT NULL, score_sum REAL NOT NULL,
+    PRIMARY KEY (stream, res, bucket, source)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_counts (
+    stream TEXT NOT NULL, source TEXT NOT NULL, res TEXT NOT NULL, bucket INTEGER NOT NULL,
+    cls INTEGER NOT NULL, n INTEGER NOT NULL,
+    PRIMARY KEY (stream, res, bucket, source, cls)
+) WITHOUT ROWID;
+"""
+
+
+def month_bounds(ts):
+    d = datetime.fromtimestamp(ts, tz=timezone.utc)
+    start = datetime(d.year, d.month, 1, tzinfo=timezone.utc)
+    end = datetime(d.year + (d.month == 12), d.month % 12 + 1, 1, tzinfo=timezone.utc)
+    return f"beats_{d.year:04d}{d.month:02d}", start.timestamp(), end.timestamp()
+
+
+class PredictionStore:
+    def __init__(self, path=STORE_PATH):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._partitions = {name: (start, end) for name, start, end in
+                            self.conn.execute("SELECT name, start, end FROM partitions")}
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    # ------------------ WRITES ------------------
+    def _partition(self, ts):
+        name, start, end = month_bounds(ts)
+        if name not in self._partitions:
+            self.conn.execute(f"""CREATE TABLE IF NOT EXISTS {name} (
+                ts REAL NOT NULL, stream TEXT NOT NULL, source TEXT NOT NULL,
+                predicted_class INTEGER NOT NULL, score REAL, probabilities BLOB)""")
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_ts ON {name} (stream, source, ts)")
+            self.conn.execute("INSERT OR IGNORE INTO partitions VALUES (?, ?, ?)", (name, start, end))
+            self._partitions[name] = (start, end)
+        return name
+
+    def add(self, stream, ts, predicted_class, probabilities=None, score=None, source="live"):
+        """Buffer one prediction; written every BATCH_SIZE beats or on flush()."""
+        with self._lock:
+            self._pending.append((stream, source, float(ts), int(predicted_class), probabilities, score))
+            if len(self._pending) >= BATCH_SIZE:
+                self._flush_locked()
+
+    def add_many(self, rows):
+        """rows: iterable of (stream, source, ts, predicted_class, probabilities, score)."""
+        with self._lock:
+            self._pending.extend(rows)
+            self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+
+        by_partition = defaultdict(list)
+        totals = defaultdict(lambda: [0, 0.0])
+        counts = defaultdict(int)
+        for stream, source, ts, cls, probs, score in rows:
+            blob = None if probs is None else np.asarray(probs, dtype=np.float32).tobytes()
+            by_partition[self._partition(ts)].append((ts, stream, source, cls, score, blob))
+            for res, width in RESOLUTIONS.items():
+                bucket = int(ts // width) * width
+                t = totals[(stream, source, res, bucket)]
+                t[0] += 1
+                t[1] += score or 0.0
+                counts[(stream, source, res, bucket, cls)] += 1
+
+        self.conn.execute("BEGIN")
+        try:
+            for name, part_rows in by_partition.items():
+                self.conn.executemany(f"INSERT INTO {name} VALUES (?, ?, ?, ?, ?, ?)", part_rows)
+            self.conn.executemany(
+                "INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (stream, res, bucket, source) DO UPDATE SET "
+                "n = n + excluded.n, score_sum = score_sum + excluded.score_sum",
+                [(*key, n, s) for key, (n, s) in totals.items()])
+            self.conn.executemany(
+                "INSERT INTO rollup_counts VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (stream, res, bucket, source, cls) DO UPDATE SET n = n + excluded.n",
+                [(*key, n) for key, n in counts.items()])
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    # ------------------ READS ------------------
+    def beats(self, stream, start, end, source=None, limit=100000):
+        """Raw predictions in [start, end), oldest first, across month partitions."""
+        self.flush()
+        out = []
+        # Another process may have opened a new month since we last looked
+        partitions = self.conn.execute("SELECT name, start, end FROM partitions ORDER BY start").fetchall()
+        for name, p_start, p_end in partitions:
+            if p_end <= start or p_start >= end:
+                continue
+            sql = f"SELECT ts, source, predicted_class, score, probabilities FROM {name} " \
+                  f"WHERE stream = ? AND ts >= ? AND ts < ?"
+            params = [stream, start, end]
+            if source is not None:
+                sql += " AND source = ?"
+                params.append(source)
+            for ts, src, cls, score, blob in self.conn.execute(sql + " ORDER BY ts LIMIT ?", params + [limit - len(out)]):
+                out.append({"ts": ts, "source": src, "predicted_class": cls, "score": score,
+                            "probabilities": None if blob is None else np.frombuffer(blob, dtype=np.float32).tolist()})
+            if len(out) >= limit:
+                break
+        return out
+
+    def pick_resolution(self, start, end, max_points=MAX_POINTS):
+        for res, width in RESOLUTIONS.items():
+            if (end - start) / width <= max_points:
+                return res
+        return "day"
+
+    def trend(self, stream, start, end, resolution="auto", source=None):
+        """
+        Rollup buckets in [start, end): [{"bucket", "n", "mean_score", "counts": {cls: n}}].
+        Buckets without beats are omitted.
+        """
+        self.flush()
+        if resolution == "auto":
+            resolution = self.pick_resolution(start, end)
+        width = RESOLUTIONS[resolution]
+        lo, hi = int(start // width) * width, end
+        where = "stream = ? AND res = ? AND bucket >= ? AND bucket < ?"
+        params = [stream, resolution, lo, hi]
+        if source is not None:
+            where += " AND source = ?"
+            params.append(source)
+
+        # One read transaction: both SELECTs see the same snapshot, even while another process commits beats
+        # (the lock keeps this connection's own flushes out of it)
+        with self._lock:
+            self.conn.execute("BEGIN")
+            try:
+                totals = self.conn.execute(
+                    f"SELECT bucket, SUM(n), SUM(score_sum) FROM rollups WHERE {where} GROUP BY bucket ORDER BY bucket",
+                    params).fetchall()
+                counts = self.conn.execute(
+                    f"SELECT bucket, cls, SUM(n) FROM rollup_counts WHERE {where} GROUP BY bucket, cls", params).fetchall()
+            finally:
+                self.conn.execute("COMMIT")
+        points = {}
+        for bucket, n, score_sum in totals:
+            points[bucket] = {"bucket": bucket, "n": n, "mean_score": score_sum / n if n else None, "counts": {}}
+        for bucket, cls, n in counts:
+            points[bucket]["counts"][cls] = n
+        return {"resolution": resolution, "points": list(points.values())}
+
+
+# ------------------ CSV IMPORT ------------------
+def iter_prediction_csv(path, stream, source="import", score_fn=None):
+    """Yield store rows from an ecg_predictions.csv / eeg_predictions.csv file."""
+    import pandas as pd
+
+    for chunk in pd.read_csv(path, chunksize=10000):
+        # The writers log naive local time (pd.Timestamp.now())
+        ts = [t.to_pydatetime().timestamp() for t in pd.to_datetime(chunk["timestamp"])]
+        for t, cls, probs in zip(ts, chunk["predicted_class"], chunk["class_probabilities"]):
+            try:
+                p = [float(v) for v in ast.literal_eval(probs).values()]
+            except (ValueError, SyntaxError, AttributeError):
+                p = None
+            score = score_fn(int(cls), p) if (score_fn and p) else None
+            yield stream, source, float(t), int(cls), p, score
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prediction time-series store.")
+    parser.add_argument("--db", default=STORE_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_imp = sub.add_parser("import", help="load a predictions CSV into the store")
+    p_imp.add_argument("csv")
+    p_imp.add_argument("--stream", default="ecg")
+    p_imp.add_argument("--source", default="import")
+    p_tr = sub.add_parser("trend", help="print rollups for a time range")
+    p_tr.add_argument("--stream", default="ecg")
+    p_tr.add_argument("--days", type=float, default=7.0)
+    p_tr.add_argument("--resolution", choices=["auto", *RESOLUTIONS], default="auto")
+    args = parser.parse_args(argv)
+
+    store = PredictionStore(args.db)
+    if args.command == "import":
+        score_fn = None
+        if args.stream == "ecg":
+            from AI.ECG.processing.ecg_processing import calculate_heartbeat_score
+            # Prediction CSVs carry no ground-truth label
+            score_fn = lambda cls, p: float(calculate_heartbeat_score(cls, p, None))
+        start = time.perf_counter()
+        n = 0
+        batch = []
+        for row in iter_prediction_csv(args.csv, args.stream, args.source, score_fn):
+            batch.append(row)
+            if len(batch) >= 10000:
+                store.add_many(batch)
+                n += len(batch)
+                batch = []
+        store.add_many(batch)
+        n += len(batch)
+        print(f"Imported {n} rows into {args.db} in {time.perf_counter() - start:.1f}s")
+    else:
+        end = time.time()
+        start = time.perf_counter()
+        result = store.trend(args.stream, end - args.days * 86400, end, args.resolution)
+        print(json.dumps(result, indent=2))
+        print(f"{len(result['points'])} {result['resolution']} buckets in {(time.perf_counter() - start) * 1000:.1f} ms")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
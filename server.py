@@ -3,19 +3,29 @@
 Uses Groq Whisper for transcription and Groq Llama3 for analysis.
 """
 
+import asyncio
 import base64
 import json
+import logging
 import os
 import re
-from typing import Dict, List, Tuple
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from groq import Groq
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 
+import metrics
+import tracing
+from ecg_alerts import ALERT_LOG, AlertLog, generate_ecg_alert
+from groq_client import CircuitBreaker, ResilientGroq, build_groq_client
+
 
 print("[server] Server.py loaded ✅")
 # ---------------------------
@@ -23,13 +33,46 @@ print("[server] Server.py loaded ✅")
 # ---------------------------
 load_dotenv()
 
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+log = logging.getLogger("insulink.server")
+
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-if not GROQ_API_KEY:
-    print("[server] WARNING: GROQ_API_KEY is missing. /analyze and /transcribe will fail.")
-else:
-    print("[server] GROQ_API_KEY loaded ✅")
+GROQ_FAKE = os.getenv("GROQ_FAKE", "") == "1"
+
+
+def create_groq_client():
+    """Real Groq client, or the local stand-in when GROQ_FAKE=1 (load tests, offline dev)."""
+    if GROQ_FAKE:
+        from fake_groq import FakeGroq
+        print("[server] Using fake Groq client (GROQ_FAKE=1)")
+        return FakeGroq.from_env()
+    if not GROQ_API_KEY:
+        print("[server] WARNING: GROQ_API_KEY is missing. /analyze and /transcribe will fail.")
+    else:
+        print("[server] GROQ_API_KEY loaded ✅")
+    return build_groq_client(GROQ_API_KEY)
+
 
-client = Groq(api_key=GROQ_API_KEY)
+def set_client(new_client):
+    """Swap the Groq client used by the routes (e.g. a FakeGroq in benchmarks)."""
+    global client
+    client = new_client
+    groq_api.client = new_client
+
+
+client = create_groq_client()
+
+# Retries, deadlines, hedging and circuit breaking around every Groq call
+groq_api = ResilientGroq(
+    client,
+    CircuitBreaker(failure_threshold=int(os.getenv("GROQ_BREAKER_FAILURES", "5")),
+                   reset_timeout=float(os.getenv("GROQ_BREAKER_RESET_S", "30"))),
+    retries=int(os.getenv("GROQ_RETRIES", "2")),
+)
+
+# Per-call deadlines in seconds, retries included
+GROQ_DEADLINES = {"speech": 10.0, "transcription": 20.0, "chat": 12.0}
 
 
 # ---------------------------
@@ -46,9 +89,80 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[tracing.SESSION_HEADER],
 )
 
 
+# ---------------------------
+# Metrics
+# ---------------------------
+HTTP_REQUESTS = metrics.counter("http_requests_total", "HTTP requests", ["route", "method", "status"])
+HTTP_LATENCY = metrics.histogram("http_request_duration_seconds", "HTTP request latency", ["route", "method"])
+HTTP_IN_PROGRESS = metrics.gauge("http_requests_in_progress", "HTTP requests currently being handled")
+GROQ_LATENCY = metrics.histogram("groq_request_duration_seconds", "Groq API call latency", ["call"])
+GROQ_ERRORS = metrics.counter("groq_errors_total", "Failed Groq API calls", ["call"])
+ECG_STATUS_READ = metrics.histogram("ecg_status_read_seconds", "ECG status file read latency")
+ECG_STATUS_VALUE = metrics.gauge("ecg_status_value", "Last ECG class served by /ecg/status")
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    HTTP_IN_PROGRESS.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_PROGRESS.dec()
+        # Use the route template so path parameters don't explode label cardinality
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_LATENCY.observe(time.perf_counter() - start, route=route, method=request.method)
+        HTTP_REQUESTS.inc(route=route, method=request.method, status=status)
+
+
+# ---------------------------
+# Tracing
+# ---------------------------
+# Polled endpoints that are not part of a check-in
+UNTRACED_PATHS = {"/metrics", "/ecg/status", "/ecg/alerts"}
+
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    if request.url.path in UNTRACED_PATHS:
+        return await call_next(request)
+    session_id = (request.headers.get(tracing.SESSION_HEADER)
+                  or request.query_params.get("session_id")
+                  or tracing.new_session_id())
+    with tracing.session(session_id), tracing.span("http", method=request.method) as root:
+        response = await call_next(request)
+        root.name = f"{request.method} {getattr(request.scope.get('route'), 'path', request.url.path)}"
+        root.attrs["status"] = response.status_code
+    response.headers[tracing.SESSION_HEADER] = session_id
+    return response
+
+
+@contextmanager
+def groq_call(call: str):
+    """Time and trace one Groq call, counting it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        with tracing.span(f"groq.{call}"):
+            yield
+    except Exception:
+        GROQ_ERRORS.inc(call=call)
+        raise
+    finally:
+        GROQ_LATENCY.observe(time.perf_counter() - start, call=call)
+
+
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/")
 def root():
     return {"ok": True}
@@ -76,6 +190,7 @@ QUESTIONS: Dict[str, List[str]] = {
 
 class AnalyzeRequest(BaseModel):
     answers: Dict[str, List[str]]  # { "med": [...3], "food": [...3], "sleep": [...3] }
+    patient_id: Optional[str] = None  # when set, the result is kept in the check-in history
 
 class AnalyzeResponse(BaseModel):
     scores: dict[str, int]
@@ -128,36 +243,51 @@ async def tts(text: str = Form(...)):
     """
 
     try:
-        tts_response = client.audio.speech.create(
-            model="gpt-4o-mini-tts",
-            voice="alloy",        # available voices: alloy, verse, shimmer
-            input=text
-        )
+        with groq_call("speech"):
+            tts_response = await groq_api.acall(
+                "speech",
+                lambda c, timeout: c.audio.speech.create(
+                    model="gpt-4o-mini-tts",
+                    voice="alloy",        # available voices: alloy, verse, shimmer
+                    input=text,
+                    timeout=timeout,
+                ),
+                deadline=GROQ_DEADLINES["speech"],
+            )
 
         audio_bytes = tts_response.audio  # raw bytes
-        b64_audio = base64.b64encode(audio_bytes).decode("utf-8")
+        with tracing.span("base64.encode", bytes=len(audio_bytes)):
+            b64_audio = base64.b64encode(audio_bytes).decode("utf-8")
 
         return {"audioUrl": f"data:audio/mp3;base64,{b64_audio}"}
 
     except Exception as e:
-        print("[TTS ERROR]", e)
+        log.warning("[TTS ERROR] %r", e)
         # Return silence fallback
         return {"audioUrl": ""}
 
 @app.post("/transcribe")
 async def transcribe(file: UploadFile = File(...)):
-    data = await file.read()
+    with tracing.span("upload.read") as read_span:
+        data = await file.read()
+        read_span.attrs["bytes"] = len(data)
     filename = file.filename or "audio.webm"
     content_type = file.content_type or "audio/webm"
 
     try:
-        tr = client.audio.transcriptions.create(
-            model="whisper-large-v3",
-            file=(filename, data, content_type),
-        )
+        with groq_call("transcription"):
+            tr = await groq_api.acall(
+                "transcription",
+                lambda c, timeout: c.audio.transcriptions.create(
+                    model="whisper-large-v3",
+                    file=(filename, data, content_type),
+                    timeout=timeout,
+                ),
+                deadline=GROQ_DEADLINES["transcription"],
+            )
         return {"text": tr.text}
     except Exception as e:
-        print("[/transcribe] ERROR:", repr(e))
+        log.warning("[/transcribe] ERROR: %r", e)
         return {"text": ""}
 
 @app.post("/analyze", response_model=AnalyzeResponse)
@@ -197,31 +327,37 @@ async def analyze(req: AnalyzeRequest):
     }
 
     try:
-        chat = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            temperature=0,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": json.dumps(user)},
-            ],
-        )
+        # temperature=0 makes the call idempotent, so the slow tail is hedged
+        with groq_call("chat"):
+            chat = await groq_api.acall(
+                "chat",
+                lambda c, timeout: c.chat.completions.create(
+                    model="llama-3.1-8b-instant",
+                    temperature=0,
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": json.dumps(user)},
+                    ],
+                    timeout=timeout,
+                ),
+                deadline=GROQ_DEADLINES["chat"],
+                hedge=True,
+            )
         raw = chat.choices[0].message.content.strip()
     except Exception as e:
-        print("[/analyze] ERROR calling Groq:", repr(e))
+        log.warning("[/analyze] ERROR calling Groq: %r", e)
         raw = ""
 
-    print("----- RAW MODEL OUTPUT -----")
-    print(raw)
-    print("----- USER ANSWERS SENT INTO MODEL -----")
-    print(user)
-    print("-----------------------------")
+    log.debug("[/analyze] raw model output: %s", raw)
+    log.debug("[/analyze] user answers sent into model: %s", user)
 
     # Parse robustly
-    try:
-        m = re.search(r"\{.*\}", raw, re.S)
-        payload = json.loads(m.group(0)) if m else {}
-    except Exception:
-        payload = {"scores": {"med": 5, "food": 5, "sleep": 5}}
+    with tracing.span("json.extract", chars=len(raw)):
+        try:
+            m = re.search(r"\{.*\}", raw, re.S)
+            payload = json.loads(m.group(0)) if m else {}
+        except Exception:
+            payload = {"scores": {"med": 5, "food": 5, "sleep": 5}}
 
     scores = payload.get("scores", {"med": 5, "food": 5, "sleep": 5})
     med_s, food_s, sleep_s = (
@@ -241,15 +377,30 @@ async def analyze(req: AnalyzeRequest):
         "sleep": overview_text,
     }
 
+    # Scores below 1 count as red, like scores 1-3
+    with tracing.span("bucket_and_suggest"):
+        levels = {
+            "med": bucket_and_suggest(max(1, med_s), "med")[0],
+            "food": bucket_and_suggest(max(1, food_s), "food")[0],
+            "sleep": bucket_and_suggest(max(1, sleep_s), "sleep")[0],
+        }
+
+    scores = {"med": med_s, "food": food_s, "sleep": sleep_s}
+    if req.patient_id:
+        try:
+            with tracing.span("checkin_store.add"):
+                await asyncio.to_thread(get_checkin_store().add, req.patient_id, scores, avg, levels, overview_text)
+        except Exception as e:
+            log.warning("[/analyze] could not store check-in for %s: %r", req.patient_id, e)
+
     return {
-        "scores": {"med": med_s, "food": food_s, "sleep": sleep_s},
+        "scores": scores,
         "average": avg,
-        "levels": {"med": "yellow" if 4 <= med_s <= 6 else ("red" if med_s <= 3 else "green"),
-                "food": "yellow" if 4 <= food_s <= 6 else ("red" if food_s <= 3 else "green"),
-                "sleep": "yellow" if 4 <= sleep_s <= 6 else ("red" if sleep_s <= 3 else "green")},
+        "levels": levels,
         "overview": overview,
     }
 
+
 # ============================================================
 # ECG LIVE STATUS POLLING & ALERTING
 # ============================================================
@@ -265,36 +416,118 @@ ecg_row_counter = ECG_ROW_START
 _ecg_missing_warned = False
 forced_ecg_hold_value = None
 forced_ecg_hold_rows_remaining = 0
+# Per-poll row logs are sampled: one INFO line every N rows, all rows at DEBUG
+ECG_LOG_EVERY = max(1, int(os.getenv("ECG_LOG_EVERY", "100") or 100))
+# (path, mtime_ns, size) -> value of the last status file read; the classifier
+# replaces the file atomically, so an unchanged stat means unchanged content
+_ecg_status_cache = (None, None)
+
+
+def read_status_file(path):
+    """Status value from the classifier's "<value> <seq> <timestamp>" file (older files hold just the value)."""
+    global _ecg_status_cache
+    st = path.stat()
+    key = (path, st.st_mtime_ns, st.st_size)
+    if _ecg_status_cache[0] == key:
+        return _ecg_status_cache[1]
+    with ECG_STATUS_READ.time():
+        raw = path.read_text(encoding="utf-8")
+    parts = raw.split()
+    value = int(parts[0]) if parts else 0
+    _ecg_status_cache = (key, value)
+    return value
+
+
+# Durable alert log written by the ECG classifier (see ecg_alerts.py)
+ECG_ALERTS = AlertLog(_BASE_DIR / ALERT_LOG)
+
+# Shared-memory prediction ring published by ecg_processing.py --ring (see shm_ring.py)
+ECG_RING = os.getenv("ECG_RING", "")
+ECG_RING_STALE = float(os.getenv("ECG_RING_STALE", "5") or 5)  # seconds without a beat before falling back to the file
+_ecg_ring = None
+_ecg_ring_retry_at = 0.0
+_ecg_ring_lock = threading.Lock()
+_ecg_ring_users = {}      # id(ring) -> /ecg/beats polls still reading it
+_ecg_ring_retired = {}    # id(ring) -> replaced ring, closed once its last poll returns
+
+
+def _ring_inode(ring):
+    try:
+        return os.fstat(ring.shm._fd).st_ino
+    except (AttributeError, OSError):
+        return None
 
 
-# Map numeric ECG classes to alert objects
-ECG_MESSAGES = {
-    1: {
-        "title": "Irregular Heartbeat Detected",
-        "message": "Your ECG shows signs of supraventricular ectopic beats. Monitor symptoms.",
-        "severity": "caution"
-    },
-    2: {
-        "title": "Abnormal Ventricular Activity",
-        "message": "Signs of Ventricular ectopic beats detected. Recommended to follow up clinically.",
-        "severity": "critical"
-    },
-    3: {
-        "title": "Fusion Beat Detected",
-        "message": "Signs of mixed ventricular activity observed. Monitoring advised.",
-        "severity": "caution"
-    },
-    4: {
-        "title": "ECG Signal Unclear",
-        "message": "Poor ECG signal quality. Re-adjust sensor placement.",
-        "severity": "caution"
-    }
-}
+def _retire_ring(ring):
+    # Caller holds _ecg_ring_lock; a ring still used by a long-poll is closed when that poll ends
+    if _ecg_ring_users.get(id(ring)):
+        _ecg_ring_retired[id(ring)] = ring
+    else:
+        ring.close()
 
 
-def generate_ecg_alert(value: int):
-    """Return a standardized alert object or None."""
-    return ECG_MESSAGES.get(value, None)
+def get_ecg_ring():
+    """
+    The attached ring, or None (not configured / classifier not running yet).
+    Attaching is retried every 2 s, and so is checking an idle ring for a new
+    segment from a restarted classifier; the old attachment stays usable until then.
+    """
+    global _ecg_ring, _ecg_ring_retry_at
+    if not ECG_RING:
+        return None
+    with _ecg_ring_lock:
+        ring = _ecg_ring
+        if time.monotonic() < _ecg_ring_retry_at:
+            return ring
+        if ring is not None:
+            rec = ring.latest()
+            if rec is not None and time.time() - float(rec["ts"]) <= ECG_RING_STALE:
+                return ring
+        _ecg_ring_retry_at = time.monotonic() + 2.0
+        try:
+            from shm_ring import ShmRing
+            fresh = ShmRing.attach(ECG_RING)
+        except (FileNotFoundError, ValueError):
+            return ring
+        if ring is not None and _ring_inode(fresh) is not None and _ring_inode(fresh) == _ring_inode(ring):
+            fresh.close()  # same segment, just idle
+            return ring
+        if ring is not None:
+            _retire_ring(ring)
+        _ecg_ring = fresh
+        return fresh
+
+
+@contextmanager
+def using_ecg_ring():
+    """get_ecg_ring() for a long-poll: the ring is not closed under it if a restart replaces it."""
+    ring = get_ecg_ring()
+    if ring is None:
+        yield None
+        return
+    with _ecg_ring_lock:
+        _ecg_ring_users[id(ring)] = _ecg_ring_users.get(id(ring), 0) + 1
+    try:
+        yield ring
+    finally:
+        with _ecg_ring_lock:
+            _ecg_ring_users[id(ring)] -= 1
+            if not _ecg_ring_users[id(ring)]:
+                del _ecg_ring_users[id(ring)]
+                retired = _ecg_ring_retired.pop(id(ring), None)
+                if retired is not None:
+                    retired.close()
+
+
+def read_ring_status():
+    """Latest beat's class from the ring, or None when the ring is missing or stale."""
+    ring = get_ecg_ring()
+    if ring is None:
+        return None
+    rec = ring.latest()
+    if rec is None or time.time() - float(rec["ts"]) > ECG_RING_STALE:
+        return None
+    return int(rec["true_class"]) if rec["true_class"] >= 0 else int(rec["pred_class"])
 
 
 @app.get("/ecg/status")
@@ -304,6 +537,7 @@ def get_ecg_status():
 
     # New robust reader: resolve path, treat empty as 0, and log rows
     value = 0
+    ring_value = read_ring_status()
 
     # Resolve which file to read (env override, processing dir, default)
     env_path = os.getenv("ECG_STATUS_PATH")
@@ -323,20 +557,21 @@ def get_ecg_status():
             chosen_path = p
             break
 
-    if chosen_path and chosen_path.exists():
+    if ring_value is not None:
+        value = ring_value
+    elif chosen_path and chosen_path.exists():
         # Reset missing warning latch once the file appears
         if _ecg_missing_warned:
             _ecg_missing_warned = False
         try:
-            raw = chosen_path.read_text(encoding="utf-8").strip()
-            value = int(raw) if raw != "" else 0
+            value = read_status_file(chosen_path)
         except Exception:
             value = 0
     else:
         # Only warn once per missing state to avoid spam
         if not _ecg_missing_warned:
             missing_at = candidates[0] if candidates else ECG_STATUS_FILE
-            print(f"[ECG] FILE_MISSING at {missing_at}")
+            log.warning("[ECG] FILE_MISSING at %s", missing_at)
             _ecg_missing_warned = True
         value = 0
 
@@ -347,9 +582,13 @@ def get_ecg_status():
         if forced_ecg_hold_rows_remaining <= 0:
             forced_ecg_hold_value = None
 
-    # Log row with current value
-    print(f"[ECG] Row {ecg_row_counter}: value={value}")
+    # Log row with current value (sampled, see ECG_LOG_EVERY)
+    if ecg_row_counter % ECG_LOG_EVERY == 0:
+        log.info("[ECG] Row %d: value=%d", ecg_row_counter, value)
+    elif log.isEnabledFor(logging.DEBUG):
+        log.debug("[ECG] Row %d: value=%d", ecg_row_counter, value)
     ecg_row_counter += 1
+    ECG_STATUS_VALUE.set(value)
 
     # Detect state change and produce alert only for non-zero values
     new_alert = None
@@ -363,12 +602,36 @@ def get_ecg_status():
     return {"value": value, "new_alert": new_alert}
 
 
+@app.get("/ecg/beats")
+async def get_ecg_beats(cursor: Optional[int] = None, timeout: float = 10.0, limit: int = 256):
+    """
+    Long-poll classified beats from the shared-memory ring. Returns beats with
+    sequence >= cursor (waiting up to `timeout` seconds for new ones) and the
+    next cursor; `lost` counts beats overwritten before this poll reached them.
+    """
+    with using_ecg_ring() as ring:
+        if ring is None:
+            return {"error": "ECG ring not available (set ECG_RING and run ecg_processing.py --ring)"}
+        # A cursor past the head belongs to a previous classifier run: start over from what this ring holds
+        reset = cursor is not None and cursor > ring.head
+        reader = ring.reader("oldest" if reset else "latest" if cursor is None else cursor)
+        await asyncio.to_thread(reader.wait, max(0.0, min(timeout, 30.0)))
+        recs = reader.poll(max(1, min(limit, 1024)))
+        beats = [{"ts": float(r["ts"]), "row": int(r["row"]), "pred_class": int(r["pred_class"]),
+                  "true_class": None if r["true_class"] < 0 else int(r["true_class"]),
+                  "score": round(float(r["score"]), 3),
+                  "probabilities": [round(float(p), 4) for p in r["probs"]]} for r in recs]
+        return {"beats": beats, "cursor": reader.cursor, "lost": reader.lost, "reset": reset}
+
+
 @app.post("/ecg/demo/force")
 def ecg_demo_force(value: int = 1, rows: int = 100):
     """Demo helper: force /ecg/status to return `value` for `rows` polls (rows default=100)."""
     global forced_ecg_hold_value, forced_ecg_hold_rows_remaining
     forced_ecg_hold_value = int(value)
     forced_ecg_hold_rows_remaining = max(1, int(rows))
+    # Also log it, so /ecg/alerts subscribers see the demo alert
+    ECG_ALERTS.append(forced_ecg_hold_value, source="demo")
     return {"ok": True, "forced": forced_ecg_hold_value, "rows": forced_ecg_hold_rows_remaining}
 
     # Debug to confirm it's running
@@ -413,3 +676,227 @@ def ecg_demo_force(value: int = 1, rows: int = 100):
         "new_alert": new_alert
     }
 
+
+@app.get("/ecg/alerts")
+def get_ecg_alerts(cursor: Optional[int] = None, subscriber: Optional[str] = None, limit: int = 100):
+    """
+    Alerts logged after `cursor`. Without a cursor, a named subscriber resumes
+    from its last acked cursor; cursor=-1 skips history and returns only the
+    current cursor. Pass the returned cursor on the next poll.
+    """
+    if cursor is not None and cursor < 0:
+        return {"alerts": [], "cursor": ECG_ALERTS.last_id}
+    if cursor is None:
+        cursor = ECG_ALERTS.cursor(subscriber) if subscriber else 0
+    events, next_cursor = ECG_ALERTS.read_since(cursor, limit=max(1, min(limit, 500)))
+    return {"alerts": events, "cursor": next_cursor}
+
+
+@app.post("/ecg/alerts/ack")
+def ack_ecg_alerts(subscriber: str, cursor: int):
+    """Remember that `subscriber` has handled every alert up to `cursor`."""
+    return {"subscriber": subscriber, "cursor": ECG_ALERTS.ack(subscriber, cursor)}
+
+
+HEART_METRICS_PATH = _BASE_DIR / os.getenv("HEART_METRICS_PATH", "AI/Data/heart_metrics.json")
+_heart_metrics_cache = (None, None)
+
+
+@app.get("/ecg/metrics")
+def get_heart_metrics(patient: Optional[str] = None):
+    """
+    Rolling heart metrics from the classifier (see AI/ECG/processing/heart_metrics.py):
+    abnormal burden, score distribution and ectopic runs over 1, 5 and 60 minute windows.
+    """
+    global _heart_metrics_cache
+    try:
+        st = HEART_METRICS_PATH.stat()
+    except FileNotFoundError:
+        return {"error": "no heart metrics yet (is ecg_processing.py running?)"}
+    key = (st.st_mtime_ns, st.st_size)
+    if _heart_metrics_cache[0] != key:
+        _heart_metrics_cache = (key, json.loads(HEART_METRICS_PATH.read_text(encoding="utf-8")))
+    data = _heart_metrics_cache[1]
+    if patient is None:
+        return data
+    metrics_for = data["patients"].get(patient)
+    if metrics_for is None:
+        return {"error": f"no heart metrics for patient {patient!r}"}
+    return {"updated": data["updated"], "patient": patient, **metrics_for}
+
+
+# ============================================================
+# PREDICTION TRENDS
+# ============================================================
+
+PREDICTION_STORE_PATH = _BASE_DIR / os.getenv("PREDICTION_STORE", "AI/Data/predictions.db")
+_prediction_store = None
+_prediction_store_lock = threading.Lock()
+
+
+def get_prediction_store():
+    # Opened on first use so importing the server stays light (numpy, sqlite).
+    # Getters run in worker threads (sync routes, asyncio.to_thread): the lock keeps it to one instance.
+    global _prediction_store
+    if _prediction_store is None:
+        with _prediction_store_lock:
+            if _prediction_store is None:
+                from prediction_store import PredictionStore
+                _prediction_store = PredictionStore(PREDICTION_STORE_PATH)
+    return _prediction_store
+
+
+@app.get("/trends")
+def get_trends(stream: str = "ecg", days: float = 7.0, start: Optional[float] = None, end: Optional[float] = None,
+               resolution: str = Query("auto", regex="^(auto|minute|hour|day)$"), source: Optional[str] = None):
+    """
+    Per-bucket beat counts, class counts and mean heartbeat score from the
+    prediction store rollups. Range is [start, end) in epoch seconds, or the
+    last `days` days; resolution is minute, hour, day or auto.
+    """
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - days * 86400
+    return get_prediction_store().trend(stream, start, end, resolution, source)
+
+
+# ============================================================
+# CHECK-IN HISTORY
+# ============================================================
+
+CHECKIN_STORE_PATH = _BASE_DIR / os.getenv("CHECKIN_STORE", "AI/Data/checkins.db")
+_checkin_store = None
+_checkin_store_lock = threading.Lock()
+
+
+def get_checkin_store():
+    global _checkin_store
+    if _checkin_store is None:
+        with _checkin_store_lock:
+            if _checkin_store is None:
+                from checkin_store import CheckinStore
+                _checkin_store = CheckinStore(CHECKIN_STORE_PATH)
+    return _checkin_store
+
+
+@app.get("/history/{patient_id}")
+def get_history(patient_id: str, start: Optional[float] = None, end: Optional[float] = None, limit: int = 100):
+    """Stored /analyze results for a patient in [start, end) (epoch seconds), newest first."""
+    return {"patient_id": patient_id,
+            "checkins": get_checkin_store().history(patient_id, start, end, max(1, min(limit, 1000)))}
+
+
+@app.get("/history/{patient_id}/aggregates")
+def get_history_aggregates(patient_id: str):
+    """7- and 30-day category averages plus current and longest red/yellow/green streaks."""
+    return dict(get_checkin_store().aggregates(patient_id), patient_id=patient_id)
+
+
+# ============================================================
+# MEAL PHOTOS
+# ============================================================
+
+_meal_analyzer = None
+_meal_analyzer_lock = threading.Lock()
+
+
+def get_meal_analyzer():
+    # The detector is loaded on the first meal request, not at import; concurrent first requests wait for one load
+    global _meal_analyzer
+    if _meal_analyzer is None:
+        with _meal_analyzer_lock:
+            if _meal_analyzer is None:
+                from camera_stuff.detector import load_detector
+                from camera_stuff.meals import MealAnalyzer
+                from camera_stuff.nutrition import NUTRITION_CSV, NutritionIndex
+
+                extra = [p for p in os.getenv("NUTRITION_CSV", "").split(os.pathsep) if p]
+                nutrition = NutritionIndex([NUTRITION_CSV] + extra)
+                _meal_analyzer = MealAnalyzer(load_detector(base_dir=_BASE_DIR), nutrition)
+    return _meal_analyzer
+
+
+@app.post("/meals/analyze")
+async def analyze_meal(files: List[UploadFile] = File(...)):
+    """
+    Detect foods in one or more meal photos and total their calories and carbs.
+    Images already analysed (same bytes) are answered from a cache.
+    """
+    with tracing.span("upload.read", files=len(files)) as read_span:
+        images = [await f.read() for f in files]
+        read_span.attrs["bytes"] = sum(len(b) for b in images)
+    analyzer = await asyncio.to_thread(get_meal_analyzer)
+    with tracing.span("meals.analyze", images=len(images)):
+        return await asyncio.to_thread(analyzer.analyze, images, [f.filename for f in files])
+
+
+_bolus_estimator = None
+_bolus_estimator_lock = threading.Lock()
+
+
+def get_bolus_estimator():
+    global _bolus_estimator
+    if _bolus_estimator is None:
+        with _bolus_estimator_lock:
+            if _bolus_estimator is None:
+                from camera_stuff.bolus import BolusEstimator
+                _bolus_estimator = BolusEstimator()
+    return _bolus_estimator
+
+
+@app.post("/meals/bolus")
+async def meal_bolus(files: List[UploadFile] = File(...), carb_ratio: float = Form(...),
+                     current_bg: Optional[float] = Form(None), target_bg: Optional[float] = Form(None),
+                     isf: Optional[float] = Form(None)):
+    """
+    Carbs (with a 90% range) and a suggested bolus range for a meal photo set.
+    carb_ratio is grams of carbs per unit; current_bg/target_bg/isf add a correction dose.
+    """
+    # Validate before running the detector on the photos
+    if carb_ratio <= 0:
+        return {"error": "carb_ratio must be positive (grams per unit)"}
+    estimator = get_bolus_estimator()
+    analysis = await analyze_meal(files)
+    with tracing.span("meals.bolus"):
+        bolus = estimator.estimate(analysis, carb_ratio, current_bg, target_bg, isf)
+    return dict(bolus, meal=analysis)
+
+
+# ============================================================
+# EEG STRESS SCORING
+# ============================================================
+
+class EegSamples(BaseModel):
+    user: str = "default"
+    samples: List[List[float]]  # (n, 32) EEG vectors, e.g. one second at the device rate
+
+
+_stress_scorer = None
+_stress_scorer_lock = threading.Lock()
+
+
+def get_stress_scorer():
+    global _stress_scorer
+    if _stress_scorer is None:
+        with _stress_scorer_lock:
+            if _stress_scorer is None:
+                from AI.EEG.stress.processing.eeg_stress_processing import (
+                    CALIB_PATH, MODEL_PATH, NPZ_PATH, SCALER_PATH, Autoencoder, Calibration, StressScorer)
+                model = Autoencoder(_BASE_DIR / NPZ_PATH, _BASE_DIR / MODEL_PATH, _BASE_DIR / SCALER_PATH)
+                _stress_scorer = StressScorer(model, Calibration(_BASE_DIR / CALIB_PATH))
+    return _stress_scorer
+
+
+@app.post("/eeg/stress/score")
+async def score_eeg_stress(body: EegSamples):
+    """
+    Anomaly/stress score for a batch of EEG samples: autoencoder reconstruction
+    error vs. training-error quantiles and vs. the user's rolling baseline.
+    """
+    try:
+        scorer = await asyncio.to_thread(get_stress_scorer)
+    except (FileNotFoundError, OSError) as e:
+        return {"error": f"stress model not available: {e}"}
+    if any(len(row) != scorer.model.n_channels for row in body.samples):
+        return {"error": f"each sample needs {scorer.model.n_channels} channels"}
+    with tracing.span("eeg.stress", samples=len(body.samples)):
+        return await asyncio.to_thread(scorer.score, body.samples, body.user)
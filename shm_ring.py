@@ -0,0 +1,372 @@
+"""Single-producer / multi-consumer ring buffer in POSIX shared memory.
+
+Lets the ECG classifier hand beats and predictions to the API (or any other
+local process) without going through CSV and status files. One process
+creates the ring and writes fixed-size records, and any number of processes
+attach by name and read them.
+
+Layout (one multiprocessing.shared_memory block):
+
+    header (256 bytes): magic, version, record dtype (JSON), capacity,
+                        head (records ever written), wake word, sleepers flag
+    slots[capacity]:    stamp (u64) + record (numpy structured dtype)
+
+- Sequence numbers: record n goes to slot n % capacity. The writer sets the
+  slot stamp to 2n+1 while writing and 2n+2 when done (a per-slot seqlock),
+  then advances head. A reader copies a batch and re-checks the stamps, so a
+  slot overwritten mid-read is detected, not returned torn. A reader that
+  falls more than `capacity` records behind skips ahead and counts the gap in
+  `lost`.
+- Lock-free: the writer never waits for readers, and readers never write
+  record data. The only shared writes are aligned 8-byte stores.
+- Wakeups: readers block on a futex over the header's wake word (Linux), which
+  the writer bumps after each publish. Waits are capped at WAIT_SLICE, so a
+  missed wakeup costs at most that much latency. Without futex support, wait()
+  falls back to short sleeps.
+
+    ring = ShmRing.create("insulink_ecg", PREDICTION_DTYPE)       # producer
+    ring.publish((time.time(), row, pred, true_cls, score, probs))
+
+    reader = ShmRing.attach("insulink_ecg").reader()               # consumer
+    while reader.wait(timeout=1.0):
+        for rec in reader.poll():
+            ...
+
+    python -m shm_ring bench --records 20000
+"""
+
+import argparse
+import ctypes
+import json
+import os
+import platform
+import sys
+import time
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+MAGIC = 0x474E4952  # "RING"
+VERSION = 1
+HEADER_SIZE = 256
+DTYPE_OFFSET = 64
+CAPACITY = 4096
+WAIT_SLICE = 0.05   # seconds; upper bound on a missed wakeup
+
+# ------------------ RECORD LAYOUTS ------------------
+N_ECG_FEATURES = 187
+N_ECG_CLASSES = 5
+SAMPLE_BLOCK = 32
+
+# A block of raw acquisition samples (e.g. BioAmp at 250-1000 Hz, 32 per record)
+SAMPLE_DTYPE = np.dtype([("ts", "<f8"), ("channel", "<u2"), ("n", "<u2"), ("values", "<f4", (SAMPLE_BLOCK,))])
+# One segmented heartbeat, ready for the classifier
+BEAT_DTYPE = np.dtype([("ts", "<f8"), ("row", "<i8"), ("label", "i1"), ("features", "<f4", (N_ECG_FEATURES,))])
+# One classified beat; true_class is -1 when the recording has no label
+PREDICTION_DTYPE = np.dtype([("ts", "<f8"), ("row", "<i8"), ("pred_class", "i1"), ("true_class", "i1"),
+                             ("score", "<f4"), ("probs", "<f4", (N_ECG_CLASSES,))])
+
+
+# ------------------ FUTEX ------------------
+_SYS_FUTEX = {"x86_64": 202, "aarch64": 98, "arm64": 98}.get(platform.machine())
+_FUTEX_WAIT, _FUTEX_WAKE = 0, 1
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux") or _SYS_FUTEX is None:
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.syscall.restype = ctypes.c_long
+        return libc
+    except OSError:
+        return None
+
+
+_libc = _load_libc()
+
+
+def _futex_wait(addr, expected, timeout):
+    ts = _Timespec(int(timeout), int((timeout % 1) * 1e9))
+    # Shared (non-PRIVATE) futex: works across processes mapping the same memory
+    _libc.syscall(_SYS_FUTEX, ctypes.c_void_p(addr), _FUTEX_WAIT, ctypes.c_uint32(expected), ctypes.byref(ts), None, 0)
+
+
+def _futex_wake(addr):
+    _libc.syscall(_SYS_FUTEX, ctypes.c_void_p(addr), _FUTEX_WAKE, 0x7FFFFFFF, None, None, 0)
+
+
+# ------------------ RING ------------------
+def _slot_dtype(record_dtype):
+    size = 8 + -(-record_dtype.itemsize // 8) * 8
+    return np.dtype({"names": ["stamp", "rec"], "formats": ["<u8", record_dtype], "offsets": [0, 8],
+                     "itemsize": size})
+
+
+class ShmRing:
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        buf = shm.buf
+        magic, version, capacity = np.frombuffer(buf, "<u4", 3, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{shm.name} is not a version {VERSION} ring")
+        self.capacity = int(capacity)
+        descr_len = int(np.frombuffer(buf, "<u4", 1, 12)[0])
+        descr = json.loads(bytes(buf[DTYPE_OFFSET:DTYPE_OFFSET + descr_len]).decode())
+        self.dtype = np.dtype([tuple(f) if len(f) == 2 else (f[0], f[1], tuple(f[2])) for f in descr])
+        self._head = np.ndarray(1, "<u8", buf, 16)
+        self._wake = np.ndarray(1, "<u4", buf, 24)
+        self._sleepers = np.ndarray(1, "<u4", buf, 28)
+        self.slots = np.ndarray(self.capacity, _slot_dtype(self.dtype), buf, HEADER_SIZE)
+        self._wake_addr = self._wake.ctypes.data if _libc else None
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @classmethod
+    def create(cls, name, dtype, capacity=CAPACITY, replace=True):
+        """New ring (the producer side). An existing ring of the same name is replaced."""
+        dtype = np.dtype(dtype)
+        descr = json.dumps(dtype.descr).encode()
+        if len(descr) > HEADER_SIZE - DTYPE_OFFSET:
+            raise ValueError("record dtype description does not fit in the header")
+        size = HEADER_SIZE + capacity * _slot_dtype(dtype).itemsize
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            if not replace:
+                raise
+            old = shared_memory.SharedMemory(name=name)
+            old.close()
+            old.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:HEADER_SIZE] = bytes(HEADER_SIZE)
+        np.ndarray(4, "<u4", shm.buf, 0)[:] = (MAGIC, VERSION, capacity, len(descr))
+        shm.buf[DTYPE_OFFSET:DTYPE_OFFSET + len(descr)] = descr
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Existing ring (a consumer side); raises FileNotFoundError if the producer has not created it."""
+        shm = shared_memory.SharedMemory(name=name)
+        # Consumers must not unlink the block when they exit. Children of a multiprocessing
+        # parent share its resource tracker, so only unrelated processes unregister.
+        if multiprocessing.parent_process() is None:
+            try:
+                resource_tracker.unregister(shm._name, "shared_memory")
+            except Exception:
+                pass
+        return cls(shm, owner=False)
+
+    @property
+    def head(self):
+        """Number of records ever published; the next record gets this sequence number."""
+        return int(self._head[0])
+
+    # ------------------ PRODUCER ------------------
+    def publish(self, record):
+        """Write one record (tuple or np.void in the ring's dtype); returns its sequence number."""
+        seq = int(self._head[0])
+        i = seq % self.capacity
+        self.slots["stamp"][i] = 2 * seq + 1
+        self.slots["rec"][i] = record
+        self.slots["stamp"][i] = 2 * seq + 2
+        self._head[0] = seq + 1
+        self._notify()
+        return seq
+
+    def publish_many(self, records):
+        """Write a batch (structured array) with one wakeup; returns the last sequence number."""
+        records = np.asarray(records, dtype=self.dtype)
+        seq = int(self._head[0])
+        for k in range(0, len(records), self.capacity):
+            chunk = records[k:k + self.capacity]
+            seqs = np.arange(seq, seq + len(chunk), dtype=np.uint64)
+            idx = seqs % self.capacity
+            self.slots["stamp"][idx] = 2 * seqs + 1
+            self.slots["rec"][idx] = chunk
+            self.slots["stamp"][idx] = 2 * seqs + 2
+            seq += len(chunk)
+            self._head[0] = seq
+        self._notify()
+        return seq - 1
+
+    def _notify(self):
+        self._wake[0] = (int(self._wake[0]) + 1) & 0xFFFFFFFF
+        if self._sleepers[0] and self._wake_addr is not None:
+            self._sleepers[0] = 0
+            _futex_wake(self._wake_addr)
+
+    # ------------------ CONSUMER ------------------
+    def reader(self, start="latest"):
+        """RingReader from 'latest' (only new records), 'oldest' (everything still in the ring) or a seq."""
+        head = self.head
+        if start == "latest":
+            cursor = head
+        elif start == "oldest":
+            cursor = max(0, head - self.capacity)
+        else:
+            cursor = int(start)
+        return RingReader(self, cursor)
+
+    def latest(self):
+        """Most recent record (a copy), or None if nothing was published yet."""
+        for _ in range(3):
+            head = self.head
+            if head == 0:
+                return None
+            i = (head - 1) % self.capacity
+            rec = self.slots["rec"][i].copy()
+            if int(self.slots["stamp"][i]) == 2 * head:
+                return rec
+        return None
+
+    def close(self):
+        # Drop our views first: SharedMemory refuses to close while buffers are exported
+        self.slots = self._head = self._wake = self._sleepers = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingReader:
+    def __init__(self, ring, cursor):
+        self.ring = ring
+        self.cursor = cursor
+        self.lost = 0
+
+    def available(self):
+        return self.ring.head - self.cursor
+
+    def poll(self, max_records=1024):
+        """New records since the last poll (structured array copy, oldest first)."""
+        ring = self.ring
+        head = ring.head
+        if head - self.cursor > ring.capacity:
+            # Fell behind: everything older than one ring length has been overwritten
+            self.lost += head - ring.capacity - self.cursor
+            self.cursor = head - ring.capacity
+        end = min(head, self.cursor + max_records)
+        if end <= self.cursor:
+            return np.empty(0, dtype=ring.dtype)
+        seqs = np.arange(self.cursor, end, dtype=np.uint64)
+        idx = seqs % ring.capacity
+        out = ring.slots["rec"][idx]  # fancy indexing copies
+        expected = 2 * seqs + 2
+        # Validate after copying: a slot whose stamp moved on was rewritten while we read it
+        ok = ring.slots["stamp"][idx] == expected
+        if not ok.all():
+            # Only the oldest slots can be overwritten during the copy
+            first_ok = int(np.argmax(ok)) if ok.any() else len(ok)
+            self.lost += first_ok
+            out = out[first_ok:]
+        self.cursor = end
+        return out
+
+    def wait(self, timeout=None):
+        """Block until new records are available; False on timeout."""
+        ring = self.ring
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while ring.head <= self.cursor:
+            remaining = WAIT_SLICE if deadline is None else min(WAIT_SLICE, deadline - time.monotonic())
+            if remaining <= 0:
+                return False
+            word = int(ring._wake[0])
+            ring._sleepers[0] = 1
+            if ring.head > self.cursor:
+                break
+            if ring._wake_addr is not None:
+                _futex_wait(ring._wake_addr, word, remaining)
+            else:
+                time.sleep(min(remaining, 0.001))
+        return True
+
+    def read(self, timeout=None, max_records=1024):
+        """wait() then poll(); an empty array on timeout."""
+        if not self.wait(timeout):
+            return np.empty(0, dtype=self.ring.dtype)
+        return self.poll(max_records)
+
+
+# ------------------ BENCH ------------------
+def _bench_consumer(name, n, result_queue):
+    ring = ShmRing.attach(name)
+    reader = ring.reader("oldest")
+    latencies = []
+    got = 0
+    while got < n:
+        recs = reader.read(timeout=5.0)
+        if not len(recs):
+            break
+        now = time.perf_counter()
+        latencies.extend((now - recs["ts"]).tolist())
+        got += len(recs)
+    result_queue.put((got, reader.lost, latencies))
+    ring.close()
+
+
+def bench(records=20000, rate=2000.0, consumers=2, capacity=CAPACITY):
+    name = f"shm_ring_bench_{os.getpid()}"
+    ring = ShmRing.create(name, PREDICTION_DTYPE, capacity)
+    queue = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_bench_consumer, args=(name, records, queue)) for _ in range(consumers)]
+    for p in procs:
+        p.start()
+    time.sleep(0.5)
+    rec = np.zeros((), dtype=PREDICTION_DTYPE)
+    interval = 1.0 / rate if rate else 0.0
+    next_at = time.perf_counter()
+    for i in range(records):
+        if interval:
+            while time.perf_counter() < next_at:
+                pass
+            next_at += interval
+        rec["ts"] = time.perf_counter()  # same clock in every process on Linux
+        rec["row"] = i
+        ring.publish(rec)
+    for _ in procs:
+        got, lost, lat = queue.get()
+        lat = np.array(lat) * 1e6
+        print(f"consumer: {got} records, {lost} lost, latency p50 {np.percentile(lat, 50):.0f} us "
+              f"p99 {np.percentile(lat, 99):.0f} us")
+    for p in procs:
+        p.join()
+    ring.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared-memory ring buffer tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_bench = sub.add_parser("bench", help="producer -> consumers latency across processes")
+    p_bench.add_argument("--records", type=int, default=20000)
+    p_bench.add_argument("--rate", type=float, default=2000.0, help="records per second (0 = as fast as possible)")
+    p_bench.add_argument("--consumers", type=int, default=2)
+    p_bench.add_argument("--capacity", type=int, default=CAPACITY)
+    p_tail = sub.add_parser("tail", help="print records from a ring as they arrive")
+    p_tail.add_argument("name")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        bench(args.records, args.rate, args.consumers, args.capacity)
+    else:
+        ring = ShmRing.attach(args.name)
+        reader = ring.reader()
+        try:
+            while True:
+                for rec in reader.read(timeout=1.0):
+                    print({k: rec[k].tolist() for k in ring.dtype.names if k != "features"})
+        except KeyboardInterrupt:
+            pass
+        print(f"lost {reader.lost}")
+        ring.close()
+
+
+if __name__ == "__main__":
+    main()
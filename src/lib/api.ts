@@ -1,8 +1,35 @@
 // src/lib/api.ts
 const BASE = "http://127.0.0.1:8000";
 
+// One id per check-in so the server can trace /questions → /transcribe → /analyze together
+const SESSION_HEADER = "X-Session-Id";
+let sessionId = "";
+
+export function startCheckInSession() {
+  sessionId = crypto.randomUUID().replace(/-/g, "").slice(0, 16);
+  return sessionId;
+}
+
+function sessionHeaders(): Record<string, string> {
+  if (!sessionId) startCheckInSession();
+  return { [SESSION_HEADER]: sessionId };
+}
+
+// Check-in history is kept per patient; "default" matches the ECG classifier's ECG_PATIENT_ID
+const PATIENT_KEY = "insulinkPatientId";
+const DEFAULT_PATIENT_ID = "default";
+
+export function getPatientId() {
+  return localStorage.getItem(PATIENT_KEY) || DEFAULT_PATIENT_ID;
+}
+
+export function setPatientId(id: string) {
+  localStorage.setItem(PATIENT_KEY, id);
+}
+
 export async function getQuestions() {
-  const r = await fetch(`${BASE}/questions`);
+  startCheckInSession();
+  const r = await fetch(`${BASE}/questions`, { headers: sessionHeaders() });
   if (!r.ok) throw new Error("Failed to load questions");
   const json = (await r.json()) as {
     questions: { med: string[]; food: string[]; sleep: string[] };
@@ -19,21 +46,28 @@ export async function ttsSpeak(text: string) {
 export async function transcribeAudio(blob: Blob) {
   const form = new FormData();
   form.append("file", blob, "audio.webm");
-  const r = await fetch(`${BASE}/transcribe`, { method: "POST", body: form });
+  const r = await fetch(`${BASE}/transcribe`, {
+    method: "POST",
+    headers: sessionHeaders(),
+    body: form,
+  });
   const json = (await r.json()) as { text: string };
   console.log("[api] transcript", json);
   return json;
 }
 
-export async function analyzeAnswers(payload: {
-  med: string[];
-  food: string[];
-  sleep: string[];
-}) {
+export async function analyzeAnswers(
+  payload: {
+    med: string[];
+    food: string[];
+    sleep: string[];
+  },
+  patientId: string = getPatientId() // stores the result in the patient's check-in history
+) {
   const r = await fetch(`${BASE}/analyze`, {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ answers: payload }),
+    headers: { "Content-Type": "application/json", ...sessionHeaders() },
+    body: JSON.stringify({ answers: payload, patient_id: patientId }),
   });
 
   if (!r.ok) throw new Error("Analyze failed");
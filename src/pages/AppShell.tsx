@@ -10,6 +10,9 @@ export default function AppShell() {
   const { setHealthValue, setAlert, addHistory } = useHealth();
 
   useEffect(() => {
+    // Alert log cursor; -1 means "start from now" on the first poll
+    let alertCursor = -1;
+
     const interval = setInterval(async () => {
       try {
         const r = await fetch("http://127.0.0.1:8000/ecg/status");
@@ -18,14 +21,17 @@ export default function AppShell() {
         // Update the health indicator
         setHealthValue(json.value);
 
-        // If backend found a *new* alert
-        if (json.new_alert) {
-          setAlert(json.new_alert);
+        // Every alert logged since the last poll, even if the value already flipped back
+        const a = await fetch(`http://127.0.0.1:8000/ecg/alerts?cursor=${alertCursor}`);
+        const alerts = await a.json();
+        alertCursor = alerts.cursor;
+        for (const alert of alerts.alerts) {
+          setAlert(alert);
           // Also log to incident history
           addHistory({
-            title: json.new_alert.title,
-            message: json.new_alert.message,
-            severity: json.new_alert.severity,
+            title: alert.title,
+            message: alert.message,
+            severity: alert.severity,
           });
         }
       } catch (err) {
@@ -1,6 +1,6 @@
 // src/pages/Questionnaire.tsx
 import { useEffect, useMemo, useState } from "react";
-import { getQuestions, transcribeAudio, analyzeAnswers } from "../lib/api";
+import { getQuestions, transcribeAudio, analyzeAnswers, getPatientId } from "../lib/api";
 import { useRecorder } from "../hooks/useRecorder";
 import { useNavigate } from "react-router-dom";
 
@@ -167,7 +167,7 @@ export default function Questionnaire() {
     // Final: analyze
     setLoading(true);
     try {
-      const result = await analyzeAnswers(updated);
+      const result = await analyzeAnswers(updated, getPatientId());
       navigate("/results", { state: result });
     } catch (err) {
       console.error("Analyze error:", err);
@@ -0,0 +1,66 @@
+import pytest
+
+from camera_stuff.bolus import BolusEstimator, REFERENCE_AREA
+
+
+def image(name, predictions=(), **extra):
+    return {"hash": f"{name}-hash-0123456789", "filename": name, "image": {"width": 100, "height": 100},
+            "predictions": list(predictions), **extra}
+
+
+def prediction(cls, carbs_g, confidence=1.0, share=REFERENCE_AREA):
+    side = (share * 100 * 100) ** 0.5
+    return {"class": cls, "food": cls if carbs_g is not None else None, "confidence": confidence,
+            "width": side, "height": side, "carbs_g": carbs_g}
+
+
+def test_known_foods_get_a_bolus():
+    analysis = {"images": [image("plate.jpg", [prediction("Rice", 28.0), prediction("Dal", 20.0)])]}
+    result = BolusEstimator().estimate(analysis, carb_ratio=12.0)
+    assert result["carbs_g"] == pytest.approx(48.0)
+    assert result["carbs_low_g"] < 48.0 < result["carbs_high_g"]
+    assert result["bolus"]["units"] == pytest.approx(4.0)
+    assert result["bolus"]["units_low"] <= 4.0 <= result["bolus"]["units_high"]
+    assert result["unknown_foods"] == [] and result["failed_images"] == []
+
+
+def test_unknown_food_gets_prior_but_no_bolus():
+    analysis = {"images": [image("plate.jpg", [prediction("Rice", 28.0), prediction("mystery", None)])]}
+    result = BolusEstimator().estimate(analysis, carb_ratio=12.0)
+    assert result["bolus"] is None
+    assert result["unknown_foods"] == ["mystery"]
+    assert [i["carbs_source"] for i in result["items"]] == ["table", "prior"]
+    assert result["carbs_g"] > 28.0
+    assert "mystery" in result["note"]
+
+
+def test_failed_image_blocks_bolus_and_is_named():
+    analysis = {"images": [image("plate.jpg", [prediction("Rice", 28.0)]),
+                           image("blurry.jpg", error="cannot identify image file")]}
+    result = BolusEstimator().estimate(analysis, carb_ratio=12.0)
+    assert result["bolus"] is None
+    assert result["failed_images"] == ["blurry.jpg"]
+    assert "blurry.jpg" in result["note"]
+
+
+def test_no_detections_is_not_a_zero_carb_meal():
+    result = BolusEstimator().estimate({"images": [image("empty.jpg")]}, carb_ratio=12.0)
+    assert result["bolus"] is None
+    assert result["carbs_g"] == 0.0
+    assert result["items"] == []
+    assert "No food detected" in result["note"]
+
+
+def test_correction_lowers_dose_below_target():
+    analysis = {"images": [image("plate.jpg", [prediction("Rice", 28.0)])]}
+    estimator = BolusEstimator()
+    meal = estimator.estimate(analysis, carb_ratio=14.0)["bolus"]
+    low_bg = estimator.estimate(analysis, carb_ratio=14.0, current_bg=80, target_bg=100, isf=40)["bolus"]
+    assert low_bg["correction_units"] == -0.5
+    assert low_bg["units"] == pytest.approx(meal["units"] - 0.5)
+
+
+@pytest.mark.parametrize("carb_ratio", [0, -5, None])
+def test_invalid_carb_ratio_raises(carb_ratio):
+    with pytest.raises(ValueError):
+        BolusEstimator().estimate({"images": []}, carb_ratio=carb_ratio)
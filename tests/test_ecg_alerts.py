@@ -0,0 +1,83 @@
+import json
+
+from ecg_alerts import AlertEmitter, AlertLog
+
+
+def test_read_since_returns_events_after_cursor(tmp_path):
+    log = AlertLog(tmp_path / "alerts.jsonl")
+    for value in (1, 2, 0, 3):   # class 0 has no alert
+        log.append(value)
+
+    events, cursor = log.read_since(0)
+    assert [e["id"] for e in events] == [1, 2, 3]
+    assert [e["value"] for e in events] == [1, 2, 3]
+    assert cursor == 3
+
+    assert log.read_since(cursor) == ([], 3)
+    log.append(4)
+    events, cursor = log.read_since(cursor)
+    assert [e["value"] for e in events] == [4]
+    assert cursor == 4
+
+
+def test_read_since_limit_pages_through_events(tmp_path):
+    log = AlertLog(tmp_path / "alerts.jsonl")
+    for _ in range(5):
+        log.append(2)
+    events, cursor = log.read_since(0, limit=2)
+    assert [e["id"] for e in events] == [1, 2]
+    events, cursor = log.read_since(cursor, limit=2)
+    assert [e["id"] for e in events] == [3, 4]
+
+
+def test_ids_continue_across_log_instances(tmp_path):
+    path = tmp_path / "alerts.jsonl"
+    AlertLog(path).append(1)
+    other = AlertLog(path)
+    assert other.append(2)["id"] == 2
+    assert AlertLog(path).last_id == 2
+
+
+def test_half_written_line_is_read_later(tmp_path):
+    path = tmp_path / "alerts.jsonl"
+    log = AlertLog(path)
+    log.append(1)
+    line = json.dumps({"id": 2, "value": 2}) + "\n"
+    with open(path, "a") as f:
+        f.write(line[:10])
+    events, cursor = log.read_since(0)
+    assert cursor == 1
+    with open(path, "a") as f:
+        f.write(line[10:])
+    events, cursor = log.read_since(cursor)
+    assert [e["id"] for e in events] == [2]
+
+
+def test_ack_persists_and_only_moves_forward(tmp_path):
+    path = tmp_path / "alerts.jsonl"
+    log = AlertLog(path)
+    assert log.cursor("dashboard") == 0
+    assert log.ack("dashboard", 5) == 5
+    assert log.ack("dashboard", 3) == 5
+    log.ack("notifier", 1)
+
+    reopened = AlertLog(path)
+    assert reopened.cursor("dashboard") == 5
+    assert reopened.cursor("notifier") == 1
+
+
+def test_emitter_debounces_and_dedupes(tmp_path):
+    log = AlertLog(tmp_path / "alerts.jsonl")
+    emitter = AlertEmitter(log, debounce_beats=2, dedupe_seconds=30.0)
+
+    assert emitter.observe(2, now=0.0) is None        # not held long enough yet
+    assert emitter.observe(2, now=1.0)["value"] == 2
+    assert emitter.observe(2, now=2.0) is None        # same state
+    emitter.observe(0, now=3.0)
+    emitter.observe(0, now=4.0)
+    emitter.observe(2, now=5.0)
+    assert emitter.observe(2, now=6.0) is None        # within dedupe_seconds of the first alert
+    emitter.observe(0, now=40.0)
+    emitter.observe(0, now=41.0)
+    emitter.observe(2, now=42.0)
+    assert emitter.observe(2, now=43.0)["id"] == 2
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from fake_groq import FakeGroq, FakeGroqError
+from groq_client import CircuitBreaker, CircuitOpenError, DeadlineExceeded, ResilientGroq
+
+
+def chat(client, timeout):
+    return client.chat.completions.create(model="fake", messages=[{"role": "user", "content": "{}"}])
+
+
+def make(failure_rate=0.0, latency_ms=0.0, retries=2, threshold=5, reset=30.0):
+    fake = FakeGroq(latency_ms=latency_ms, jitter_ms=0.0, failure_rate=failure_rate, seed=0)
+    groq = ResilientGroq(fake, CircuitBreaker(threshold, reset), retries=retries, base_backoff=0.001,
+                         max_backoff=0.001)
+    return fake, groq
+
+
+def call(groq, fn=chat, **kwargs):
+    return asyncio.run(groq.acall("chat", fn, **kwargs))
+
+
+def test_success_closes_breaker():
+    fake, groq = make()
+    result = call(groq)
+    assert json.loads(result.choices[0].message.content)["overview"]
+    assert fake.calls == 1
+    assert groq.breaker.state == "closed"
+
+
+def test_retryable_failures_are_retried_then_raised():
+    fake, groq = make(failure_rate=1.0, retries=2)
+    with pytest.raises(FakeGroqError):
+        call(groq)
+    assert fake.calls == 3
+    assert groq.breaker.failures == 3
+    assert groq.breaker.state == "closed"
+
+
+def test_non_retryable_error_is_not_retried():
+    attempts = []
+
+    def bad_request(client, timeout):
+        attempts.append(timeout)
+        raise FakeGroqError("bad request", status_code=400)
+
+    _, groq = make()
+    with pytest.raises(FakeGroqError):
+        call(groq, bad_request)
+    assert len(attempts) == 1
+    assert groq.breaker.failures == 0
+
+
+def test_breaker_opens_and_fails_fast():
+    fake, groq = make(failure_rate=1.0, retries=5, threshold=2)
+    with pytest.raises(CircuitOpenError):
+        call(groq)
+    assert fake.calls == 2
+    assert groq.breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        call(groq)
+    assert fake.calls == 2
+
+
+def test_half_open_probe_closes_or_reopens():
+    fake, groq = make(failure_rate=1.0, retries=0, threshold=1, reset=0.05)
+    with pytest.raises(FakeGroqError):
+        call(groq)
+    assert groq.breaker.state == "open"
+
+    time.sleep(0.06)
+    with pytest.raises(FakeGroqError):
+        call(groq)                           # the probe fails: open again
+    assert groq.breaker.state == "open"
+
+    time.sleep(0.06)
+    fake.failure_rate = 0.0
+    call(groq)
+    assert groq.breaker.state == "closed"
+    assert groq.breaker.failures == 0
+
+
+def test_half_open_admits_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.allow() is True
+    assert breaker.state == "half_open"
+    assert breaker.allow() is False
+    breaker.release()
+    assert breaker.allow() is True
+
+
+def test_deadline_exceeded_on_slow_call():
+    fake, groq = make(latency_ms=300.0)
+    with pytest.raises(DeadlineExceeded):
+        call(groq, deadline=0.05)
+    assert groq.breaker.state == "closed"
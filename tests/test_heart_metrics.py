@@ -0,0 +1,83 @@
+import numpy as np
+
+from AI.ECG.processing.heart_metrics import N_CLASSES, RollingHeart
+
+PROBS = np.eye(N_CLASSES, dtype=np.float32)
+
+
+def add(heart, ts, cls, score=8.0):
+    return heart.add(ts, cls, PROBS[cls], score)
+
+
+def test_window_evicts_beats_older_than_its_span():
+    heart = RollingHeart(capacity=64, windows={"10s": 10.0, "60s": 60.0})
+    for t in range(30):
+        add(heart, float(t), 2 if t < 5 else 0)
+
+    windows = heart.snapshot(now=29.0)["windows"]
+    # 10 s window keeps beats 19..29 (ts >= now - 10), all normal
+    assert windows["10s"]["beats"] == 11
+    assert windows["10s"]["abnormal_burden"] == 0.0
+    assert windows["60s"]["beats"] == 30
+    assert windows["60s"]["class_counts"]["V"] == 5
+    assert windows["60s"]["abnormal_burden"] == round(5 / 30, 4)
+
+
+def test_snapshot_ages_out_beats_while_stream_is_quiet():
+    heart = RollingHeart(capacity=64, windows={"10s": 10.0})
+    for t in range(5):
+        add(heart, float(t), 0)
+    assert heart.snapshot(now=5.0)["windows"]["10s"]["beats"] == 5
+    assert heart.snapshot(now=100.0)["windows"]["10s"]["beats"] == 0
+    assert heart.snapshot(now=100.0)["windows"]["10s"]["abnormal_burden"] is None
+
+
+def test_window_sums_match_a_rescan():
+    rng = np.random.default_rng(0)
+    heart = RollingHeart(capacity=256, windows={"30s": 30.0})
+    ts = np.cumsum(rng.uniform(0.2, 1.5, 500))
+    cls = rng.integers(0, N_CLASSES, 500)
+    for k in range(0, 500, 37):
+        heart.add_batch(ts[k:k + 37], cls[k:k + 37], PROBS[cls[k:k + 37]], np.full(len(cls[k:k + 37]), 5.0))
+
+    window = heart.snapshot(now=float(ts[-1]))["windows"]["30s"]
+    inside = ts >= ts[-1] - 30.0
+    assert window["beats"] == int(inside.sum())
+    assert list(window["class_counts"].values()) == np.bincount(cls[inside], minlength=N_CLASSES).tolist()
+
+
+def test_capacity_truncates_windows_and_flags_them():
+    heart = RollingHeart(capacity=16, windows={"short": 5.0, "long": 1000.0})
+    for t in range(40):
+        add(heart, float(t), 0)
+
+    windows = heart.snapshot(now=39.0)["windows"]
+    # Only the last 16 beats are still in the ring
+    assert windows["long"]["beats"] == 16
+    assert windows["long"]["truncated"] is True
+    assert windows["short"]["beats"] == 6
+    assert windows["short"]["truncated"] is False
+
+
+def test_batch_larger_than_capacity_keeps_the_newest_beats():
+    heart = RollingHeart(capacity=8, windows={"long": 1000.0})
+    ts = np.arange(20, dtype=np.float64)
+    cls = np.array([1] * 12 + [0] * 8)
+    heart.add_batch(ts, cls, PROBS[cls], np.full(20, 5.0))
+
+    snap = heart.snapshot(now=19.0)
+    assert snap["beats_total"] == 8
+    assert snap["windows"]["long"]["class_counts"]["N"] == 8
+
+
+def test_ectopic_run_reported_once_it_ends():
+    heart = RollingHeart(capacity=64, windows={"60s": 60.0})
+    runs = []
+    for t, c in enumerate([0, 2, 2, 2, 2, 0, 1, 1, 0]):
+        runs += add(heart, float(t), c)
+
+    assert [(r["beats"], r["label"]) for r in runs] == [(4, "V")]
+    window = heart.snapshot(now=8.0)["windows"]["60s"]
+    assert window["runs"] == 1
+    assert window["couplets"] == 1
+    assert window["longest_run"] == 4
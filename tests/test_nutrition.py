@@ -0,0 +1,60 @@
+import pytest
+
+from camera_stuff.nutrition import NutritionIndex, normalize_food, word_coverage
+
+
+@pytest.fixture(scope="module")
+def index():
+    return NutritionIndex()
+
+
+@pytest.mark.parametrize("name", ["Boiled-Egg", "boiled_egg", "  BOILED   egg ", "boiled egg"])
+def test_normalized_spellings_are_exact_matches(index, name):
+    assert normalize_food(name) == "boiled egg"
+    food = index.lookup(name)
+    assert food["name"] == "Boiled Egg"
+    assert food["score"] == 1.0
+
+
+def test_aliases_are_exact_matches(index):
+    assert index.lookup("Alu-Gobi")["name"] == "Aloo Gobhi"
+    assert index.lookup("anda")["name"] == "Boiled Egg"
+
+
+def test_misspelling_matches_fuzzily(index):
+    food = index.lookup("boild egg")
+    assert food["name"] == "Boiled Egg"
+    assert index.min_similarity <= food["score"] < 1.0
+
+
+@pytest.mark.parametrize("name", ["chicken biryani", "unknown thing", "xyz"])
+def test_unrelated_or_composite_names_are_unknown(index, name):
+    assert index.lookup(name) is None
+
+
+def test_threshold_decides_fuzzy_matches():
+    food_id, score = NutritionIndex().match("boild egg")
+    assert food_id is not None
+    assert NutritionIndex(min_similarity=score + 0.01).lookup("boild egg") is None
+
+
+def test_word_coverage_penalizes_extra_words():
+    assert word_coverage("boild egg", "boiled egg") == 1.0
+    assert word_coverage("chicken biryani", "chicken") == 0.5
+
+
+def test_add_overrides_by_name_and_clears_cache():
+    index = NutritionIndex()
+    n = len(index)
+    assert index.lookup("rice")["carbs_g"] == 28.0
+    index.add("Rice", 130.0, 30.0)
+    assert len(index) == n
+    assert index.lookup("rice")["carbs_g"] == 30.0
+
+
+def test_load_accepts_other_header_spellings(tmp_path):
+    path = tmp_path / "foods.csv"
+    path.write_text("Description,Energy (kcal),Carbohydrate\nMasala Dosa,168,29\n")
+    index = NutritionIndex([path])
+    assert index.lookup("masala-dosa") == {"name": "Masala Dosa", "calories": 168.0, "carbs_g": 29.0,
+                                           "score": 1.0, "query": "masala-dosa"}
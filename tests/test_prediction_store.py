@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from prediction_store import PredictionStore, month_bounds
+
+# 2024-01-31 23:00 UTC: the beats below cross into a second month partition
+START = 1706742000.0
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PredictionStore(tmp_path / "predictions.db")
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def beats(store):
+    rng = np.random.default_rng(1)
+    ts = START + np.sort(rng.uniform(0, 3 * 3600, 2000))
+    cls = rng.integers(0, 5, len(ts))
+    scores = rng.uniform(0, 10, len(ts))
+    sources = rng.choice(["live", "import"], len(ts))
+    store.add_many([("ecg", str(src), float(t), int(c), None, float(s))
+                    for t, c, s, src in zip(ts, cls, scores, sources)])
+    store.add("eeg", START + 10, 1, None, 1.0)
+    return ts, cls, scores, sources
+
+
+def raw_buckets(store, width, start, end, source=None):
+    """Buckets recomputed from the raw partitions."""
+    points = {}
+    for row in store.beats("ecg", start, end, source=source):
+        b = int(row["ts"] // width) * width
+        p = points.setdefault(b, {"n": 0, "score": 0.0, "counts": {}})
+        p["n"] += 1
+        p["score"] += row["score"]
+        p["counts"][row["predicted_class"]] = p["counts"].get(row["predicted_class"], 0) + 1
+    return points
+
+
+@pytest.mark.parametrize("resolution,width", [("minute", 60), ("hour", 3600)])
+@pytest.mark.parametrize("source", [None, "live"])
+def test_trend_matches_raw_beats(store, beats, resolution, width, source):
+    start, end = START, START + 3 * 3600
+    result = store.trend("ecg", start, end, resolution, source=source)
+    expected = raw_buckets(store, width, start, end, source)
+
+    assert result["resolution"] == resolution
+    assert [p["bucket"] for p in result["points"]] == sorted(expected)
+    for point in result["points"]:
+        want = expected[point["bucket"]]
+        assert point["n"] == want["n"]
+        assert point["mean_score"] == pytest.approx(want["score"] / want["n"])
+        assert point["counts"] == want["counts"]
+
+
+def test_trend_counts_match_sql_over_partitions(store, beats):
+    ts = beats[0]
+    partitions = {month_bounds(t)[0] for t in ts}
+    assert len(partitions) == 2
+    raw = sum(store.conn.execute(f"SELECT COUNT(*) FROM {name} WHERE stream = 'ecg'").fetchone()[0]
+              for name in partitions)
+    trend = store.trend("ecg", START - 86400, START + 2 * 86400, "day")
+    assert sum(p["n"] for p in trend["points"]) == raw == len(ts)
+
+
+def test_trend_auto_resolution_and_stream_filter(store, beats):
+    assert store.trend("ecg", START, START + 3600)["resolution"] == "minute"
+    assert store.trend("ecg", START, START + 7 * 86400)["resolution"] == "hour"
+    eeg = store.trend("eeg", START, START + 3600, "minute")
+    assert [(p["n"], p["counts"]) for p in eeg["points"]] == [(1, {1: 1})]
+
+
+def test_pending_beats_are_visible_to_trend(store):
+    store.add("ecg", START + 5, 2, [0, 0, 1, 0, 0], 4.0)
+    points = store.trend("ecg", START, START + 60, "minute")["points"]
+    assert points[0]["n"] == 1
+    assert store.beats("ecg", START, START + 60)[0]["probabilities"] == [0.0, 0.0, 1.0, 0.0, 0.0]
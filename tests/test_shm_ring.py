@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pytest
+
+from shm_ring import ShmRing
+
+DTYPE = np.dtype([("seq", "<i8"), ("value", "<f4")])
+
+
+@pytest.fixture
+def ring():
+    ring = ShmRing.create(f"test_ring_{os.getpid()}", DTYPE, capacity=8)
+    yield ring
+    ring.close()
+
+
+def records(start, stop):
+    return np.array([(i, i * 0.5) for i in range(start, stop)], dtype=DTYPE)
+
+
+def test_publish_wraps_around_capacity(ring):
+    reader = ring.reader("oldest")
+    for i in range(5):
+        ring.publish((i, i * 0.5))
+    assert reader.poll()["seq"].tolist() == [0, 1, 2, 3, 4]
+
+    # Slots 0-3 are reused for records 8-11
+    ring.publish_many(records(5, 12))
+    out = reader.poll()
+    assert out["seq"].tolist() == list(range(5, 12))
+    assert reader.lost == 0
+    assert ring.head == 12
+    assert ring.latest()["seq"] == 11
+
+
+def test_oldest_reader_starts_one_capacity_back(ring):
+    ring.publish_many(records(0, 20))
+    out = ring.reader("oldest").poll()
+    assert out["seq"].tolist() == list(range(12, 20))
+
+
+def test_reader_falling_behind_skips_and_counts_lost(ring):
+    reader = ring.reader("latest")
+    ring.publish_many(records(0, 3))
+    assert reader.poll()["seq"].tolist() == [0, 1, 2]
+
+    ring.publish_many(records(3, 25))       # 22 new records into 8 slots
+    out = reader.poll()
+    assert out["seq"].tolist() == list(range(17, 25))
+    assert reader.lost == 14
+    assert reader.available() == 0
+
+
+def test_poll_respects_max_records(ring):
+    reader = ring.reader("oldest")
+    ring.publish_many(records(0, 6))
+    assert reader.poll(max_records=4)["seq"].tolist() == [0, 1, 2, 3]
+    assert reader.poll(max_records=4)["seq"].tolist() == [4, 5]
+    assert len(reader.poll()) == 0
+
+
+def test_read_times_out_without_records(ring):
+    reader = ring.reader()
+    assert len(reader.read(timeout=0.01)) == 0
+
@@ -0,0 +1,372 @@
+"""Request-scoped tracing for the voice questionnaire pipeline.
+
+Spans are timed blocks (`with span("groq.chat"): ...`) that nest through a
+contextvar and carry the check-in session id, so /questions, /tts,
+/transcribe and /analyze calls from one patient check-in can be stitched
+together. Finished spans go to a background exporter:
+
+    TRACE_EXPORT=file  TRACE_FILE=traces/spans.jsonl      (JSON lines)
+    TRACE_EXPORT=otlp  OTLP_ENDPOINT=http://127.0.0.1:4318  (OTLP/HTTP JSON)
+
+Tools:
+
+    python -m tracing collect --port 4318 --out traces/collected.jsonl   # local OTLP collector stand-in
+    python -m tracing summary traces/spans.jsonl                        # per-stage latency breakdown
+"""
+
+import abc
+import argparse
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SESSION_HEADER = "X-Session-Id"
+SERVICE_NAME = "insulink-server"
+
+log = logging.getLogger("insulink.tracing")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_session_id = contextvars.ContextVar("session_id", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "session_id", "name", "start", "end", "attrs", "error")
+
+    def __init__(self, name, trace_id, parent_id, session_id, attrs):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.session_id = session_id
+        self.name = name
+        self.start = time.time()
+        self.end = None
+        self.attrs = attrs
+        self.error = None
+
+    @property
+    def duration_ms(self):
+        return ((self.end or time.time()) - self.start) * 1000
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "session_id": self.session_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+# ------------------ EXPORTERS ------------------
+class _BackgroundExporter(abc.ABC):
+    """Queue spans and flush them from a daemon thread so requests never wait on I/O."""
+
+    def __init__(self, batch_size=64, flush_interval=1.0):
+        self._queue = queue.Queue(maxsize=10000)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        threading.Thread(target=self._run, name=type(self).__name__, daemon=True).start()
+        atexit.register(self.flush)
+
+    def export(self, span):
+        try:
+            self._queue.put_nowait(span.to_dict())
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        batch = self._drain()
+        while batch:
+            try:
+                self.write(batch)
+            except Exception as e:
+                log.warning("[tracing] export of %d spans failed: %r", len(batch), e)
+            batch = self._drain()
+
+    @abc.abstractmethod
+    def write(self, batch):
+        """Send one batch of span dicts; exceptions are logged and the batch is dropped."""
+
+
+class FileExporter(_BackgroundExporter):
+    def __init__(self, path, **kwargs):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def write(self, batch):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(s) + "\n" for s in batch))
+
+
+def _otlp_attr(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def to_otlp(batch, service_name=SERVICE_NAME):
+    """Encode span dicts as an OTLP/HTTP JSON ExportTraceServiceRequest."""
+    spans = []
+    for s in batch:
+        attrs = dict(s["attrs"], **({"session.id": s["session_id"]} if s["session_id"] else {}))
+        spans.append({
+            "traceId": s["trace_id"],
+            "spanId": s["span_id"],
+            "parentSpanId": s["parent_id"] or "",
+            "name": s["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(int(s["start"] * 1e9)),
+            "endTimeUnixNano": str(int((s["start"] + s["duration_ms"] / 1000) * 1e9)),
+            "attributes": [_otlp_attr(k, v) for k, v in attrs.items()],
+            "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 1},
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_otlp_attr("service.name", service_name)]},
+        "scopeSpans": [{"scope": {"name": "insulink.tracing"}, "spans": spans}],
+    }]}
+
+
+def from_otlp(payload):
+    """Decode an OTLP/HTTP JSON request back into span dicts."""
+    out = []
+    for rs in payload.get("resourceSpans", []):
+        for ss in rs.get("scopeSpans", []):
+            for s in ss.get("spans", []):
+                attrs = {a["key"]: next(iter(a["value"].values())) for a in s.get("attributes", [])}
+                start = int(s["startTimeUnixNano"]) / 1e9
+                status = s.get("status", {})
+                out.append({
+                    "trace_id": s["traceId"],
+                    "span_id": s["spanId"],
+                    "parent_id": s.get("parentSpanId") or None,
+                    "session_id": attrs.pop("session.id", None),
+                    "name": s["name"],
+                    "start": start,
+                    "duration_ms": (int(s["endTimeUnixNano"]) / 1e9 - start) * 1000,
+                    "attrs": attrs,
+                    "error": status.get("message") if status.get("code") == 2 else None,
+                })
+    return out
+
+
+class OTLPHttpExporter(_BackgroundExporter):
+    def __init__(self, endpoint, timeout=2.0, **kwargs):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def write(self, batch):
+        body = json.dumps(to_otlp(batch)).encode("utf-8")
+        req = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        urllib.request.urlopen(req, timeout=self.timeout).close()
+
+
+class NullExporter:
+    def export(self, span):
+        pass
+
+
+def exporter_from_env():
+    kind = os.getenv("TRACE_EXPORT", "none").lower()
+    if kind == "file":
+        return FileExporter(os.getenv("TRACE_FILE", "traces/spans.jsonl"))
+    if kind == "otlp":
+        return OTLPHttpExporter(os.getenv("OTLP_ENDPOINT", "http://127.0.0.1:4318"))
+    return NullExporter()
+
+
+_exporter = None
+
+
+def get_exporter():
+    global _exporter
+    if _exporter is None:
+        _exporter = exporter_from_env()
+    return _exporter
+
+
+def set_exporter(exporter):
+    global _exporter
+    _exporter = exporter
+
+
+# ------------------ SPANS ------------------
+def new_session_id():
+    return secrets.token_hex(8)
+
+
+def current_session_id():
+    return _session_id.get()
+
+
+@contextmanager
+def session(session_id):
+    """Bind a session id to everything traced inside this block."""
+    token = _session_id.set(session_id)
+    try:
+        yield session_id
+    finally:
+        _session_id.reset(token)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block as a child of the current span (or as a new trace root)."""
+    parent = _current_span.get()
+    s = Span(name,
+             trace_id=parent.trace_id if parent else secrets.token_hex(16),
+             parent_id=parent.span_id if parent else None,
+             session_id=_session_id.get(),
+             attrs=attrs)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = repr(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        s.end = time.time()
+        get_exporter().export(s)
+
+
+# ------------------ TOOLS ------------------
+def load_spans(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def summarize(spans):
+    """Per-stage latency table plus per-session end-to-end totals."""
+    by_name = defaultdict(list)
+    for s in spans:
+        by_name[s["name"]].append(s["duration_ms"])
+    roots = [s for s in spans if not s["parent_id"]]
+    root_total = sum(s["duration_ms"] for s in roots) or 1.0
+
+    stages = []
+    for name, durations in by_name.items():
+        stages.append({
+            "name": name,
+            "count": len(durations),
+            "mean_ms": sum(durations) / len(durations),
+            "p50_ms": _pct(durations, 50),
+            "p95_ms": _pct(durations, 95),
+            "total_ms": sum(durations),
+            "share_of_requests_pct": 100.0 * sum(durations) / root_total,
+            "errors": sum(1 for s in spans if s["name"] == name and s["error"]),
+        })
+    stages.sort(key=lambda r: r["total_ms"], reverse=True)
+
+    sessions = defaultdict(float)
+    for s in roots:
+        if s["session_id"]:
+            sessions[s["session_id"]] += s["duration_ms"]
+    return {"stages": stages, "sessions": dict(sessions)}
+
+
+def print_summary(summary):
+    print(f"{'stage':<32}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'share %':>9}{'errors':>8}")
+    for r in summary["stages"]:
+        print(f"{r['name']:<32}{r['count']:>7}{r['mean_ms']:>10.1f}{r['p50_ms']:>10.1f}"
+              f"{r['p95_ms']:>10.1f}{r['share_of_requests_pct']:>9.1f}{r['errors']:>8}")
+    sessions = summary["sessions"]
+    if sessions:
+        totals = list(sessions.values())
+        print(f"\n{len(sessions)} sessions: server time per check-in p50 {_pct(totals, 50):.0f} ms, "
+              f"p95 {_pct(totals, 95):.0f} ms")
+
+
+def serve_collector(port, out_path, host="127.0.0.1"):
+    """Minimal OTLP/HTTP JSON collector: POST /v1/traces -> JSON lines file."""
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/v1/traces":
+                self.send_error(404)
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                spans = from_otlp(json.loads(body))
+            except (ValueError, KeyError) as e:
+                self.send_error(400, str(e))
+                return
+            with lock, open(out_path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(s) + "\n" for s in spans))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, format, *args):
+            pass
+
+    print(f"OTLP collector stand-in on http://{host}:{port}/v1/traces -> {out_path}")
+    ThreadingHTTPServer((host, port), Handler).serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tracing tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_sum = sub.add_parser("summary", help="per-stage latency breakdown of a spans JSONL file")
+    p_sum.add_argument("path", nargs="?", default="traces/spans.jsonl")
+    p_sum.add_argument("--json", action="store_true", help="print the summary as JSON")
+    p_col = sub.add_parser("collect", help="run a local OTLP/HTTP collector stand-in")
+    p_col.add_argument("--port", type=int, default=4318)
+    p_col.add_argument("--out", default="traces/collected.jsonl")
+    args = parser.parse_args(argv)
+
+    if args.command == "summary":
+        summary = summarize(load_spans(args.path))
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            print_summary(summary)
+    else:
+        serve_collector(args.port, args.out)
+
+
+if __name__ == "__main__":
+    main()